@@ -0,0 +1,580 @@
+"""
+End-to-end benchmark for the Serial Terminal I/O path.
+
+Drives SerialSession (and optionally the full SerialTerminal GUI) through a pty
+pair or a loop:// port and measures RX throughput, arrival-to-display
+latency, command round-trip time, reader thread CPU and peak memory.
+
+    python benchmark.py                      # headless, default matrix
+    python benchmark.py --bauds 115200,921600 --line-lengths 16,256 --patterns steady,burst
+    python benchmark.py --transport loopback --output results.json
+    python benchmark.py --gui                # render through the Tk output widget
+    python benchmark.py --scaling --workers 1,2,4,8   # receive path vs pipeline mode per core count
+
+--scaling also profiles the pipeline stage by stage and reports the worker
+count (and cores) from which it beats the single-thread receive path.
+"""
+import argparse
+import json
+import os
+import pickle
+import platform
+import sys
+import threading
+import time
+import zlib
+from datetime import datetime
+from queue import Empty
+
+import serialterminal as st
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+BURST_LINES = 500
+RTT_COMMANDS = 200
+RTT_TIMEOUT = 2.0
+
+
+# === Transports ===
+class PtyTransport:
+    # Device side of a pty pair; the session under test opens the slave
+    def __init__(self):
+        import pty
+        import tty
+        self.master, self.slave = pty.openpty()
+        tty.setraw(self.slave)
+        self.port = os.ttyname(self.slave)
+        self.session = None
+        self.responder = None
+
+    def attach(self, session):
+        self.session = session
+        self.responder = threading.Thread(target=self._respond, daemon=True)
+        self.responder.start()
+
+    def write(self, data):
+        view = memoryview(data)
+        while view:
+            view = view[os.write(self.master, view):]
+
+    def _respond(self):
+        # Answer "PING n" with "PONG n" like a device would
+        pending = b""
+        while True:
+            try:
+                pending += os.read(self.master, 4096)
+            except OSError:
+                return
+            *lines, pending = pending.split(b"\n")
+            for line in lines:
+                line = line.strip()
+                if line.startswith(b"PING"):
+                    self.write(b"PONG" + line[4:] + b"\r\n")
+
+    def close(self):
+        for fd in (self.master, self.slave):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+
+class LoopbackTransport:
+    # loop:// returns everything written, so commands come back as their own reply
+    port = "loop://"
+
+    def __init__(self):
+        self.session = None
+
+    def attach(self, session):
+        self.session = session
+
+    def write(self, data):
+        self.session.ser.write(data)
+
+    def close(self):
+        pass
+
+
+TRANSPORTS = {"pty": PtyTransport, "loopback": LoopbackTransport}
+
+
+# === Consumers ("display" side) ===
+class HeadlessConsumer:
+    # Drains response_queue on a fixed tick like process_queue, without Tk
+    def __init__(self, session, recorder):
+        self.session = session
+        self.recorder = recorder
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def _run(self):
+        queue = self.session.response_queue
+        while not self.stop_event.is_set():
+            lines = []
+            try:
+                while True:
+                    item = queue.get_nowait()
+                    if item[0] is st.LINE_BATCH:
+                        lines.extend(line for _, line in item[1])
+                    else:
+                        lines.append(item[1])
+            except Empty:
+                pass
+            if lines:
+                self.recorder.displayed(lines)
+            time.sleep(st.MIN_TICK_MS / 1000.0)
+
+    def stop(self):
+        self.stop_event.set()
+        self.thread.join(timeout=2)
+
+
+class Recorder:
+    # Matches displayed lines back to their send time by sequence number
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.sent = {}
+        self.latencies = []
+        self.received_lines = 0
+        self.received_bytes = 0
+        self.last_display = None
+        self.replies = {}
+
+    def displayed(self, lines):
+        now = time.perf_counter()
+        with self.lock:
+            for line in lines:
+                if line.startswith(("PONG", "PING")):
+                    self.replies.setdefault(line.split()[-1], now)
+                    continue
+                seq = line.split(" ", 1)[0]
+                sent = self.sent.pop(seq, None)
+                if sent is not None:
+                    self.latencies.append(now - sent)
+                self.received_lines += 1
+                self.received_bytes += len(line) + 2
+            self.last_display = now
+
+
+# === Scenario ===
+def make_lines(count, length, start=0):
+    lines = []
+    for seq in range(start, start + count):
+        head = f"{seq:09d} "
+        lines.append(head + "x" * max(0, length - len(head)))
+    return lines
+
+
+def produce(transport, recorder, baud, length, pattern, duration):
+    # Pace output to what the baud rate could carry (10 bits per byte)
+    rate = baud / 10.0
+    line_bytes = length + 2
+    start = time.perf_counter()
+    sent_bytes = 0
+    seq = 0
+    while time.perf_counter() - start < duration:
+        if pattern == "burst":
+            count = BURST_LINES
+        elif pattern == "max":
+            count = 64
+        else:
+            elapsed = time.perf_counter() - start
+            count = int((elapsed * rate - sent_bytes) // line_bytes)
+            if count <= 0:
+                time.sleep(0.001)
+                continue
+        lines = make_lines(count, length, seq)
+        now = time.perf_counter()
+        with recorder.lock:
+            for line in lines:
+                recorder.sent[line[:9]] = now
+        transport.write(("\r\n".join(lines) + "\r\n").encode())
+        seq += count
+        sent_bytes += count * line_bytes
+        if pattern == "burst":
+            # Idle long enough to keep the average at the line rate
+            time.sleep(max(0.0, start + sent_bytes / rate - time.perf_counter()))
+    return seq, sent_bytes, time.perf_counter() - start
+
+
+def measure_rtt(session, recorder, count):
+    rtts = []
+    timeouts = 0
+    for n in range(count):
+        key = f"{n}"
+        sent = time.perf_counter()
+        session.transmit(f"PING {key}\r\n".encode())
+        deadline = sent + RTT_TIMEOUT
+        while time.perf_counter() < deadline:
+            with recorder.lock:
+                got = recorder.replies.pop(key, None)
+            if got is not None:
+                rtts.append(got - sent)
+                break
+            time.sleep(0.0002)
+        else:
+            timeouts += 1
+    return rtts, timeouts
+
+
+def thread_cpu(thread):
+    if not hasattr(time, "pthread_getcpuclockid") or thread is None or thread.ident is None:
+        return None
+    try:
+        return time.clock_gettime(time.pthread_getcpuclockid(thread.ident))
+    except OSError:
+        return None
+
+
+def peak_memory_kb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+
+def summarize(values):
+    values = sorted(values)
+    ms = lambda v: None if v is None else round(v * 1000, 3)
+    return {
+        "count": len(values),
+        "p50_ms": ms(st.percentile(values, 50)),
+        "p99_ms": ms(st.percentile(values, 99)),
+        "max_ms": ms(values[-1]) if values else None,
+    }
+
+
+def run_scenario(transport_name, baud, length, pattern, duration, gui=None):
+    transport = TRANSPORTS[transport_name]()
+    recorder = Recorder()
+    if gui:
+        app = gui
+        app.port_var.set(transport.port)
+        app.baud_var.set(str(baud))
+        app.connect()
+        session = app.tab.session
+        original_append = app.append_output
+
+        def append_output(lines, tab=None, *args):
+            original_append(lines, tab, *args)
+            recorder.displayed([line.split("<< ", 1)[1] for line in lines if "<< " in line])
+
+        app.append_output = append_output
+        consumer = None
+    else:
+        session = st.SerialSession(transport.port, baudrate=baud)
+        session.open()
+        consumer = HeadlessConsumer(session, recorder)
+        consumer.start()
+    transport.attach(session)
+    cpu_before = thread_cpu(session.io_thread)
+    lines_sent, bytes_sent, send_time = produce(transport, recorder, baud, length, pattern, duration)
+    # Let the pipeline drain
+    drain_deadline = time.perf_counter() + 5
+    while recorder.received_lines < lines_sent and time.perf_counter() < drain_deadline:
+        time.sleep(0.01)
+    cpu_after = thread_cpu(session.io_thread)
+    rtts, rtt_timeouts = measure_rtt(session, recorder, RTT_COMMANDS)
+    if consumer:
+        consumer.stop()
+    if gui:
+        app.disconnect()
+        app.append_output = original_append
+    else:
+        session.close()
+    transport.close()
+    total_time = max(send_time, 1e-9)
+    return {
+        "transport": transport_name,
+        "mode": "gui" if gui else "headless",
+        "baud": baud,
+        "line_length": length,
+        "pattern": pattern,
+        "lines_sent": lines_sent,
+        "lines_received": recorder.received_lines,
+        "lines_lost": lines_sent - recorder.received_lines,
+        "rx_bytes_per_s": round(recorder.received_bytes / total_time),
+        "rx_lines_per_s": round(recorder.received_lines / total_time),
+        "offered_bytes_per_s": round(bytes_sent / total_time),
+        "latency": summarize(recorder.latencies),
+        "command_rtt": dict(summarize(rtts), timeouts=rtt_timeouts),
+        "reader_cpu_s": None if cpu_before is None or cpu_after is None else round(cpu_after - cpu_before, 4),
+        "reader_cpu_pct": None if cpu_before is None or cpu_after is None
+        else round(100 * (cpu_after - cpu_before) / total_time, 1),
+        "peak_rss_kb": peak_memory_kb(),
+    }
+
+
+# === Pipeline scaling ===
+class CountingSink:
+    # Stands in for response_queue: keeps a running CRC of the lines instead of the lines
+    def __init__(self):
+        self.lines = 0
+        self.crc = 0
+
+    def put(self, item):
+        for _, line in (item[1] if item[0] is st.LINE_BATCH else (item,)):
+            self.lines += 1
+            self.crc = zlib.crc32(line.encode(), self.crc)
+
+    def qsize(self):
+        return 0
+
+
+def make_traffic(megabytes, length):
+    # Colored, telemetry-bearing lines with the odd trigger hit, as a busy device sends them
+    lines = []
+    size = 0
+    seq = 0
+    while size < megabytes * 1024 * 1024:
+        head = f"\x1b[32m{seq:09d}\x1b[0m temp={seq % 100}.5 rpm={seq % 7000} "
+        if seq % 97 == 0:
+            head += "ERROR "
+        line = (head + "x" * max(0, length - len(head)) + "\r\n").encode()
+        lines.append(line)
+        size += len(line)
+        seq += 1
+    return b"".join(lines)
+
+
+def scaling_session():
+    session = st.SerialSession("bench://", response_queue=CountingSink())
+    session.framer = st.LineFramer.from_name(session.framing)
+    session.triggers = st.TriggerEngine([st.TriggerRule("ERROR"), st.TriggerRule(r"rpm=6\d{3}", regex=True)])
+    session.telemetry = st.Telemetry()
+    return session
+
+
+def run_sequential(data):
+    session = scaling_session()
+    arrival = time.time_ns()
+    start = time.perf_counter()
+    for i in range(0, len(data), st.RX_READ_SIZE):
+        session.handle_rx(data[i:i + st.RX_READ_SIZE], arrival)
+    session.telemetry.process()
+    return time.perf_counter() - start, session
+
+
+def run_pipeline(data, workers):
+    pipeline = st.ReceivePipeline(workers)
+    # Start every worker before timing; spawn pays an interpreter start-up each
+    warmup = [pipeline.submit(("", 0, 0, b"", "line", b"\n", (), ())) for _ in range(workers * 2)]
+    for future in warmup:
+        future.result()
+    session = scaling_session()
+    feed = st.PipelineFeed(session, pipeline)
+    arrival = time.time_ns()
+    start = time.perf_counter()
+    for i in range(0, len(data), st.RX_READ_SIZE):
+        chunk = data[i:i + st.RX_READ_SIZE]
+        session._rx_raw(chunk, arrival)
+        while feed.saturated:
+            time.sleep(0.0005)
+        feed.add(chunk, arrival)
+    feed.flush()
+    while feed.next_apply < feed.next_seq:
+        time.sleep(0.0005)
+    session.telemetry.process()
+    elapsed = time.perf_counter() - start
+    feed.close()
+    pipeline.stop()
+    return elapsed, session
+
+
+def profile_pipeline(data):
+    # Seconds each pipeline stage takes for `data`, run one after the other in
+    # this process: the pool's work on the blocks, pickling results there and
+    # unpickling them here, and applying them on the reader. The pool's share
+    # spreads over the workers, the reader's does not.
+    session = scaling_session()
+    spec, active = session.triggers.spec
+    patterns = tuple(regex.pattern for regex in session.telemetry.patterns)
+    framer = session.framer
+    size = st.PIPELINE_MIN_BLOCK
+    blocks = [data[i:i + size] for i in range(0, len(data), size)]
+    start = time.perf_counter()
+    results = [st.pipeline_block(("", 0, len(block), block, framer.mode, framer.delimiter, spec, patterns))
+               for block in blocks]
+    worker = time.perf_counter() - start
+    start = time.perf_counter()
+    pickled = [pickle.dumps(result, pickle.HIGHEST_PROTOCOL) for result in results]
+    dump = time.perf_counter() - start
+    start = time.perf_counter()
+    results = [pickle.loads(result) for result in pickled]
+    load = time.perf_counter() - start
+    feed = st.PipelineFeed(session, st.ReceivePipeline(1))  # only its _apply is used
+    start = time.perf_counter()
+    for block, result in zip(blocks, results):
+        feed._apply((None, 0, len(block), block, 0, active), result, None)
+    session.telemetry.process()
+    apply = time.perf_counter() - start
+    feed.close()
+    return {
+        "blocks": len(blocks),
+        "worker_s": round(worker, 4),
+        "result_dump_s": round(dump, 4),
+        "result_load_s": round(load, 4),
+        "result_bytes": sum(map(len, pickled)),
+        "apply_s": round(apply, 4),
+        "pool_s": round(worker + dump, 4),
+        "reader_s": round(load + apply, 4),
+    }
+
+
+def projected_mb_per_s(size, profile, workers):
+    # With a core per worker and one for the reader, the slower side sets the pace
+    return size / max(profile["reader_s"], profile["pool_s"] / workers) / 1e6
+
+
+def find_crossover(size, sequential_s, profile, max_workers=64):
+    # Fewest workers whose projected rate beats the single-thread receive path
+    sequential = size / sequential_s / 1e6
+    for workers in range(1, max_workers + 1):
+        if projected_mb_per_s(size, profile, workers) > sequential:
+            return workers
+    return None
+
+
+def run_scaling(worker_counts, megabytes, length):
+    # The single-thread receive path against pipeline mode at each worker
+    # count, plus where the pipeline's time goes and when it starts to pay off
+    data = make_traffic(megabytes, length)
+    profile = profile_pipeline(data)
+    results = []
+    baseline = None
+    for workers in [0] + worker_counts:
+        if workers:
+            elapsed, session = run_pipeline(data, workers)
+        else:
+            elapsed, session = run_sequential(data)
+        sink = session.response_queue
+        output = (sink.lines, sink.crc, session.undecodable_bytes,
+                  [rule.hits for rule in session.triggers.rules],
+                  sorted((name, series.count) for name, series in session.telemetry.series.items()))
+        if baseline is None:
+            baseline = output
+        result = {
+            "workers": workers,
+            "mode": "pipeline" if workers else "sequential",
+            "bytes": len(data),
+            "lines": sink.lines,
+            "seconds": round(elapsed, 4),
+            "mb_per_s": round(len(data) / elapsed / 1e6, 2),
+            "lines_per_s": round(sink.lines / elapsed),
+            "identical": output == baseline,
+        }
+        if workers:
+            result["projected_mb_per_s"] = round(projected_mb_per_s(len(data), profile, workers), 2)
+        results.append(result)
+        print(f"{result['mode']:<10} {workers:>2} workers  {result['mb_per_s']:>8} MB/s  "
+              f"{result['lines_per_s']:>10,} lines/s  identical {result['identical']}"
+              + (f"  projected {result['projected_mb_per_s']} MB/s" if workers else ""))
+    sequential = results[0]
+    measured = next((r["workers"] for r in results[1:]
+                     if r["identical"] and r["mb_per_s"] > sequential["mb_per_s"]), None)
+    projected = find_crossover(len(data), sequential["seconds"], profile)
+    crossover = {
+        "measured_workers": measured,
+        "projected_workers": projected,
+        "projected_cores": projected + 1 if projected else None,
+        "max_speedup": round(sequential["seconds"] / profile["reader_s"], 2),
+    }
+    print(f"profile: pool {profile['pool_s']} s (work {profile['worker_s']} s, pickling {profile['result_dump_s']} s), "
+          f"reader {profile['reader_s']} s (unpickling {profile['result_load_s']} s, apply {profile['apply_s']} s), "
+          f"sequential {sequential['seconds']} s")
+    if measured:
+        print(f"crossover: pipeline beats sequential from {measured} workers here")
+    else:
+        print(f"crossover: pipeline never beat sequential here ({os.cpu_count()} CPUs)")
+    if projected:
+        print(f"projected: from {projected} workers given {projected + 1} cores, "
+              f"at most {crossover['max_speedup']}x with enough cores")
+    else:
+        print("projected: no worker count beats sequential, the reader's share alone is slower")
+    return {"profile": profile, "crossover": crossover, "results": results}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serial Terminal I/O benchmark")
+    parser.add_argument("--transport", choices=list(TRANSPORTS), default="pty" if os.name == "posix" else "loopback")
+    parser.add_argument("--bauds", default="115200,921600,3000000")
+    parser.add_argument("--line-lengths", default="16,80,512")
+    parser.add_argument("--patterns", default="steady,burst")
+    parser.add_argument("--duration", type=float, default=3.0, help="seconds of traffic per scenario")
+    parser.add_argument("--gui", action="store_true", help="render through the Tk window instead of headless")
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--scaling", action="store_true",
+                        help="compare the single-thread receive path with pipeline mode instead")
+    parser.add_argument("--workers", default=",".join(str(1 << i) for i in range((os.cpu_count() or 1).bit_length())),
+                        help="pipeline worker counts for --scaling")
+    parser.add_argument("--megabytes", type=int, default=16, help="traffic per --scaling run")
+    args = parser.parse_args(argv)
+
+    if args.scaling:
+        length = int(args.line_lengths.split(",")[-1])
+        report = {
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "line_length": length,
+            "pipeline_available": st.pipeline_available,
+        }
+        report.update(run_scaling([int(n) for n in args.workers.split(",")], args.megabytes, length))
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
+        return
+
+    app = None
+    if args.gui:
+        root = st.tk.Tk()
+        app = st.SerialTerminal(root)
+
+    results = []
+    for baud in [int(b) for b in args.bauds.split(",")]:
+        for length in [int(n) for n in args.line_lengths.split(",")]:
+            for pattern in args.patterns.split(","):
+                if app:
+                    # Tk must run on the main thread, so the scenario runs beside it
+                    holder = {}
+
+                    def scenario():
+                        holder["result"] = run_scenario(args.transport, baud, length, pattern, args.duration, app)
+                        app.root.after(0, app.root.quit)
+
+                    threading.Thread(target=scenario, daemon=True).start()
+                    app.root.mainloop()
+                    result = holder["result"]
+                else:
+                    result = run_scenario(args.transport, baud, length, pattern, args.duration)
+                results.append(result)
+                print(f"{baud:>8} baud  {length:>4} B  {pattern:<6}  "
+                      f"{result['rx_bytes_per_s']:>10,} B/s  "
+                      f"p50 {result['latency']['p50_ms']} ms  p99 {result['latency']['p99_ms']} ms  "
+                      f"rtt p50 {result['command_rtt']['p50_ms']} ms  lost {result['lines_lost']}")
+
+    report = {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "transport": args.transport,
+        "duration_s": args.duration,
+        "results": results,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+    if app:
+        app.on_closing()
+
+
+if __name__ == "__main__":
+    main()
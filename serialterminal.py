@@ -1,671 +1,6970 @@
-import serial
-import threading
-from datetime import datetime
-import tkinter as tk
-from tkinter import ttk, scrolledtext, filedialog
-import re
-import logging
-from logging.handlers import RotatingFileHandler
-import json
-import serial.tools.list_ports
-from queue import Queue
-import platform
-import winreg
-import tkinter.font as tkfont
-import subprocess
-import shlex
-import os
-import sys
-from pathlib import Path
-import time
-import win32event
-import win32api
-import winerror
-
-# === prevent dublicate Startup ===
-mutex = win32event.CreateMutex(None, False, "Global\\MyUniqueBarcodeAppMutex")
-if win32api.GetLastError() == winerror.ERROR_ALREADY_EXISTS:
-    print("Another instance is already running.")
-    sys.exit(0)
-    
-# === CONFIGURATION ===
-DEFAULT_PORT = "COM1"
-DEFAULT_BAUDRATE = 9600
-TIMEOUT = 2.0
-EXPECTED_PORTS = ["COM1", "COM4"]
-SAVE_FILE = "saved_commands.json"
-# Get the user's default Documents folder
-documents_path = Path.home() / "Documents"
-# Create your app's folder inside Documents
-app_folder = documents_path / "Serial Terminal"
-app_folder.mkdir(parents=True, exist_ok=True)
-
-# Define paths to your files inside that folder
-LOG_FILE = app_folder / "serial_terminal.log"
-COMMANDS_FILE = app_folder / "saved_commands.json"
-
-# === Logging Setup ===
-# Set up rotating log file handler (e.g., 1 files of 50MB each)
-
-handler = RotatingFileHandler(LOG_FILE, maxBytes=50_000_000, backupCount=1)
-formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
-
-handler.setFormatter(formatter)
-
-logger = logging.getLogger()
-logger.setLevel(logging.INFO)
-logger.addHandler(handler)
-
-# === Helper: Get current time string ===
-def timestamp():
-    return datetime.now().strftime("%H:%M:%S")
-
-# === Helper: Get all COM ports from Windows registry (Windows only) ===
-def get_registry_com_ports():
-    com_ports = []
-    if platform.system() != "Windows":
-        return com_ports
-    try:
-        key = winreg.OpenKey(winreg.HKEY_LOCAL_MACHINE, r"HARDWARE\DEVICEMAP\SERIALCOMM")
-        i = 0
-        while True:
-            try:
-                name, value, _ = winreg.EnumValue(key, i)
-                com_ports.append(value)
-                logging.debug(f"Registry SERIALCOMM: {name} = {value}")
-                i += 1
-            except OSError:
-                break
-        winreg.CloseKey(key)
-        try:
-            key = winreg.OpenKey(winreg.HKEY_LOCAL_MACHINE, r"SYSTEM\CurrentControlSet\Services\com0com\Parameters")
-            i = 0
-            while True:
-                try:
-                    name, value, _ = winreg.EnumValue(key, i)
-                    if name.startswith("PortName"):
-                        com_ports.append(value)
-                        logging.debug(f"com0com registry: {name} = {value}")
-                    i += 1
-                except OSError:
-                    break
-            winreg.CloseKey(key)
-        except Exception as e:
-            logging.warning(f"com0com registry scan failed: {e}")
-    except Exception as e:
-        logging.warning(f"Failed to access registry for COM ports: {e}")
-    return sorted(set(com_ports))
-
-ansi_escape = re.compile(r'\x1B\[[0-?]*[ -/]*[@-~]')
-
-
-def clean_line(text):
-    logging.debug(f"Raw input: {repr(text)}")
-    text = ansi_escape.sub('', text)
-    text = text.replace('\r', '').replace('\x00', '').strip()
-    logging.debug(f"Cleaned: {repr(text)}")
-    return text
-
-
-class SerialTerminal:
-    def __init__(self, root):
-        self.root = root
-        self.root.title("Serial Terminal")
-        self.ser = None
-        self.reader_thread = None
-        self.response_queue = Queue()
-        self.command_queue = Queue()
-        self.running = False
-        self.setup_gui()
-        self.update_ports()
-        self.root.protocol("WM_DELETE_WINDOW", self.on_closing)
-        self.loaded_commands = False
-        self.load_saved_commands()
-        self.loaded_commands = True
-        self.hub4com_proc = None
-        self.com2tcp_proc = None  
-
-##        self.auto_save_commands()
-
-    def on_closing(self):
-        self.running = False  # Stop reader thread
-        if self.reader_thread and self.reader_thread.is_alive():
-            self.reader_thread.join(timeout=2)  # Wait up to 2 sec to stop
-        self.terminate_routing()  # Stop hub4com if running
-        self.save_saved_commands()
-        self.root.destroy()
-
-
-    def setup_gui(self):
-        # Use a frame to hold left and right side
-        main_frame = ttk.Frame(self.root)
-        main_frame.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
-
-        # Left frame: config + output + input
-        left_frame = ttk.Frame(main_frame)
-        left_frame.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-
-        # Config Frame
-        config_frame = ttk.Frame(left_frame)
-        config_frame.pack(padx=5, pady=5, fill=tk.X)
-
-        ttk.Label(config_frame, text="Port:").pack(side=tk.LEFT)
-        self.port_var = tk.StringVar(value=DEFAULT_PORT)
-        self.port_menu = ttk.Combobox(config_frame, textvariable=self.port_var, state="normal",width=8)
-        self.port_menu.pack(side=tk.LEFT, padx=5)
-        self.port_menu.bind("<Double-Button-1>", self.scan_ports)
-
-        ttk.Button(config_frame, text="Scan Ports", command=self.scan_ports).pack(side=tk.LEFT, padx=5)
-
-        ttk.Label(config_frame, text="Baud Rate:").pack(side=tk.LEFT,padx=3)
-        self.baud_var = tk.StringVar(value=str(DEFAULT_BAUDRATE))
-        self.baud_menu = ttk.Combobox(
-            config_frame, textvariable=self.baud_var, state="readonly",
-            values=["300", "1200", "2400", "4800", "9600", "19200", "38400", "57600", "115200"],
-            width=8 
-        )
-        self.baud_menu.pack(side=tk.LEFT, padx=5)
-
-        ttk.Label(config_frame, text="Parity:").pack(side=tk.LEFT)
-        self.parity_var = tk.StringVar(value="None")
-        self.parity_menu = ttk.Combobox(
-            config_frame, textvariable=self.parity_var, state="readonly",
-            values=["None", "Even", "Odd", "Mark", "Space"],
-            width=8
-        )
-        self.parity_menu.pack(side=tk.LEFT, padx=5)
-
-        self.connect_button = ttk.Button(config_frame, text="Connect", command=self.toggle_connect)
-        self.connect_button.pack(side=tk.LEFT, padx=5)
-
-        # Set smaller font about 85% of default for output text and saved commands
-        default_font = tkfont.nametofont("TkTextFont")
-        smaller_font = (default_font.actual("family"), max(10, int(default_font.actual("size") * 0.85)))
-
-        self.output_text = scrolledtext.ScrolledText(left_frame, height=20, width=20, state='disabled', font=smaller_font)
-        self.output_text.pack(padx=5, pady=5, fill=tk.BOTH, expand=True)
-
-        input_frame = ttk.Frame(left_frame)
-        input_frame.pack(padx=5, pady=5, fill=tk.X)
-        self.command_var = tk.StringVar()
-        self.command_entry = ttk.Entry(input_frame, width=20, textvariable=self.command_var)
-        self.command_entry.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=5)
-        self.command_entry.bind("<Return>", self.send_command)
-        ttk.Button(input_frame, text="Send", command=self.send_command).pack(side=tk.LEFT, padx=5)
-        ttk.Button(input_frame, text="Clear Output", command=self.clear_output).pack(side=tk.LEFT, padx=5)
-        ttk.Button(input_frame, text="Save Log", command=self.save_log).pack(side=tk.LEFT, padx=5)
-        ttk.Button(input_frame, text="Send File", command=self.send_commands_from_file).pack(side=tk.LEFT, padx=5)
-
-        # Right frame: saved commands buttons and entries
-        self.saved_cmd_frame = ttk.Frame(main_frame)
-        self.saved_cmd_frame.pack(side=tk.RIGHT, fill=tk.Y, padx=5, pady=5)
-
-        self.saved_commands = [tk.StringVar() for _ in range(10)]
-
-        smaller_font_entry = (default_font.actual("family"), max(9, int(default_font.actual("size") * 0.85)))
-
-        ttk.Label(self.saved_cmd_frame, text="Saved Commands:").grid(row=0, column=0, pady=(0,5))
-
-        self.saved_buttons = []
-        
-        # Frame for COM port routing (hub4com)
-        self.com2tcp_port = tk.StringVar()
-        ttk.Label(self.saved_cmd_frame, text="Routing (hub4com-com2tcp):").grid(row=12, column=0, columnspan=1, pady=(1, 2))
-
-        self.com_dest1 = tk.StringVar()
-        self.com_dest2 = tk.StringVar()
-        self.com_dest3 = tk.StringVar()
-
-
-        ports = get_registry_com_ports()
-        port_choices = [""] + ports
-
-        ttk.Label(self.saved_cmd_frame, text="Source:").grid(row=13, column=0, sticky=tk.W)
-        self.com_source = tk.StringVar()
-        self.source_menu = ttk.Combobox(self.saved_cmd_frame, textvariable=self.com_source, values=port_choices, width=10, state="readonly")
-        self.source_menu.grid(row=13, column=1)
-        if "COM1" in ports:
-            self.com_source.set("COM1")
-
-
-        ttk.Label(self.saved_cmd_frame, text="Dest 1:").grid(row=14, column=0, sticky=tk.W)
-        self.dest1_menu = ttk.Combobox(self.saved_cmd_frame, textvariable=self.com_dest1, values=port_choices, width=10, state="readonly")
-        self.dest1_menu.grid(row=14, column=1)
-
-        ttk.Label(self.saved_cmd_frame, text="Dest 2:").grid(row=15, column=0, sticky=tk.W)
-        self.dest2_menu = ttk.Combobox(self.saved_cmd_frame, textvariable=self.com_dest2, values=port_choices, width=10, state="readonly")
-        self.dest2_menu.grid(row=15, column=1)
-
-        ttk.Label(self.saved_cmd_frame, text="Dest 3 (Telnet)").grid(row=16, column=0, sticky=tk.W)
-        self.dest3_menu = ttk.Combobox(self.saved_cmd_frame, textvariable=self.com_dest3, values=port_choices, width=10, state="readonly")
-        self.dest3_menu.grid(row=16, column=1)
-
-        self.com2tcp_menu = ttk.Combobox(self.saved_cmd_frame, textvariable=self.com2tcp_port, values=port_choices, width=10, state="readonly")
-        self.com2tcp_menu.grid(row=16, column=0, padx=(1, 0),sticky=tk.E)
-
-
-        ttk.Button(self.saved_cmd_frame, text="Start Routing", command=self.run_hub4com).grid(row=17, column=0, pady=(5, 0), sticky="w")
-        ttk.Button(self.saved_cmd_frame, text="Stop Routing", command=self.terminate_routing).grid(row=17, column=1, pady=(2, 0), sticky="e")
-        for i in range(10):
-            entry = ttk.Entry(self.saved_cmd_frame, textvariable=self.saved_commands[i], width=25, font=smaller_font_entry)
-            entry.grid(row=i+1, column=0, padx=5, pady=2)
-            btn = ttk.Button(self.saved_cmd_frame, text=f"Send {i+1}", width=8, command=lambda i=i: self.send_saved_command(i))
-            btn.grid(row=i+1, column=1, padx=5, pady=2)
-            self.saved_buttons.append(btn)
-
-        self.status_var = tk.StringVar(value="Disconnected")
-        ttk.Label(self.root, textvariable=self.status_var, relief=tk.SUNKEN, anchor=tk.W).pack(fill=tk.X, padx=5, pady=2)
-        # led indicating routing is running
-        self.led_label = tk.Label(self.saved_cmd_frame, text="●", font=("Arial", 18))
-        self.led_label.grid(row=12, column=1, padx=10, sticky="ew")  # adjust position
-        self.update_routing_led(False)  # Start as red
-
-
-    def save_saved_commands(self):
-        try:
-            data = [cmd.get() for cmd in self.saved_commands]
-            with open(COMMANDS_FILE, "w", encoding="utf-8") as f:
-                json.dump(data, f, indent=2)
-        except Exception as e:
-            self.log_output(f"[Error] Failed to save commands: {e}")
-
-    def load_saved_commands(self):
-        if COMMANDS_FILE.exists():
-            try:
-                with open(COMMANDS_FILE, "r", encoding="utf-8") as f:
-                    data = json.load(f)
-                for i, cmd in enumerate(data):
-                    if i < len(self.saved_commands):
-                        self.saved_commands[i].set(cmd)
-            except Exception as e:
-                self.log_output(f"[Error] Failed to load saved commands: {e}")
-
-
-
-
-    def update_ports(self):
-        try:
-            ports_info = list(serial.tools.list_ports.comports())
-            ports = [port.device for port in ports_info]
-
-            # Add registry ports if not already in the list
-            registry_ports = get_registry_com_ports()
-            for port in registry_ports:
-                if port not in ports:
-                    ports.append(port)
-
-            # Sort ports numerically by COM number (e.g., COM1 < COM10)
-            def port_sort_key(p):
-                return int(p.replace("COM", "")) if p.startswith("COM") and p[3:].isdigit() else float('inf')
-
-            display_ports = sorted(ports, key=port_sort_key)
-
-            # Update all drop-down menus except dest3
-            dropdowns = [
-                (self.port_menu, self.port_var),
-                (self.source_menu, self.com_source),
-                (self.dest1_menu, self.com_dest1),
-                (self.dest2_menu, self.com_dest2),
-            ]
-
-            for menu, var in dropdowns:
-                menu['values'] = display_ports if display_ports else ["No ports found"]
-                if display_ports:
-                    selected_port = display_ports[0]
-                    var.set(selected_port)
-                else:
-                    var.set("No ports found")
-
-            # For dest3, add blank option
-            self.dest3_menu['values'] = [""] + (display_ports if display_ports else ["No ports found"])
-            self.com_dest3.set("")  # Default to blank
-            self.status_var.set("Ports updated")
-            # For com2tcp, add blank option
-            self.com2tcp_menu['values'] = [""] + (display_ports if display_ports else ["No ports found"])
-            self.com2tcp_menu.set("")  # Default to blank
-            self.status_var.set("Ports updated")
-
-        except Exception as e:
-            self.log_output(f"[Error] Port scan failed: {e}")
-            self.status_var.set(f"Error: {e}")
-     
-
-    def scan_ports(self, event=None):
-        self.update_ports()
-        self.status_var.set("Ports scanned")
-
-
-    def toggle_connect(self):
-        if self.ser and self.ser.is_open:
-            self.disconnect()
-        else:
-            self.connect()
-
-    def connect(self):
-        try:
-            port = self.port_var.get().split(" - ")[0] if " - " in self.port_var.get() else self.port_var.get()
-            baudrate = int(self.baud_var.get())
-            parity = {
-                "None": serial.PARITY_NONE,
-                "Even": serial.PARITY_EVEN,
-                "Odd": serial.PARITY_ODD,
-                "Mark": serial.PARITY_MARK,
-                "Space": serial.PARITY_SPACE
-            }[self.parity_var.get()]
-            self.ser = serial.Serial(
-                port=port,
-                baudrate=baudrate,
-                parity=parity,
-                bytesize=serial.EIGHTBITS,
-                stopbits=serial.STOPBITS_ONE,
-                timeout=TIMEOUT
-            )
-            self.running = True
-            self.reader_thread = threading.Thread(target=self.reader, daemon=True)
-            self.reader_thread.start()
-            self.root.after(100, self.process_queue)
-            self.connect_button.configure(text="Disconnect")
-            self.log_output(f"[{timestamp()}] Connected to {port} at {baudrate} baud")
-            self.status_var.set(f"Connected to {port}")
-            self.command_entry.focus()
-        except Exception as e:
-            self.log_output(f"[Error] Failed to connect: {e}")
-            self.status_var.set(f"Error: {e}")
-
-    def disconnect(self):
-        if self.ser and self.ser.is_open:
-            self.running = False
-            self.ser.close()
-            self.ser = None
-            self.connect_button.configure(text="Connect")
-            self.log_output(f"[{timestamp()}] Port closed")
-            self.status_var.set("Disconnected")
-
-    def reader(self):
-        buffer = ""
-        while self.running and self.ser and self.ser.is_open:
-            try:
-                chunk = self.ser.read(self.ser.in_waiting or 1)
-                if not chunk:
-                    continue
-                decoded = chunk.decode(errors='ignore')
-                if not decoded:
-                    continue
-                buffer += decoded
-                if '\r' in buffer or '\n' in buffer:
-                    lines = re.split(r'[\r\n]+', buffer)
-                    for line in lines[:-1]:
-                        cleaned = clean_line(line)
-                        if not cleaned:
-                            continue
-                        try:
-                            cmd = self.command_queue.get_nowait() if not self.command_queue.empty() else "Unknown"
-                        except Queue.Empty:
-                            cmd = "Unknown"
-                        self.response_queue.put((cmd, cleaned))
-                    buffer = lines[-1]
-            except Exception as e:
-                self.log_output(f"[Error] Reader error: {e}")
-                self.status_var.set(f"Error: {e}")
-                break
-
-    def send_command(self, event=None):
-        cmd = self.command_var.get().strip()
-        if not cmd:
-            return
-        if cmd.lower() in ['exit', 'quit']:
-            self.disconnect()
-            self.root.quit()
-            return
-        if not self.ser or not self.ser.is_open:
-            self.log_output("[Error] Not connected")
-            self.status_var.set("Error: Not connected")
-            return
-        try:
-            self.command_queue.put(cmd)
-            self.ser.write((cmd + '\r\n').encode())
-            self.ser.flush()
-            self.log_output(f"[{timestamp()}] >> {cmd}")
-            self.command_var.set("")
-        except Exception as e:
-            self.log_output(f"[Error] Failed to send: {e}")
-            self.status_var.set(f"Error: {e}")
-
-    def send_saved_command(self, index):
-        command = self.saved_commands[index].get()
-        if command:
-            if not self.ser or not self.ser.is_open:
-                self.log_output("[Error] Not connected")
-                self.status_var.set("Error: Not connected")
-                return
-            try:
-                self.command_queue.put(command)
-                self.ser.write((command + '\r\n').encode())
-                self.ser.flush()
-                self.log_output(f"[{timestamp()}] >> {command}")
-            except Exception as e:
-                self.log_output(f"[Error] Failed to send: {e}")
-                self.status_var.set(f"Error: {e}")
-
-    def process_queue(self):
-        try:
-            last_cmd = None
-            last_response = None
-            while not self.response_queue.empty():
-                cmd, response = self.response_queue.get_nowait()
-                self.log_output(f"[{timestamp()}] << {response}")
-                if cmd != "Unknown":
-                    last_cmd = cmd
-                    last_response = response
-            if last_response:
-                self.status_var.set(f"Response: {last_response}")
-        except Queue.Empty:
-            pass
-        if self.running:
-            self.root.after(100, self.process_queue)
-
-    def save_log(self):
-        try:
-            file_path = filedialog.asksaveasfilename(
-                defaultextension=".txt",
-                filetypes=[("Text files", "*.txt"), ("All files", "*.*")],
-                title="Save Log As"
-            )
-            if file_path:
-                self.output_text.configure(state='normal')
-                content = self.output_text.get(1.0, tk.END).strip()
-                self.output_text.configure(state='disabled')
-                with open(file_path, 'w', encoding='utf-8') as f:
-                    f.write(content)
-                self.log_output(f"[{timestamp()}] Log saved to {file_path}")
-                self.status_var.set(f"Log saved to {file_path}")
-        except Exception as e:
-            self.log_output(f"[Error] Failed to save log: {e}")
-            self.status_var.set(f"Error: Failed to save log - {e}")
-
-    def log_output(self, text):
-        # If text already has timestamp pattern at start, don't add again
-        if re.match(r"^\[\d{2}:\d{2}:\d{2}\]", text):
-            line = text
-        else:
-            timestamp = datetime.now().strftime("%H:%M:%S")
-            line = f"[{timestamp}] {text}"
-        
-        if hasattr(self, 'output_text'):
-            self.output_text.configure(state='normal')
-            self.output_text.insert(tk.END, line + "\n")
-            self.output_text.see(tk.END)
-            self.output_text.configure(state='disabled')
-        
-        try:
-            logger.info(line)
-        except Exception as e:
-            print(f"[Error writing log] {e}")
-
-    def clear_output(self):
-        self.output_text.configure(state='normal')
-        self.output_text.delete(1.0, tk.END)
-        self.output_text.configure(state='disabled')
-    def terminate_routing(self):
-        self.update_routing_led(False)
-        if self.hub4com_proc:
-            try:
-                if self.hub4com_proc.poll() is None:
-                    self.hub4com_proc.terminate()
-                    self.hub4com_proc.wait(timeout=2)
-                    self.log_output("[Info] hub4com routing terminated.")
-                    
-                else:
-                    self.log_output("[Info] hub4com already stopped.")
-            except Exception as e:
-                self.log_output(f"[Error] Failed to terminate hub4com: {e}")
-            finally:
-                self.hub4com_proc = None
-
-    def verify_hub4com_started(self):
-        if self.hub4com_proc.poll() is not None:
-            output = self.hub4com_proc.stdout.read().decode(errors="ignore")
-            self.log_output(f"[hub4com Error] {output.strip()}")
-            self.status_var.set("hub4com failed to start.")
-            self.update_routing_led(False)
-            self.hub4com_proc = None
-        else:
-            self.update_routing_led(True)
-            self.status_var.set("hub4com routing started.")
-    def verify_com2tcp_started(self):
-
-        if self.com2tcp_proc and self.com2tcp_proc.poll() is not None:
-            output = self.com2tcp_proc.stdout.read().decode(errors="ignore")
-            self.log_output(f"[com2tcp Error] {output.strip()}")
-            self.status_var.set("com2tcp failed to start.")
-            self.com2tcp_proc = None
-        else:
-            self.status_var.set("com2tcp started (telnet on port 23).")
-            self.log_output("[Info] com2tcp started.")
-
-
-    def run_hub4com(self):
-        try:
-            # Prevent launching if already running
-            if self.hub4com_proc and self.hub4com_proc.poll() is None:
-                self.log_output("[Info] hub4com is already running.")
-                return
-
-            source_port = self.com_source.get().strip()
-            if not source_port:
-                self.log_output("[Error] Source COM port not selected.")
-                return
-
-            dest_ports = []
-            for var in [self.com_dest1, self.com_dest2, self.com_dest3]:
-                val = var.get().strip()
-                if val:
-                    dest_ports.append(f"\\\\.\\{val}")
-
-            if not dest_ports:
-                self.log_output("[Error] At least one destination COM port is required.")
-                return
-
-            full_command = [
-                r"C:\Program Files (x86)\com0com\hub4com.exe",
-                "--baud=9600", "--octs=off", "--route=All:All",
-                f"\\\\.\\{source_port}"
-            ] + dest_ports
-
-            # Hide console window on Windows
-            startupinfo = subprocess.STARTUPINFO()
-            startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
-
-            self.log_output(f"[Launching] {' '.join(full_command)}")
-
-            self.hub4com_proc = subprocess.Popen(
-                full_command,
-                startupinfo=startupinfo,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.STDOUT
-            )
-
-            self.root.after(500, self.verify_hub4com_started)
-
-        except Exception as e:
-            self.log_output(f"[Error] Failed to launch hub4com: {e}")
-        # If Dest 3 is used, start com2tcp on that port
-        dest3_port = self.com_dest3.get().strip()
-        tcp_port = self.com2tcp_port.get().strip()
-        if dest3_port:
-            try:
-                com2tcp_command = [
-                    r"C:\Program Files (x86)\com0com\com2tcp.bat",
-                    "--telnet",
-                    f"\\\\.\\{tcp_port}",
-                    "23"
-                ]
-
-                startupinfo = subprocess.STARTUPINFO()
-                startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
-
-                self.log_output(f"[Launching] {' '.join(com2tcp_command)}")
-
-                self.com2tcp_proc = subprocess.Popen(
-                    com2tcp_command,
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.STDOUT,
-                    startupinfo=startupinfo
-                )
-
-                self.root.after(500, self.verify_com2tcp_started)
-
-            except Exception as e:
-                self.log_output(f"[Error] Failed to launch com2tcp: {e}")
-
-    def update_routing_led(self, is_running: bool):
-        self.led_label.config(fg="green" if is_running else "red")
-    def send_commands_from_file(self):
-        file_path = filedialog.askopenfilename(
-            filetypes=[("Text Files", "*.txt")],
-            title="Select Command File"
-        )
-        if file_path:
-            threading.Thread(
-                target=self._send_file_commands_thread,
-                args=(file_path,),
-                daemon=True
-            ).start()
-
-    def _send_file_commands_thread(self, file_path, delay_ms=500):
-        if not self.ser or not self.ser.is_open:
-            self.log_output("[Error] Not connected")
-            self.status_var.set("Error: Not connected")
-            return
-
-        try:
-            with open(file_path, "r", encoding="utf-8") as f:
-                lines = f.readlines()
-
-            for line in lines:
-                cmd = line.strip()
-                if not cmd or cmd.startswith("#"):  # Allow comments
-                    continue
-                self.command_queue.put(cmd)
-                self.ser.write((cmd + '\r\n').encode())
-                self.ser.flush()
-                self.log_output(f"[{timestamp()}] >> {cmd}")
-                time.sleep(delay_ms / 1000.0)
-
-            self.status_var.set("Finished sending file commands.")
-        except Exception as e:
-            self.log_output(f"[Error] Failed to send file: {e}")
-            self.status_var.set(f"Error: {e}")
-    def run(self):
-        self.root.mainloop()
-
-if __name__ == "__main__":
-    root = tk.Tk()
-    icon_path = app_folder / "app_icon.ico"
-    try:
-        root.iconbitmap(icon_path)  # Replace with icon path
-    except Exception as e:
-        print(f"Failed to set icon: {e}")
-    app = SerialTerminal(root)
-    app.run()
-
+import time
+IMPORT_STARTED = time.perf_counter()  # for --profile-startup
+
+import serial
+import threading
+from datetime import datetime
+import tkinter as tk
+from tkinter import ttk, scrolledtext, filedialog
+import re
+import logging
+from logging.handlers import RotatingFileHandler, QueueHandler
+import json
+import struct
+import bisect
+import heapq
+import mmap
+import tempfile
+from array import array
+import selectors
+import socket
+import csv
+from collections import deque
+from itertools import accumulate, count, groupby, islice
+import codecs
+import serial.tools.list_ports
+from queue import Queue, Empty, Full
+import platform
+import tkinter.font as tkfont
+import shlex
+import os
+import sys
+import importlib.util
+from pathlib import Path
+import gzip
+import shutil
+import atexit
+from abc import ABC, abstractmethod
+
+# === CONFIGURATION ===
+DEFAULT_PORT = "COM1"
+DEFAULT_BAUDRATE = 9600
+TIMEOUT = 2.0
+EXPECTED_PORTS = ["COM1", "COM4"]
+SAVE_FILE = "saved_commands.json"
+# Get the user's default Documents folder
+documents_path = Path.home() / "Documents"
+# Create your app's folder inside Documents
+app_folder = documents_path / "Serial Terminal"
+app_folder.mkdir(parents=True, exist_ok=True)
+
+# Define paths to your files inside that folder
+LOG_FILE = app_folder / "serial_terminal.log"
+COMMANDS_FILE = app_folder / "saved_commands.json"
+TRIGGERS_FILE = app_folder / "triggers.json"
+TELEMETRY_FILE = app_folder / "telemetry.json"
+LOCK_FILE = app_folder / "serial_terminal.lock"
+
+# === Platform ===
+# Windows-only and rarely used modules are imported on first use, so the
+# module imports quickly (and headless on Linux) and the window shows sooner.
+IS_WINDOWS = platform.system() == "Windows"
+
+
+def lazy_import(name):
+    # Module whose code runs on first attribute access
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    parent, _, child = name.rpartition(".")
+    if parent:
+        # As a normal import does: asyncio reads concurrent.futures off its package
+        setattr(importlib.import_module(parent), child, module)
+    loader.exec_module(module)
+    return module
+
+
+asyncio = lazy_import("asyncio")          # remote monitoring servers
+http_server = lazy_import("http.server")  # metrics endpoint
+futures = lazy_import("concurrent.futures")     # receive pipeline process pool
+multiprocessing = lazy_import("multiprocessing")
+
+
+class SingleInstance:
+    # Exclusive lock on a file in the app folder, held while the app runs.
+    # The OS drops it if the process dies, so a crash never leaves it stale.
+    def __init__(self, path=LOCK_FILE):
+        self.path = Path(path)
+        self.file = None
+
+    def acquire(self):
+        f = open(self.path, "a+")
+        try:
+            if IS_WINDOWS:
+                import msvcrt
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+            else:
+                import fcntl
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            f.close()
+            return False
+        f.seek(0)
+        f.truncate()
+        f.write(str(os.getpid()))
+        f.flush()
+        self.file = f
+        return True
+
+    def release(self):
+        if self.file:
+            self.file.close()  # closing the file releases the lock
+            self.file = None
+
+
+class StartupProfile:
+    # Time spent per startup phase, printed with --profile-startup
+    def __init__(self, enabled=False, started=IMPORT_STARTED):
+        self.enabled = enabled
+        self.started = started
+        self.last = started
+        self.phases = []
+        self.mark("import")
+
+    def mark(self, phase):
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        self.phases.append((phase, now - self.last))
+        self.last = now
+
+    def report(self):
+        if not self.enabled:
+            return
+        total = self.last - self.started
+        lines = [f"{phase:<16}{seconds * 1000:8.1f} ms" for phase, seconds in self.phases]
+        lines.append(f"{'total':<16}{total * 1000:8.1f} ms")
+        print("Startup profile:\n" + "\n".join(lines))
+        logger.info("Startup profile: " + ", ".join(f"{p} {s * 1000:.1f} ms" for p, s in self.phases))
+
+
+# === Logging Setup ===
+# Log records go through a queue to a background writer thread, so the GUI thread
+# never waits on disk. Rotated segments are gzipped in the background.
+LOG_MAX_BYTES = 50_000_000
+LOG_BACKUP_COUNT = 30          # number of compressed segments to keep
+LOG_RETENTION_DAYS = 14        # compressed segments older than this are deleted
+LOG_FLUSH_INTERVAL = 1.0       # seconds between flushes of buffered log lines
+LOG_FLUSH_BYTES = 256 * 1024   # flush earlier if this much is buffered
+LOG_BATCH_SIZE = 1000          # max records written per writer wake-up
+
+
+class CompressingRotatingFileHandler(RotatingFileHandler):
+    # RotatingFileHandler that buffers writes (flush is driven by LogWriter)
+    # and compresses rotated segments on a background thread. The file opens on
+    # the first record, so a process that imports this module but never logs
+    # doesn't hold it open (which would block rotation on Windows)
+    def __init__(self, filename, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT,
+                 retention_days=LOG_RETENTION_DAYS, encoding="utf-8"):
+        super().__init__(filename, maxBytes=maxBytes, backupCount=backupCount, encoding=encoding, delay=True)
+        self.retention_days = retention_days
+        self.namer = lambda name: name + ".gz"
+        self.rotator = self.compress_segment
+        self.pending_bytes = 0
+        self.last_flush = time.monotonic()
+
+    def emit(self, record):
+        try:
+            if self.shouldRollover(record):
+                self.doRollover()
+            if self.stream is None:
+                self.stream = self._open()
+            msg = self.format(record) + self.terminator
+            self.stream.write(msg)
+            self.pending_bytes += len(msg)
+        except Exception:
+            self.handleError(record)
+
+    def flush_if_due(self, force=False):
+        now = time.monotonic()
+        if not self.pending_bytes:
+            self.last_flush = now
+            return
+        if force or self.pending_bytes >= LOG_FLUSH_BYTES or now - self.last_flush >= LOG_FLUSH_INTERVAL:
+            self.flush()
+            self.pending_bytes = 0
+            self.last_flush = now
+
+    def compress_segment(self, source, dest):
+        # Move the full segment aside right away, gzip it without blocking logging
+        temp = f"{source}.{time.time_ns()}.rotating"
+        os.replace(source, temp)
+        self.pending_bytes = 0
+        threading.Thread(target=self._compress, args=(temp, dest), daemon=True).start()
+
+    def _compress(self, temp, dest):
+        try:
+            with open(temp, "rb") as src, gzip.open(dest, "wb", compresslevel=6) as dst:
+                shutil.copyfileobj(src, dst, 1024 * 1024)
+            os.remove(temp)
+        except Exception as e:
+            print(f"[Error compressing log] {e}")
+        self.prune_old_segments()
+
+    def prune_old_segments(self):
+        if not self.retention_days:
+            return
+        cutoff = time.time() - self.retention_days * 86400
+        base = Path(self.baseFilename)
+        for path in base.parent.glob(base.name + ".*.gz"):
+            try:
+                if path.stat().st_mtime < cutoff:
+                    path.unlink()
+            except OSError:
+                pass
+
+
+class LogWriter(threading.Thread):
+    # Drains the log queue in batches and hands records to the file handler
+    def __init__(self, log_queue, file_handler):
+        super().__init__(name="LogWriter", daemon=True)
+        self.log_queue = log_queue
+        self.file_handler = file_handler
+
+    def run(self):
+        stopping = False
+        while not stopping:
+            try:
+                batch = [self.log_queue.get(timeout=LOG_FLUSH_INTERVAL)]
+            except Empty:
+                batch = []
+            try:
+                while len(batch) < LOG_BATCH_SIZE:
+                    batch.append(self.log_queue.get_nowait())
+            except Empty:
+                pass
+            for record in batch:
+                if record is None:
+                    stopping = True
+                    continue
+                self.file_handler.handle(record)
+            self.file_handler.flush_if_due(force=stopping)
+
+    def stop(self, timeout=2):
+        if self.is_alive():
+            self.log_queue.put(None)
+            self.join(timeout=timeout)
+
+
+logger = logging.getLogger("serialterminal")
+log_writer = None
+
+
+def init_logging(path=LOG_FILE, level=logging.INFO):
+    # Called from main(), so importing the module (tests, benchmark.py) starts
+    # no thread and leaves the root logger alone
+    global log_writer
+    if log_writer:
+        return log_writer
+    file_handler = CompressingRotatingFileHandler(path)
+    file_handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
+    log_queue = Queue()
+    logger.setLevel(level)
+    logger.addHandler(QueueHandler(log_queue))
+    logger.propagate = False
+    log_writer = LogWriter(log_queue, file_handler)
+    log_writer.start()
+    atexit.register(log_writer.stop)
+    return log_writer
+
+
+# === Helper: Get current time string ===
+def timestamp():
+    return datetime.now().strftime("%H:%M:%S")
+
+# === Helper: Percentile of an already sorted list ===
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    k = (len(sorted_values) - 1) * pct / 100.0
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+# === Helper: Get all COM ports from Windows registry (Windows only) ===
+def get_registry_com_ports():
+    com_ports = []
+    if not IS_WINDOWS:
+        return com_ports
+    import winreg
+    try:
+        key = winreg.OpenKey(winreg.HKEY_LOCAL_MACHINE, r"HARDWARE\DEVICEMAP\SERIALCOMM")
+        i = 0
+        while True:
+            try:
+                name, value, _ = winreg.EnumValue(key, i)
+                com_ports.append(value)
+                logger.debug(f"Registry SERIALCOMM: {name} = {value}")
+                i += 1
+            except OSError:
+                break
+        winreg.CloseKey(key)
+        try:
+            key = winreg.OpenKey(winreg.HKEY_LOCAL_MACHINE, r"SYSTEM\CurrentControlSet\Services\com0com\Parameters")
+            i = 0
+            while True:
+                try:
+                    name, value, _ = winreg.EnumValue(key, i)
+                    if name.startswith("PortName"):
+                        com_ports.append(value)
+                        logger.debug(f"com0com registry: {name} = {value}")
+                    i += 1
+                except OSError:
+                    break
+            winreg.CloseKey(key)
+        except Exception as e:
+            logger.warning(f"com0com registry scan failed: {e}")
+    except Exception as e:
+        logger.warning(f"Failed to access registry for COM ports: {e}")
+    return sorted(set(com_ports))
+
+# === Port inventory ===
+# A background thread keeps the list of ports and reports what was plugged in
+# or removed, so the GUI never waits on comports() or the registry walk.
+PORT_SCAN_INTERVAL = 1.0  # seconds between scans
+
+
+class PortInfo:
+    __slots__ = ("device", "description", "vid", "pid", "serial_number")
+
+    def __init__(self, device, description="", vid=None, pid=None, serial_number=None):
+        self.device = device
+        self.description = description
+        self.vid = vid
+        self.pid = pid
+        self.serial_number = serial_number
+
+    @property
+    def identity(self):
+        # Same USB adapter even if it comes back under another name
+        return (self.vid, self.pid, self.serial_number) if self.vid is not None else None
+
+    def __str__(self):
+        text = self.device
+        if self.description and self.description != "n/a":
+            text += f" - {self.description}"
+        if self.vid is not None:
+            text += f" [{self.vid:04X}:{self.pid:04X}"
+            text += f" SN {self.serial_number}]" if self.serial_number else "]"
+        return text
+
+
+def enumerate_ports(watched=()):
+    # device -> PortInfo. Watched paths (ptys, socat links) are not listed by
+    # comports(), so they are included while they exist
+    ports = {}
+    for p in serial.tools.list_ports.comports():
+        ports[p.device] = PortInfo(p.device, p.description, p.vid, p.pid, p.serial_number)
+    for device in get_registry_com_ports():
+        ports.setdefault(device, PortInfo(device))
+    for device in watched:
+        if device not in ports and os.path.exists(device):
+            ports[device] = PortInfo(device, "pty" if device.startswith("/dev/pts/") else "")
+    return ports
+
+
+class PortMonitor(threading.Thread):
+    def __init__(self, interval=PORT_SCAN_INTERVAL):
+        super().__init__(name="PortMonitor", daemon=True)
+        self.interval = interval
+        self.inventory = {}       # replaced as a whole after each scan
+        self.watched = frozenset()
+        self.changes = Queue()    # (added, removed) lists of PortInfo
+        self.wake = threading.Event()
+        self.running = True
+        self.scans = 0
+        self.scan_seconds = None
+
+    def run(self):
+        while self.running:
+            self.scan()
+            self.wake.wait(self.interval)
+            self.wake.clear()
+
+    def scan(self):
+        started = time.perf_counter()
+        try:
+            current = enumerate_ports(self.watched)
+        except Exception as e:
+            logger.warning(f"Port scan failed: {e}")
+            return
+        previous = self.inventory
+        added = [info for device, info in current.items() if device not in previous]
+        removed = [info for device, info in previous.items() if device not in current]
+        self.inventory = current
+        self.scans += 1
+        self.scan_seconds = time.perf_counter() - started
+        if added or removed or self.scans == 1:
+            self.changes.put((added, removed))
+
+    def rescan(self):
+        self.wake.set()
+
+    def watch(self, device):
+        if device not in self.watched:
+            self.watched = self.watched | {device}
+            self.rescan()
+
+    def find(self, identity):
+        # Port currently holding this adapter, if it is plugged in
+        if identity is None:
+            return None
+        return next((info for info in self.inventory.values() if info.identity == identity), None)
+
+    def stop(self):
+        self.running = False
+        self.wake.set()
+        self.join(timeout=2)
+
+ansi_escape = re.compile(r'\x1B\[[0-?]*[ -/]*[@-~]')
+
+# === Framing ===
+# Display name -> (mode, terminator) used by the "Framing" drop-down
+FRAMING_MODES = {
+    "CR/LF (any)": ("line", None),
+    "LF": ("delimiter", b"\n"),
+    "CR": ("delimiter", b"\r"),
+    "CRLF": ("delimiter", b"\r\n"),
+}
+DEFAULT_FRAMING = "CR/LF (any)"
+MAX_FRAME_SIZE = 64 * 1024
+
+# === Output rendering ===
+MAX_OUTPUT_LINES = 20000     # output widget keeps at most this many lines
+TRIM_CHUNK_LINES = 2000      # old lines are removed in blocks of this size
+MIN_TICK_MS = 20             # fastest process_queue interval under heavy traffic
+MAX_TICK_MS = 250            # slowest interval when the port is quiet
+MAX_LINES_PER_TICK = 5000    # cap per render so one tick never freezes the GUI
+
+line_break = re.compile(rb'[\r\n]+')
+text_line_break = re.compile(r'[\r\n]+')
+
+# Display modes for received data. "Text" strips escapes, "ANSI" renders them
+# (colours, "\r" overwrite; lines end at LF). Hex modes bypass framing and
+# decoding, so binary protocols are shown byte for byte, one row per HEX_ROW_BYTES.
+DISPLAY_MODES = {"Text": "text", "ANSI": "ansi", "Hex": "hex", "Hex+ASCII": "mixed"}
+DEFAULT_DISPLAY = "Text"
+HEX_ROW_BYTES = 16
+HEX_ROW_IDLE = 0.05  # seconds of silence that end a short hex row
+PRINTABLE_ASCII = bytes(b if 32 <= b < 127 else ord(".") for b in range(256))
+
+
+def hexdump_rows(data, mode="hex"):
+    # One hex() and one translate() per chunk, then sliced into rows; no
+    # per-byte Python work
+    width = HEX_ROW_BYTES * 3
+    hex_text = data.hex(" ").upper()
+    rows = [hex_text[i:i + width - 1] for i in range(0, len(hex_text), width)]
+    if mode == "mixed":
+        ascii_text = data.translate(PRINTABLE_ASCII).decode("ascii")
+        rows = [f"{row:<{width - 1}}  |{ascii_text[i:i + HEX_ROW_BYTES]}|"
+                for row, i in zip(rows, range(0, len(data), HEX_ROW_BYTES))]
+    return rows
+
+
+def encode_command(command, hex_mode=False):
+    # Hex input is sent as-is, text gets CRLF appended
+    if hex_mode:
+        return parse_hex(command)
+    return (command + '\r\n').encode()
+
+
+def parse_hex(text):
+    # "AA 55 01 FF", "aa,55,01,ff", "0xAA 0x55" or "AA5501FF" -> bytes
+    digits = re.sub(r"0[xX]|[\s,:;-]", "", text)
+    if not digits or len(digits) % 2:
+        raise ValueError(f"Invalid hex input: {text}")
+    return bytes.fromhex(digits)
+
+
+class LineFramer:
+    # Splits a raw byte stream into frames. Data is kept in one bytearray and only
+    # bytes that arrived since the last call are scanned for a terminator.
+    #   mode="line"      - split on any run of CR/LF (empty lines are dropped)
+    #   mode="delimiter" - split on `delimiter` (e.g. b"\n", b"\r\n" or any custom byte)
+    #   mode="fixed"     - frames of exactly `frame_length` bytes
+    #   mode="length"    - big-endian length prefix of `prefix_size` bytes (1, 2 or 4)
+    def __init__(self, mode="line", delimiter=b"\n", frame_length=0, prefix_size=1, max_frame=MAX_FRAME_SIZE):
+        if mode not in ("line", "delimiter", "fixed", "length"):
+            raise ValueError(f"Unknown framing mode: {mode}")
+        if mode == "delimiter" and not delimiter:
+            raise ValueError("Delimiter framing needs a non-empty delimiter")
+        if mode == "fixed" and frame_length <= 0:
+            raise ValueError("Fixed framing needs frame_length > 0")
+        if mode == "length" and prefix_size not in (1, 2, 4):
+            raise ValueError("Length prefix must be 1, 2 or 4 bytes")
+        self.mode = mode
+        self.delimiter = bytes(delimiter) if delimiter else b""
+        self.frame_length = frame_length
+        self.prefix_size = prefix_size
+        self.max_frame = max_frame
+        self.buffer = bytearray()
+        self.scan_pos = 0
+        self.oversized = 0  # frames cut because they exceeded max_frame
+
+    @classmethod
+    def from_name(cls, name, **kwargs):
+        mode, delimiter = FRAMING_MODES.get(name, FRAMING_MODES[DEFAULT_FRAMING])
+        return cls(mode=mode, delimiter=delimiter, **kwargs)
+
+    def reset(self):
+        self.buffer.clear()
+        self.scan_pos = 0
+
+    def pending(self):
+        return len(self.buffer)
+
+    def feed(self, data):
+        # Returns a list of complete frames (bytes) found after adding `data`
+        if data:
+            self.buffer += data
+        if self.mode == "line":
+            frames = self._split_lines()
+        elif self.mode == "delimiter":
+            frames = self._split_delimiter()
+        elif self.mode == "fixed":
+            frames = self._split_fixed()
+        else:
+            frames = self._split_length()
+        return frames
+
+    def flush(self):
+        # Return whatever is left as a final (unterminated) frame
+        rest = bytes(self.buffer)
+        self.reset()
+        return [rest] if rest else []
+
+    def _cut_oversized(self, frames):
+        while len(self.buffer) > self.max_frame:
+            frames.append(bytes(self.buffer[:self.max_frame]))
+            del self.buffer[:self.max_frame]
+            self.oversized += 1
+        self.scan_pos = min(self.scan_pos, len(self.buffer))
+
+    def _split_lines(self):
+        frames = []
+        buf = self.buffer
+        start = 0
+        # A CR/LF run cut at a chunk boundary only yields an empty frame, which is skipped
+        for match in line_break.finditer(buf, self.scan_pos):
+            if match.start() > start:
+                frames.append(bytes(buf[start:match.start()]))
+            start = match.end()
+        if start:
+            del buf[:start]
+        self.scan_pos = len(buf)
+        self._cut_oversized(frames)
+        return frames
+
+    def _split_delimiter(self):
+        frames = []
+        buf = self.buffer
+        delim = self.delimiter
+        start = 0
+        # Multi-byte delimiters can straddle two chunks
+        pos = max(self.scan_pos - len(delim) + 1, 0)
+        while True:
+            idx = buf.find(delim, pos)
+            if idx < 0:
+                break
+            frames.append(bytes(buf[start:idx]))
+            start = pos = idx + len(delim)
+        if start:
+            del buf[:start]
+        self.scan_pos = len(buf)
+        self._cut_oversized(frames)
+        return frames
+
+    def _split_fixed(self):
+        size = self.frame_length
+        buf = self.buffer
+        count = len(buf) // size
+        if not count:
+            return []
+        view = memoryview(buf)
+        frames = [bytes(view[i * size:(i + 1) * size]) for i in range(count)]
+        view.release()
+        del buf[:count * size]
+        return frames
+
+    def _split_length(self):
+        frames = []
+        buf = self.buffer
+        size = self.prefix_size
+        start = 0
+        while len(buf) - start >= size:
+            length = int.from_bytes(buf[start:start + size], "big")
+            if length > self.max_frame:
+                # Corrupt prefix, resync by dropping the prefix byte
+                self.oversized += 1
+                start += 1
+                continue
+            end = start + size + length
+            if end > len(buf):
+                break
+            frames.append(bytes(buf[start + size:end]))
+            start = end
+        if start:
+            del buf[:start]
+        return frames
+
+
+# === Session capture ===
+# Append-only binary file of raw RX/TX chunks:
+#   file header  : magic, wall clock ns and monotonic ns at start
+#   each record  : monotonic ns, direction, port id, length, payload
+# A sidecar ".idx" file holds a sparse time -> offset index plus the offsets of
+# the port-name records, so a reader can jump into a multi-GB capture directly.
+CAPTURE_FOLDER = app_folder / "captures"
+CAPTURE_SUFFIX = ".stcap"
+CAPTURE_MAGIC = b"STCAP\x00\x01\n"
+CAPTURE_HEADER = struct.Struct("<8sqq")
+RECORD_HEADER = struct.Struct("<qBHI")
+INDEX_ENTRY = struct.Struct("<Bqq")
+CAPTURE_RX, CAPTURE_TX, CAPTURE_PORT, CAPTURE_NOTE = 0, 1, 2, 3
+DIRECTION_NAMES = {CAPTURE_RX: "RX", CAPTURE_TX: "TX", CAPTURE_PORT: "PORT", CAPTURE_NOTE: "NOTE"}
+INDEX_TIME, INDEX_PORT = 0, 1
+CAPTURE_INDEX_INTERVAL_NS = 1_000_000_000   # at least one index entry per second...
+CAPTURE_INDEX_BYTES = 1024 * 1024           # ...or per MB of capture
+
+
+def new_capture_path():
+    CAPTURE_FOLDER.mkdir(parents=True, exist_ok=True)
+    return CAPTURE_FOLDER / f"session_{datetime.now().strftime('%Y%m%d_%H%M%S')}{CAPTURE_SUFFIX}"
+
+
+class CaptureWriter:
+    def __init__(self, path):
+        self.path = Path(path)
+        self.lock = threading.Lock()
+        self.file = open(self.path, "wb", buffering=1024 * 1024)
+        self.index_file = open(f"{self.path}.idx", "wb", buffering=64 * 1024)
+        self.start_wall_ns = time.time_ns()
+        self.start_mono_ns = time.monotonic_ns()
+        self.file.write(CAPTURE_HEADER.pack(CAPTURE_MAGIC, self.start_wall_ns, self.start_mono_ns))
+        self.offset = CAPTURE_HEADER.size
+        self.ports = {}
+        self.last_index_ns = None
+        self.last_index_offset = 0
+        self.records = 0
+
+    def write(self, direction, port, data, ts_ns=None):
+        # Called from the reader/writer threads with whole chunks, never per byte
+        if ts_ns is None:
+            ts_ns = time.monotonic_ns()
+        with self.lock:
+            if self.file is None:
+                return
+            port_id = self.ports.get(port)
+            if port_id is None:
+                port_id = self._add_port(port, ts_ns)
+            self._record(ts_ns, direction, port_id, data)
+
+    def note(self, port, text):
+        self.write(CAPTURE_NOTE, port, text.encode("utf-8"))
+
+    def _add_port(self, port, ts_ns):
+        port_id = len(self.ports)
+        self.ports[port] = port_id
+        self.index_file.write(INDEX_ENTRY.pack(INDEX_PORT, ts_ns, self.offset))
+        self._record(ts_ns, CAPTURE_PORT, port_id, str(port).encode("utf-8"))
+        return port_id
+
+    def _record(self, ts_ns, direction, port_id, data):
+        if (self.last_index_ns is None
+                or ts_ns - self.last_index_ns >= CAPTURE_INDEX_INTERVAL_NS
+                or self.offset - self.last_index_offset >= CAPTURE_INDEX_BYTES):
+            self.index_file.write(INDEX_ENTRY.pack(INDEX_TIME, ts_ns, self.offset))
+            self.last_index_ns = ts_ns
+            self.last_index_offset = self.offset
+        self.file.write(RECORD_HEADER.pack(ts_ns, direction, port_id, len(data)))
+        self.file.write(data)
+        self.offset += RECORD_HEADER.size + len(data)
+        self.records += 1
+
+    def flush(self):
+        with self.lock:
+            if self.file is not None:
+                self.file.flush()
+                self.index_file.flush()
+
+    def close(self):
+        with self.lock:
+            if self.file is None:
+                return
+            self.file.close()
+            self.index_file.close()
+            self.file = None
+
+
+class CaptureReader:
+    def __init__(self, path):
+        self.path = Path(path)
+        self.file = open(self.path, "rb")
+        magic, self.start_wall_ns, self.start_mono_ns = CAPTURE_HEADER.unpack(self.file.read(CAPTURE_HEADER.size))
+        if magic != CAPTURE_MAGIC:
+            self.file.close()
+            raise ValueError(f"{self.path} is not a capture file")
+        self.index_times = []
+        self.index_offsets = []
+        self.ports = {}
+        self._load_index()
+
+    def _load_index(self):
+        index_path = Path(f"{self.path}.idx")
+        if not index_path.exists():
+            return
+        data = index_path.read_bytes()
+        usable = len(data) - len(data) % INDEX_ENTRY.size
+        for kind, ts_ns, offset in INDEX_ENTRY.iter_unpack(data[:usable]):
+            if kind == INDEX_TIME:
+                self.index_times.append(ts_ns)
+                self.index_offsets.append(offset)
+            else:
+                self.file.seek(offset)
+                _, _, port_id, length = RECORD_HEADER.unpack(self.file.read(RECORD_HEADER.size))
+                self.ports[port_id] = self.file.read(length).decode("utf-8", errors="replace")
+
+    def close(self):
+        self.file.close()
+
+    def to_wall_ns(self, ts_ns):
+        return self.start_wall_ns + (ts_ns - self.start_mono_ns)
+
+    def to_mono_ns(self, wall_ns):
+        return self.start_mono_ns + (wall_ns - self.start_wall_ns)
+
+    def offset_for(self, ts_ns):
+        # Offset of the last index entry at or before ts_ns
+        i = bisect.bisect_right(self.index_times, ts_ns) - 1
+        return self.index_offsets[i] if i >= 0 else CAPTURE_HEADER.size
+
+    def records(self, start_ns=None, end_ns=None):
+        # Yields (monotonic ns, direction, port name, payload); bounds are monotonic ns
+        self.file.seek(CAPTURE_HEADER.size if start_ns is None else self.offset_for(start_ns))
+        read = self.file.read
+        while True:
+            header = read(RECORD_HEADER.size)
+            if len(header) < RECORD_HEADER.size:
+                return
+            ts_ns, direction, port_id, length = RECORD_HEADER.unpack(header)
+            data = read(length)
+            if len(data) < length:
+                return  # truncated tail of a capture still being written
+            if direction == CAPTURE_PORT:
+                self.ports[port_id] = data.decode("utf-8", errors="replace")
+                continue
+            if start_ns is not None and ts_ns < start_ns:
+                continue
+            if end_ns is not None and ts_ns > end_ns:
+                return
+            yield ts_ns, direction, self.ports.get(port_id, str(port_id)), data
+
+
+def capture_to_text(capture_path, text_path, framing=DEFAULT_FRAMING):
+    # Text log view of a capture: RX chunks are re-framed per port into lines
+    reader = CaptureReader(capture_path)
+    framers = {}
+    try:
+        with open(text_path, "w", encoding="utf-8") as out:
+            for ts_ns, direction, port, data in reader.records():
+                stamp = datetime.fromtimestamp(reader.to_wall_ns(ts_ns) / 1e9).strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
+                if direction == CAPTURE_RX:
+                    framer = framers.get(port)
+                    if framer is None:
+                        framer = framers[port] = LineFramer.from_name(framing)
+                    for frame in framer.feed(data):
+                        line = clean_line(frame.decode(errors='ignore'))
+                        if line:
+                            out.write(f"[{stamp}] {port} << {line}\n")
+                elif direction == CAPTURE_TX:
+                    out.write(f"[{stamp}] {port} >> {clean_line(data.decode(errors='ignore'))}\n")
+                else:
+                    out.write(f"[{stamp}] {port} -- {data.decode('utf-8', errors='replace')}\n")
+    finally:
+        reader.close()
+
+
+# === Capture replay ===
+REPLAY_SPEEDS = {"1x": 1.0, "10x": 10.0, "100x": 100.0, "Max": 0}
+DEFAULT_REPLAY_SPEED = "1x"
+
+
+def open_pty_pair():
+    # Returns (slave device name, write function feeding it, close function).
+    # The terminal connects to the slave like a real port (Linux/macOS only).
+    import pty
+    import tty
+    master, slave = pty.openpty()
+    tty.setraw(slave)
+    name = os.ttyname(slave)
+
+    def write(data):
+        view = memoryview(data)
+        while view:
+            written = os.write(master, view)
+            view = view[written:]
+
+    def close():
+        for fd in (master, slave):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+    return name, write, close
+
+
+class CaptureReplayer(threading.Thread):
+    # Feeds the RX records of a capture into `write` with the original timing,
+    # scaled by `speed` (10 = ten times faster), or as fast as possible (speed 0).
+    # `backlog` is an optional callable sampled to report the consumer's queue depth.
+    def __init__(self, capture_path, write, speed=1.0, port=None, backlog=None, on_done=None):
+        super().__init__(name="CaptureReplayer", daemon=True)
+        self.capture_path = capture_path
+        self.write = write
+        self.speed = speed
+        self.port = port
+        self.backlog = backlog
+        self.on_done = on_done
+        self.stop_event = threading.Event()
+        self.bytes_sent = 0
+        self.lines_sent = 0
+        self.max_backlog = 0
+        self.max_lag_ns = 0
+        self.elapsed = 0.0
+        self.error = None
+
+    def stop(self):
+        self.stop_event.set()
+
+    def run(self):
+        reader = None
+        start = time.perf_counter_ns()
+        try:
+            reader = CaptureReader(self.capture_path)
+            first_ts = None
+            for ts_ns, direction, port, data in reader.records():
+                if self.stop_event.is_set():
+                    break
+                if direction != CAPTURE_RX or (self.port and port != self.port):
+                    continue
+                if first_ts is None:
+                    first_ts = ts_ns
+                if self.speed:
+                    due = start + (ts_ns - first_ts) / self.speed
+                    wait = due - time.perf_counter_ns()
+                    if wait > 0:
+                        if self.stop_event.wait(wait / 1e9):
+                            break
+                    else:
+                        self.max_lag_ns = max(self.max_lag_ns, -wait)
+                self.write(data)
+                self.bytes_sent += len(data)
+                self.lines_sent += data.count(b"\n")
+                if self.backlog:
+                    self.max_backlog = max(self.max_backlog, self.backlog())
+        except Exception as e:
+            self.error = e
+        finally:
+            if reader:
+                reader.close()
+            self.elapsed = (time.perf_counter_ns() - start) / 1e9
+            if self.on_done:
+                self.on_done(self)
+
+    def summary(self):
+        elapsed = max(self.elapsed, 1e-9)
+        text = (f"{self.bytes_sent} bytes, {self.lines_sent} lines in {self.elapsed:.2f}s "
+                f"({self.bytes_sent / elapsed:,.0f} B/s, {self.lines_sent / elapsed:,.0f} lines/s), "
+                f"peak backlog {self.max_backlog}, max lag {self.max_lag_ns / 1e6:.1f} ms")
+        if self.error:
+            text += f", stopped by error: {self.error}"
+        return text
+
+
+# === Session line index ===
+# Every line shown in a tab is also appended to a spool file, with its byte
+# offset, direction and port kept in compact arrays. Searches run over the
+# memory-mapped spool in C (re.search) and map hits back to line numbers, so
+# they stay fast on millions of lines and only need to look at new lines to
+# keep up while data streams in. Line numbers count from the start of the
+# session; past the caps the oldest quarter of the lines is dropped, so a
+# session running for days holds about 50 MB of arrays and 256 MB of spool.
+LINE_RX, LINE_TX, LINE_NOTE = CAPTURE_RX, CAPTURE_TX, CAPTURE_NOTE
+LINE_KINDS = {"All": None, "RX": LINE_RX, "TX": LINE_TX, "Info": LINE_NOTE}
+MAX_HIGHLIGHTS = 5000  # per pass over the output widget
+LINE_INDEX_MAX_LINES = 2_000_000
+LINE_INDEX_MAX_BYTES = 256 * 1024 * 1024
+
+
+class LineQuery:
+    # Pattern is matched against the whole line as shown (timestamp included);
+    # ^ and $ anchor to line boundaries. Case folding is ASCII only because the
+    # spool is searched as bytes.
+    def __init__(self, pattern="", ignore_case=False, invert=False, kind=None, port=None):
+        self.pattern = pattern
+        self.ignore_case = ignore_case
+        self.invert = invert
+        self.kind = kind
+        self.port = port
+        flags = re.MULTILINE | (re.IGNORECASE if ignore_case else 0)
+        raw = pattern.encode("utf-8")
+        if pattern and invert:
+            # Match the start of every line that does not contain the pattern, so
+            # the cost follows the number of results rather than of lines
+            raw = b"^(?!.*?(?:" + raw + b"))"
+        self.regex = re.compile(raw, flags) if pattern else None
+        self.text_regex = re.compile(pattern, flags) if pattern else None
+
+
+class LineIndex:
+    def __init__(self, max_lines=LINE_INDEX_MAX_LINES, max_bytes=LINE_INDEX_MAX_BYTES):
+        fd, path = tempfile.mkstemp(prefix="serial_terminal_", suffix=".lines")
+        self.path = Path(path)
+        self.file = os.fdopen(fd, "wb")
+        self.lock = threading.Lock()
+        self.max_lines = max_lines
+        self.max_bytes = max_bytes
+        self.first = 0                  # number of the oldest line still held
+        self.base = 0                   # offset of that line, at the start of the spool
+        self.readers = 0                # searches and exports reading the arrays
+        self.offsets = array("q", [0])  # start of each line, plus the end
+        self.kinds = array("B")
+        self.port_ids = array("H")
+        self.ports = []
+        self.times = array("d")         # wall-clock time each line was shown
+        self.command_ids = array("I")   # correlated command of RX lines, 0 = none
+        self.commands = [""]
+        self.command_lookup = {"": 0}
+
+    def __len__(self):
+        # Lines shown this session, including any dropped from the front
+        return self.first + len(self.kinds)
+
+    def append(self, lines, port, commands=None):
+        # `commands` gives the command each line answers, "" for none
+        parts = []
+        kinds = []
+        for line in lines:
+            parts.append(line.encode("utf-8", "replace") + b"\n")
+            # "[HH:MM:SS] << ..." is received, "[HH:MM:SS] >> ..." is sent
+            marker = line[11:14]
+            kinds.append(LINE_RX if marker == "<< " else LINE_TX if marker == ">> " else LINE_NOTE)
+        with self.lock:
+            try:
+                port_id = self.ports.index(port)
+            except ValueError:
+                self.ports.append(port)
+                port_id = len(self.ports) - 1
+            lookup = self.command_lookup
+            if commands:
+                command_ids = [lookup.setdefault(command, len(lookup)) for command in commands]
+                self.commands.extend(islice(lookup, len(self.commands), None))
+            else:
+                command_ids = [0] * len(lines)
+            self.file.write(b"".join(parts))
+            self.offsets.extend(islice(accumulate(map(len, parts), initial=self.offsets[-1]), 1, None))
+            self.kinds.extend(kinds)
+            self.port_ids.extend([port_id] * len(kinds))
+            self.times.extend([time.time()] * len(kinds))
+            self.command_ids.extend(command_ids)
+            if not self.readers and (len(self.kinds) > self.max_lines
+                                     or self.offsets[-1] - self.base > self.max_bytes):
+                self._drop_oldest(max(1, len(self.kinds) // 4))
+
+    def _drop_oldest(self, count):
+        # Copies the rest of the spool to a new file; only while nobody reads
+        cut = self.offsets[count]
+        fd, path = tempfile.mkstemp(prefix="serial_terminal_", suffix=".lines")
+        new_file = os.fdopen(fd, "wb")
+        self.file.close()
+        with open(self.path, "rb") as old:
+            old.seek(cut - self.base)
+            shutil.copyfileobj(old, new_file)
+        try:
+            self.path.unlink()
+        except OSError:
+            pass
+        self.path, self.file = Path(path), new_file
+        for values in (self.offsets, self.kinds, self.port_ids, self.times, self.command_ids):
+            del values[:count]
+        self.first += count
+        self.base = cut
+
+    def _begin_read(self):
+        # Holds off dropping lines until _end_read; returns (first, base, count)
+        # with count the number of lines held right now
+        with self.lock:
+            self.file.flush()
+            self.readers += 1
+            return self.first, self.base, len(self.kinds)
+
+    def _end_read(self):
+        with self.lock:
+            self.readers -= 1
+
+    def records(self, numbers):
+        # [(line number, time, kind, port, command, text)] for each line number
+        # still held
+        first, base, count = self._begin_read()
+        try:
+            out = []
+            if not count:
+                return out
+            offsets, kinds, times = self.offsets, self.kinds, self.times
+            with open(self.path, "rb") as f:
+                with mmap.mmap(f.fileno(), offsets[count] - base, access=mmap.ACCESS_READ) as data:
+                    for n in numbers:
+                        i = n - first
+                        if not 0 <= i < count:
+                            continue
+                        text = data[offsets[i] - base:offsets[i + 1] - base - 1].decode("utf-8", "replace")
+                        out.append((n, times[i], kinds[i], self.ports[self.port_ids[i]],
+                                    self.commands[self.command_ids[i]], text))
+            return out
+        finally:
+            self._end_read()
+
+    def line_at(self, when):
+        # First line shown at or after `when` (epoch seconds)
+        with self.lock:
+            return self.first + bisect.bisect_left(self.times, when)
+
+    def read_lines(self, numbers):
+        # Lines no longer held read as empty
+        first, base, count = self._begin_read()
+        try:
+            out = []
+            with open(self.path, "rb") as f:
+                for n in numbers:
+                    i = n - first
+                    if not 0 <= i < count:
+                        out.append("")
+                        continue
+                    f.seek(self.offsets[i] - base)
+                    out.append(f.read(self.offsets[i + 1] - self.offsets[i] - 1).decode("utf-8", "replace"))
+            return out
+        finally:
+            self._end_read()
+
+    def search(self, query, start=0, stop=None):
+        # Line numbers in [start, stop) that satisfy the query
+        first, base, count = self._begin_read()
+        try:
+            return self._search(query, max(start, first) - first,
+                                min(count, (first + count if stop is None else stop) - first), first, base)
+        finally:
+            self._end_read()
+
+    def _search(self, query, start, stop, first, base):
+        # start and stop are positions in the arrays here
+        found = array("I")
+        if start >= stop:
+            return found
+        offsets = self.offsets
+        if query.regex is None:
+            if not query.invert:
+                found.extend(range(start, stop))
+        else:
+            with open(self.path, "rb") as f:
+                with mmap.mmap(f.fileno(), offsets[stop] - base, access=mmap.ACCESS_READ) as data:
+                    search = query.regex.search
+                    pos, end, line = offsets[start] - base, offsets[stop] - base, start
+                    while True:
+                        m = search(data, pos, end)
+                        if not m:
+                            break
+                        line = bisect.bisect_right(offsets, m.start() + base, line, stop + 1) - 1
+                        if line >= stop:
+                            break  # empty match at the very end
+                        found.append(line)
+                        pos = offsets[line + 1] - base  # one hit per line is enough
+        if query.kind is not None:
+            kinds, kind = self.kinds, query.kind
+            found = array("I", (n for n in found if kinds[n] == kind))
+        if query.port is not None:
+            if query.port not in self.ports:
+                return array("I")
+            port_ids, port_id = self.port_ids, self.ports.index(query.port)
+            found = array("I", (n for n in found if port_ids[n] == port_id))
+        if first:
+            found = array("I", (n + first for n in found))
+        return found
+
+    def close(self):
+        with self.lock:
+            self.file.close()
+        try:
+            self.path.unlink()
+        except OSError:
+            pass
+
+
+# === Session export ===
+# Records are streamed from the line index a chunk at a time on a background
+# thread, so memory stays flat however long the session is and the GUI keeps
+# running. A cancelled export removes its partial file.
+EXPORT_FORMATS = {"Text": ".txt", "CSV": ".csv", "JSON Lines": ".jsonl"}
+EXPORT_CHUNK_LINES = 20000
+KIND_NAMES = {LINE_RX: "RX", LINE_TX: "TX", LINE_NOTE: "Info"}
+
+
+class SessionExporter:
+    def __init__(self, index, path, fmt="Text", compress=False, query=None,
+                 start_time=None, end_time=None, on_progress=None):
+        self.index = index
+        self.path = Path(path)
+        self.fmt = fmt
+        self.compress = compress
+        self.query = query or LineQuery()
+        self.start_time = start_time    # epoch seconds, inclusive
+        self.end_time = end_time        # epoch seconds, exclusive
+        self.on_progress = on_progress  # on_progress(lines scanned, total, records written)
+        self.cancelled = threading.Event()
+        self.written = 0
+        self.error = None
+
+    def cancel(self):
+        self.cancelled.set()
+
+    def line_range(self):
+        # Lines to scan: the whole session so far, narrowed by the time range
+        start = self.index.line_at(self.start_time) if self.start_time is not None else 0
+        stop = self.index.line_at(self.end_time) if self.end_time is not None else len(self.index)
+        return start, stop
+
+    def open(self):
+        if self.compress:
+            return gzip.open(self.path, "wt", encoding="utf-8", newline="")
+        return open(self.path, "w", encoding="utf-8", newline="")
+
+    def run(self):
+        start, stop = self.line_range()
+        try:
+            with self.open() as f:
+                write = self.writer(f)
+                for chunk in range(start, stop, EXPORT_CHUNK_LINES):
+                    if self.cancelled.is_set():
+                        break
+                    end = min(chunk + EXPORT_CHUNK_LINES, stop)
+                    # lines trimmed from the index since the search are left out
+                    records = self.index.records(self.index.search(self.query, chunk, end))
+                    write(records)
+                    self.written += len(records)
+                    if self.on_progress:
+                        self.on_progress(end - start, stop - start, self.written)
+        except Exception as e:
+            self.error = e
+        if self.cancelled.is_set() or self.error:
+            try:
+                self.path.unlink()
+            except OSError:
+                pass
+        return self.written
+
+    def writer(self, f):
+        # write(records) for the chosen format
+        if self.fmt == "Text":
+            return lambda records: f.writelines(record[5] + "\n" for record in records)
+        if self.fmt == "CSV":
+            out = csv.writer(f)
+            out.writerow(["time", "direction", "port", "command", "data"])
+            return lambda records: out.writerows(self.rows(records))
+        quote = json.encoder.encode_basestring  # one JSON string, as json.dumps would write it
+        line = '{"time": "%s", "direction": "%s", "port": %s, "command": %s, "data": %s}\n'
+        return lambda records: f.writelines(
+            line % (stamp, direction, quote(port), quote(command), quote(data))
+            for stamp, direction, port, command, data in self.rows(records))
+
+    @staticmethod
+    def rows(records):
+        # Data without the "[HH:MM:SS] << " prefix; the time gets its date and ms back
+        last_when = stamp = None
+        for _, when, kind, port, command, text in records:
+            if when != last_when:  # lines of one batch share their time
+                last_when = when
+                stamp = datetime.fromtimestamp(when).isoformat(sep=" ", timespec="milliseconds")
+            data = text[14:] if kind in (LINE_RX, LINE_TX) else text[11:]
+            if kind == LINE_TX and not command:
+                command = data
+            yield stamp, KIND_NAMES[kind], port, command, data
+
+
+# === Log viewer ===
+# Large logs are memory-mapped and only the visible rows are decoded. Line
+# offsets are built on a background thread a chunk at a time, so the first
+# screen shows as soon as the first chunk is indexed. Rotated .gz segments are
+# decompressed to a temporary file first and then mapped the same way.
+LOG_INDEX_CHUNK = 4 * 1024 * 1024
+LOG_STAMP = re.compile(rb"\d{4}-\d\d-\d\d \d\d:\d\d:\d\d")  # %(asctime)s and capture text
+
+
+def log_segments(path):
+    # The file plus its rotated segments, oldest first: log.30.gz ... log.1.gz, log
+    path = Path(path)
+    base = re.sub(r"\.\d+\.gz$", "", path.name)
+    rotated = []
+    for segment in path.parent.glob(base + ".*.gz"):
+        number = segment.name[len(base) + 1:-3]
+        if number.isdigit():
+            rotated.append((int(number), segment))
+    segments = [segment for _, segment in sorted(rotated, reverse=True)]
+    if (path.parent / base).exists():
+        segments.append(path.parent / base)
+    return segments or [path]
+
+
+class LogSegment:
+    def __init__(self, path):
+        self.path = Path(path)
+        self.file = None
+        self.mm = None
+        self.temp = None
+        self.size = 0
+        self.indexed = 0  # bytes scanned for line breaks
+        self.offsets = array("q", [0])
+        self.complete = False
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def open(self, stopping):
+        path = self.path
+        if path.suffix == ".gz":
+            fd, temp = tempfile.mkstemp(prefix="serial_terminal_", suffix=".log")
+            self.temp = Path(temp)
+            with os.fdopen(fd, "wb") as out, gzip.open(path, "rb") as src:
+                while not stopping.is_set():
+                    block = src.read(LOG_INDEX_CHUNK)
+                    if not block:
+                        break
+                    out.write(block)
+            path = self.temp
+        elif path.suffix == CAPTURE_SUFFIX:
+            fd, temp = tempfile.mkstemp(prefix="serial_terminal_", suffix=".txt")
+            os.close(fd)
+            self.temp = Path(temp)
+            capture_to_text(path, self.temp)
+            path = self.temp
+        self.file = open(path, "rb")
+        self.size = os.fstat(self.file.fileno()).st_size
+        if self.size:
+            self.mm = mmap.mmap(self.file.fileno(), self.size, access=mmap.ACCESS_READ)
+
+    def index_chunk(self):
+        # Extend the offsets over the next chunk; False once the file is done
+        start = self.offsets[-1]
+        if self.mm is None or start >= self.size:
+            self.indexed = self.size
+            self.complete = True
+            return False
+        end = min(start + LOG_INDEX_CHUNK, self.size)
+        if end < self.size:
+            newline = self.mm.find(b"\n", end)  # finish the line the chunk cuts
+            end = self.size if newline < 0 else newline + 1
+        pieces = self.mm[start:end].split(b"\n")
+        if not pieces[-1]:
+            pieces.pop()  # chunk ends on a newline
+        self.offsets.extend(islice(accumulate((len(p) + 1 for p in pieces), initial=start), 1, None))
+        if self.offsets[-1] > self.size:
+            self.offsets[-1] = self.size  # last line without a newline
+        self.indexed = end
+        return True
+
+    def line(self, n):
+        return self.mm[self.offsets[n]:self.offsets[n + 1]].rstrip(b"\r\n").decode("utf-8", "replace")
+
+    def stamp(self, n):
+        # Timestamp bytes near the start of line n, or None
+        m = LOG_STAMP.search(self.mm, self.offsets[n], min(self.offsets[n] + 32, self.offsets[n + 1]))
+        return m.group() if m else None
+
+    def close(self):
+        if self.mm:
+            self.mm.close()
+            self.mm = None
+        if self.file:
+            self.file.close()
+            self.file = None
+        if self.temp:
+            try:
+                self.temp.unlink()
+            except OSError:
+                pass
+
+
+class LogView:
+    # Several segments read as one file
+    def __init__(self, paths):
+        self.segments = [LogSegment(path) for path in paths]
+        self.stopping = threading.Event()
+        self.error = None
+        self.thread = threading.Thread(target=self.build, name="log-index", daemon=True)
+        self.thread.start()
+
+    def build(self):
+        try:
+            for segment in self.segments:
+                if self.stopping.is_set():
+                    return
+                segment.open(self.stopping)
+                while not self.stopping.is_set() and segment.index_chunk():
+                    pass
+        except Exception as e:
+            self.error = e
+
+    @property
+    def complete(self):
+        return all(segment.complete for segment in self.segments)
+
+    def progress(self):
+        total = sum(segment.size for segment in self.segments)
+        done = sum(segment.indexed for segment in self.segments)
+        return done / total if total else (1.0 if self.complete else 0.0)
+
+    def __len__(self):
+        return sum(len(segment) for segment in self.segments)
+
+    def locate(self, n):
+        for segment in self.segments:
+            if n < len(segment):
+                return segment, n
+            n -= len(segment)
+        raise IndexError(n)
+
+    def lines(self, start, count):
+        out = []
+        for n in range(start, min(start + count, len(self))):
+            segment, local = self.locate(n)
+            out.append(segment.line(local))
+        return out
+
+    def stamp(self, n, lookahead=100):
+        # First timestamp at or after line n (continuation lines have none)
+        for k in range(n, min(n + lookahead, len(self))):
+            segment, local = self.locate(k)
+            stamp = segment.stamp(local)
+            if stamp:
+                return stamp
+        return None
+
+    def find_time(self, when):
+        # First line stamped at or after `when` ("YYYY-MM-DD HH:MM:SS"), by
+        # binary search over the indexed lines
+        target = when.encode()
+        lo, hi = 0, len(self)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            stamp = self.stamp(mid)
+            if stamp is not None and stamp < target:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def close(self):
+        self.stopping.set()
+        self.thread.join(timeout=5)
+        for segment in self.segments:
+            segment.close()
+
+
+# === Command/response correlation ===
+DEFAULT_RESPONSE_PATTERN = ""   # empty: a command completes on its first response line
+DEFAULT_RESPONSE_TIMEOUT = 2.0  # seconds before an unanswered command counts as a timeout
+UNKNOWN_COMMAND = "Unknown"
+# Latency histogram buckets: 10 per decade from 10 us to 100 s
+LATENCY_BUCKETS_NS = [int(10_000 * 10 ** (i / 10)) for i in range(71)]
+
+
+class LatencyHistogram:
+    # Fixed log-scale buckets so memory stays constant however many samples arrive
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS_NS) + 1)
+        self.count = 0
+        self.timeouts = 0
+        self.min_ns = None
+        self.max_ns = None
+        self.total_ns = 0
+
+    def add(self, latency_ns):
+        self.counts[bisect.bisect_left(LATENCY_BUCKETS_NS, latency_ns)] += 1
+        self.count += 1
+        self.total_ns += latency_ns
+        if self.min_ns is None or latency_ns < self.min_ns:
+            self.min_ns = latency_ns
+        if self.max_ns is None or latency_ns > self.max_ns:
+            self.max_ns = latency_ns
+
+    def percentile_ns(self, pct):
+        # Upper bound of the bucket holding the pct-th sample, clamped to the observed max
+        if not self.count:
+            return None
+        target = max(1, int(round(self.count * pct / 100.0)))
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= target:
+                bound = LATENCY_BUCKETS_NS[i] if i < len(LATENCY_BUCKETS_NS) else self.max_ns
+                return min(bound, self.max_ns)
+        return self.max_ns
+
+    def summary(self):
+        ms = lambda ns: None if ns is None else round(ns / 1e6, 3)
+        return {
+            "count": self.count,
+            "timeouts": self.timeouts,
+            "min_ms": ms(self.min_ns),
+            "p50_ms": ms(self.percentile_ns(50)),
+            "p95_ms": ms(self.percentile_ns(95)),
+            "p99_ms": ms(self.percentile_ns(99)),
+            "max_ms": ms(self.max_ns),
+            "mean_ms": ms(self.total_ns / self.count) if self.count else None,
+        }
+
+
+MAX_KEPT_RESPONSE_LINES = 20
+
+
+class PendingCommand:
+    __slots__ = ("command", "sent_ns", "first_ns", "done_ns", "lines", "responses", "status")
+
+    def __init__(self, command, sent_ns):
+        self.command = command
+        self.sent_ns = sent_ns
+        self.first_ns = None
+        self.done_ns = None
+        self.lines = 0
+        self.responses = []
+        self.status = "pending"  # then "ok", "timeout" or "cancelled"
+
+    def latency_ns(self):
+        return None if self.done_ns is None else self.done_ns - self.sent_ns
+
+    def response_text(self):
+        return " | ".join(self.responses)
+
+
+class CommandCorrelator:
+    # Pairs sent commands with their response lines, oldest command first.
+    # A command is complete when a line matches `pattern` (e.g. "^OK|^ERROR|> $"),
+    # or on its first line when no pattern is set. Lines after completion are
+    # attributed to the last completed command until the next one is answered.
+    # Thread safe: sent() runs on TX paths, on_line() on the reader thread.
+    def __init__(self, pattern=DEFAULT_RESPONSE_PATTERN, timeout=DEFAULT_RESPONSE_TIMEOUT):
+        self.lock = threading.Lock()
+        self.pending = deque()
+        self.stats = {}
+        self.listeners = []
+        self.last_command = UNKNOWN_COMMAND
+        self.paused_ns = None  # while the port is down nothing times out
+        self.set_rules(pattern, timeout)
+
+    def add_listener(self, listener):
+        # listener(entry) is called outside the lock when a command completes or times out
+        self.listeners.append(listener)
+
+    def remove_listener(self, listener):
+        if listener in self.listeners:
+            self.listeners.remove(listener)
+
+    def _notify(self, finished):
+        for entry in finished:
+            for listener in list(self.listeners):
+                listener(entry)
+
+    def set_rules(self, pattern, timeout):
+        compiled = re.compile(pattern) if pattern else None
+        with self.lock:
+            self.pattern = compiled
+            self.timeout_ns = int(float(timeout) * 1e9)
+
+    def sent(self, command, ts_ns=None):
+        entry = PendingCommand(command, time.monotonic_ns() if ts_ns is None else ts_ns)
+        with self.lock:
+            self.pending.append(entry)
+        return entry
+
+    def cancel(self, entry, count_timeout=True):
+        # Give up on a command (e.g. a batch step timeout) so it stops claiming lines
+        with self.lock:
+            try:
+                self.pending.remove(entry)
+            except ValueError:
+                return False
+            entry.status = "cancelled"
+            if count_timeout:
+                self._histogram(entry.command).timeouts += 1
+        return True
+
+    def outstanding(self):
+        return len(self.pending)
+
+    @property
+    def paused(self):
+        return self.paused_ns is not None
+
+    def pause(self, ts_ns=None):
+        with self.lock:
+            if self.paused_ns is None:
+                self.paused_ns = time.monotonic_ns() if ts_ns is None else ts_ns
+
+    def resume(self, ts_ns=None):
+        # Time spent paused doesn't count against the pending commands
+        with self.lock:
+            if self.paused_ns is None:
+                return
+            delta = (time.monotonic_ns() if ts_ns is None else ts_ns) - self.paused_ns
+            self.paused_ns = None
+            for entry in self.pending:
+                entry.sent_ns += delta
+
+    def on_line(self, line, ts_ns=None):
+        # Returns the command this line belongs to
+        if ts_ns is None:
+            ts_ns = time.monotonic_ns()
+        finished = []
+        with self.lock:
+            self._expire(ts_ns, finished)
+            if not self.pending:
+                command = self.last_command
+            else:
+                entry = self.pending[0]
+                command = entry.command
+                if entry.first_ns is None:
+                    entry.first_ns = ts_ns
+                entry.lines += 1
+                if len(entry.responses) < MAX_KEPT_RESPONSE_LINES:
+                    entry.responses.append(line)
+                if self.pattern is None or self.pattern.search(line):
+                    self.pending.popleft()
+                    entry.done_ns = ts_ns
+                    entry.status = "ok"
+                    self._histogram(command).add(ts_ns - entry.sent_ns)
+                    self.last_command = command
+                    finished.append(entry)
+        if finished and self.listeners:
+            self._notify(finished)
+        return command
+
+    def on_lines(self, lines, ts_ns=None):
+        # on_line for a batch, returning each line's command. With nothing
+        # outstanding (plain streaming) that is one lock for the whole batch
+        if ts_ns is None:
+            ts_ns = time.monotonic_ns()
+        with self.lock:
+            if not self.pending:
+                return [self.last_command] * len(lines)
+        return [self.on_line(line, ts_ns) for line in lines]
+
+    def expire(self, ts_ns=None):
+        finished = []
+        with self.lock:
+            self._expire(time.monotonic_ns() if ts_ns is None else ts_ns, finished)
+        if finished and self.listeners:
+            self._notify(finished)
+
+    def _expire(self, ts_ns, finished):
+        if self.paused_ns is not None:
+            return
+        pending = self.pending
+        while pending and ts_ns - pending[0].sent_ns > self.timeout_ns:
+            entry = pending.popleft()
+            entry.status = "timeout"
+            self._histogram(entry.command).timeouts += 1
+            if entry.lines:
+                self.last_command = entry.command
+            finished.append(entry)
+
+    def _histogram(self, command):
+        hist = self.stats.get(command)
+        if hist is None:
+            hist = self.stats[command] = LatencyHistogram()
+        return hist
+
+    def reset_stats(self):
+        with self.lock:
+            self.stats.clear()
+
+    def summaries(self):
+        with self.lock:
+            return {command: hist.summary() for command, hist in self.stats.items()}
+
+    def export_csv(self, path):
+        fields = ["count", "timeouts", "min_ms", "p50_ms", "p95_ms", "p99_ms", "max_ms", "mean_ms"]
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(["command"] + fields)
+            for command, summary in sorted(self.summaries().items()):
+                writer.writerow([command] + [summary[k] for k in fields])
+
+
+# === Batch command execution ===
+BATCH_MODES = {
+    "Wait for response": "response",
+    "Window": "window",
+    "Fixed rate": "rate",
+}
+DEFAULT_BATCH_MODE = "Wait for response"
+DEFAULT_BATCH_WINDOW = 4
+DEFAULT_BATCH_INTERVAL = 0.5   # seconds between commands in fixed rate mode
+DEFAULT_STEP_TIMEOUT = 2.0
+DEFAULT_BATCH_RETRIES = 0
+REPORT_FOLDER = app_folder / "reports"
+
+
+class BatchResult:
+    __slots__ = ("index", "command", "status", "attempts", "latency_ns", "response")
+
+    def __init__(self, index, command):
+        self.index = index
+        self.command = command
+        self.status = "pending"  # then "ok", "error", "timeout" or "aborted"
+        self.attempts = 0
+        self.latency_ns = None
+        self.response = ""
+
+
+class BatchExecutor:
+    # Runs a list of commands through `send(command) -> PendingCommand`.
+    #   mode="response" - next command as soon as the previous one is answered
+    #   mode="window"   - keep up to `window` commands outstanding
+    #   mode="rate"     - one command every `interval` seconds on drift-free deadlines
+    # A response matching `error_pattern` (or a step timeout) is retried up to
+    # `retries` times; one matching `abort_pattern` stops the whole batch.
+    def __init__(self, commands, send, correlator, mode="response", window=DEFAULT_BATCH_WINDOW,
+                 interval=DEFAULT_BATCH_INTERVAL, step_timeout=DEFAULT_STEP_TIMEOUT,
+                 retries=DEFAULT_BATCH_RETRIES, error_pattern="", abort_pattern="", on_progress=None):
+        if mode not in BATCH_MODES.values():
+            raise ValueError(f"Unknown batch mode: {mode}")
+        self.commands = commands
+        self.send = send
+        self.correlator = correlator
+        self.mode = mode
+        self.limit = 1 if mode == "response" else max(1, int(window))
+        self.interval = float(interval)
+        self.step_timeout_ns = int(float(step_timeout) * 1e9)
+        self.retries = int(retries)
+        self.error_re = re.compile(error_pattern) if error_pattern else None
+        self.abort_re = re.compile(abort_pattern) if abort_pattern else None
+        self.on_progress = on_progress
+        self.results = [BatchResult(i, cmd) for i, cmd in enumerate(commands)]
+        self.completed = Queue()
+        self.inflight = {}  # PendingCommand -> BatchResult
+        self.done = 0
+        self.stop_event = threading.Event()
+        self.abort_reason = None
+        self.start_ns = None
+        self.end_ns = None
+
+    def abort(self, reason="Stopped by user"):
+        if not self.abort_reason:
+            self.abort_reason = reason
+        self.stop_event.set()
+        self.completed.put(None)  # wakes _collect, which may wait a whole step timeout
+
+    def _on_complete(self, entry):
+        # May fire before _send has registered the entry; _finish filters foreign ones
+        self.completed.put(entry)
+
+    def _send(self, result):
+        result.attempts += 1
+        entry = self.send(result.command)
+        self.inflight[entry] = result
+
+    def run(self):
+        self.start_ns = time.monotonic_ns()
+        self.correlator.add_listener(self._on_complete)
+        try:
+            if self.mode == "rate":
+                self._run_rate()
+            else:
+                self._run_gated()
+        finally:
+            self.correlator.remove_listener(self._on_complete)
+            for entry, result in list(self.inflight.items()):
+                self.correlator.cancel(entry)
+                result.status = "aborted" if self.abort_reason else "timeout"
+            self.inflight.clear()
+            for result in self.results:
+                if result.status == "pending":
+                    result.status = "aborted"
+            self.end_ns = time.monotonic_ns()
+            self._progress()
+        return self.results
+
+    def _run_gated(self):
+        queue = deque(self.results)
+        while (queue or self.inflight) and not self.stop_event.is_set():
+            while queue and len(self.inflight) < self.limit and not self.stop_event.is_set():
+                self._send(queue.popleft())
+            self._collect(queue)
+
+    def _run_rate(self):
+        for i, result in enumerate(self.results):
+            deadline = self.start_ns + int(i * self.interval * 1e9)
+            while not self.stop_event.is_set():
+                wait = deadline - time.monotonic_ns()
+                if wait <= 0:
+                    break
+                self._collect(None, min(wait / 1e9, 0.05))
+            if self.stop_event.is_set():
+                return
+            self._send(result)
+        while self.inflight and not self.stop_event.is_set():
+            self._collect(None)
+
+    def _collect(self, queue, max_wait=None):
+        # Waits for one completion (or the next step timeout) and records it
+        now = time.monotonic_ns()
+        oldest = min((e.sent_ns for e in self.inflight), default=now)
+        wait = max(0.0, (oldest + self.step_timeout_ns - now) / 1e9)
+        if max_wait is not None:
+            wait = min(wait, max_wait)
+        paused = self.correlator.paused
+        if paused:
+            wait = 0.1 if max_wait is None else min(max_wait, 0.1)  # port reconnecting, nothing times out
+        try:
+            entry = self.completed.get(timeout=wait)
+        except Empty:
+            entry = None
+        if entry is not None:
+            self._finish(entry, queue)
+        if paused:
+            return
+        now = time.monotonic_ns()
+        for entry in [e for e in self.inflight if now - e.sent_ns > self.step_timeout_ns]:
+            # cancel() fails if the answer raced in, then its completion is still queued
+            if self.correlator.cancel(entry):
+                entry.status = "timeout"
+                self._finish(entry, queue)
+
+    def _finish(self, entry, queue):
+        result = self.inflight.pop(entry, None)
+        if result is None:
+            return
+        result.latency_ns = entry.latency_ns()
+        result.response = entry.response_text()
+        if entry.status == "ok" and self.abort_re and self.abort_re.search(result.response):
+            result.status = "error"
+            self.abort(f"Abort pattern matched on '{result.command}'")
+        elif entry.status == "ok" and not (self.error_re and self.error_re.search(result.response)):
+            result.status = "ok"
+        elif result.attempts <= self.retries and not self.stop_event.is_set():
+            if queue is None:
+                self._send(result)
+            else:
+                queue.appendleft(result)
+            return
+        else:
+            result.status = "timeout" if entry.status != "ok" else "error"
+        self.done += 1
+        self._progress()
+
+    def _progress(self):
+        if not self.on_progress:
+            return
+        elapsed = max((time.monotonic_ns() - self.start_ns) / 1e9, 1e-9)
+        rate = self.done / elapsed
+        remaining = len(self.results) - self.done
+        eta = remaining / rate if rate else None
+        self.on_progress(self.done, len(self.results), rate, eta)
+
+    def counts(self):
+        counts = {}
+        for result in self.results:
+            counts[result.status] = counts.get(result.status, 0) + 1
+        return counts
+
+    def write_report(self, path):
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(["index", "command", "status", "attempts", "latency_ms", "response"])
+            for r in self.results:
+                latency = None if r.latency_ns is None else round(r.latency_ns / 1e6, 3)
+                writer.writerow([r.index + 1, r.command, r.status, r.attempts, latency, r.response])
+
+
+# === Periodic command scheduler ===
+# One thread runs every polling job from a heap of absolute monotonic
+# deadlines. Each deadline is the previous one plus the interval, so sends do
+# not drift with load; a job that falls a whole period behind skips the
+# periods it missed (counted) instead of sending a burst to catch up.
+MIN_JOB_INTERVAL = 0.01  # seconds
+
+
+class PeriodicJob:
+    FIELDS = ("command", "interval", "port", "enabled", "hex_mode")
+
+    def __init__(self, command, interval=1.0, port="", enabled=True, hex_mode=False):
+        self.command = command  # text of a command library entry
+        self.interval = max(MIN_JOB_INTERVAL, float(interval))
+        self.port = port        # "" sends to the first connected port
+        self.enabled = bool(enabled)
+        self.hex_mode = bool(hex_mode)  # sent as hex bytes, as with the Hex box ticked
+        self.payload = encode_command(command, self.hex_mode)  # ValueError for bad hex
+        self.due_ns = None
+        self.sent = 0
+        self.missed = 0         # periods skipped because the job ran late
+        self.failed = 0         # port closed or TX queue full
+        self.lateness = LatencyHistogram()  # jitter: send time minus deadline
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.FIELDS}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**{name: data[name] for name in cls.FIELDS if name in data})
+
+
+class PeriodicScheduler(threading.Thread):
+    def __init__(self, send):
+        super().__init__(name="Scheduler", daemon=True)
+        self.send = send        # send(job) -> False if nothing could take it
+        self.jobs = []
+        self.heap = []          # (due_ns, seq, job)
+        self.seq = count()
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.running = True
+
+    def set_jobs(self, jobs):
+        # Enabled jobs start now and keep their own phase from then on
+        now = time.monotonic_ns()
+        with self.lock:
+            self.jobs = list(jobs)
+            self.heap = []
+            for job in self.jobs:
+                if job.enabled:
+                    job.due_ns = now
+                    self.heap.append((now, next(self.seq), job))
+            heapq.heapify(self.heap)
+        self.wake.set()
+
+    def run(self):
+        while self.running:
+            with self.lock:
+                due_ns, _, job = self.heap[0] if self.heap else (None, None, None)
+            now = time.monotonic_ns()
+            if job is None or due_ns > now:
+                self.wake.wait(None if job is None else (due_ns - now) / 1e9)
+                self.wake.clear()
+                continue
+            with self.lock:
+                if not self.heap or self.heap[0][2] is not job:
+                    continue  # jobs were replaced meanwhile
+                interval_ns = int(job.interval * 1e9)
+                skipped = (now - due_ns) // interval_ns
+                job.missed += skipped
+                job.due_ns = due_ns + (skipped + 1) * interval_ns
+                heapq.heapreplace(self.heap, (job.due_ns, next(self.seq), job))
+            job.lateness.add(now - due_ns)
+            try:
+                sent = self.send(job)
+            except Exception:
+                sent = False
+            if sent:
+                job.sent += 1
+            else:
+                job.failed += 1
+
+    def stop(self):
+        self.running = False
+        self.wake.set()
+        self.join(timeout=2)
+
+
+def clean_line(text):
+    debug = logger.isEnabledFor(logging.DEBUG)
+    if debug:
+        logger.debug("Raw input: %r", text)
+    text = ansi_escape.sub('', text)
+    text = text.replace('\r', '').replace('\x00', '').strip()
+    if debug:
+        logger.debug("Cleaned: %r", text)
+    return text
+
+
+# === ANSI/VT100 rendering ===
+# Incremental escape-sequence state machine for the "ANSI" display mode. It
+# keeps the current line as cells (char + style) with a cursor column, so
+# "\r" overwrites, erase-in-line and cursor moves work like a terminal. State
+# survives across reads, so sequences and UTF-8 characters split between
+# chunks are handled. Styles become Tk tag names, applied in batches.
+ANSI_PALETTE = [
+    "#000000", "#cd0000", "#00cd00", "#cdcd00", "#0000ee", "#cd00cd", "#00cdcd", "#e5e5e5",
+    "#7f7f7f", "#ff0000", "#00ff00", "#ffff00", "#5c5cff", "#ff00ff", "#00ffff", "#ffffff",
+]
+ANSI_DEFAULT_FG, ANSI_DEFAULT_BG = "#000000", "#ffffff"
+ANSI_MAX_PENDING = 256  # an unterminated escape longer than this is dropped
+ansi_token = re.compile(
+    r"(?P<text>[^\x00-\x1f\x7f]+)"
+    r"|\x1b\[(?P<params>[0-?]*)[ -/]*(?P<final>[@-~])"
+    r"|\x1b\][^\x07\x1b]*(?:\x07|\x1b\\)"   # OSC (window title etc.), ignored
+    r"|\x1b[ -Z\\^-~]"                       # other two-byte escapes, ignored
+    r"|(?P<ctrl>[\x00-\x1a\x1c-\x1f\x7f])"
+)
+# What an escape sequence cut off by the end of a read can look like
+ansi_incomplete = re.compile(r"\x1b(?:\[[0-?]*[ -/]*|\][^\x07\x1b]*\x1b?)?\Z")
+
+
+def ansi_color(n):
+    # 256-colour index -> "#rrggbb"
+    if n < 16:
+        return ANSI_PALETTE[n]
+    if n < 232:
+        n -= 16
+        levels = [0, 95, 135, 175, 215, 255]
+        return f"#{levels[n // 36]:02x}{levels[n // 6 % 6]:02x}{levels[n % 6]:02x}"
+    grey = 8 + (n - 232) * 10
+    return f"#{grey:02x}{grey:02x}{grey:02x}"
+
+
+class StyledText(str):
+    # A line as plain text (so correlation, search and logs are unaffected)
+    # plus (start, end, tag) spans; `partial` marks an unfinished line that
+    # the next update replaces
+    def __new__(cls, text, spans=(), partial=False):
+        self = super().__new__(cls, text)
+        self.spans = spans
+        self.partial = partial
+        return self
+
+
+class AnsiTerminal:
+    def __init__(self):
+        self.decoder = codecs.getincrementaldecoder("utf-8")("replace")
+        self.pending = ""
+        self.chars = []
+        self.styles = []
+        self.col = 0
+        self.fg = self.bg = None
+        self.bold = self.underline = self.inverse = False
+        self.style = ()
+        self.changed = False
+
+    def feed(self, data):
+        # Returns (completed lines, partial line or None) as StyledText
+        text = self.pending + self.decoder.decode(data)
+        self.pending = ""
+        lines = []
+        pos, end = 0, len(text)
+        match = ansi_token.match
+        while pos < end:
+            m = match(text, pos)
+            if m is None:
+                # An ESC that starts no sequence is dropped; one whose
+                # sequence runs to the end of the data waits for the rest
+                if end - pos < ANSI_MAX_PENDING and ansi_incomplete.match(text, pos):
+                    self.pending = text[pos:]
+                    break
+                pos += 1
+                continue
+            pos = m.end()
+            run = m.group("text")
+            if run is not None:
+                self._put(run)
+            elif m.group("final") is not None:
+                self._csi(m.group("params"), m.group("final"))
+            elif m.group("ctrl") is not None:
+                ctrl = m.group("ctrl")
+                if ctrl == "\n":
+                    lines.append(self._line())
+                elif ctrl == "\r":
+                    self.col = 0
+                elif ctrl == "\b":
+                    self.col = max(0, self.col - 1)
+                elif ctrl == "\t":
+                    self._put(" " * (8 - self.col % 8))
+        partial = None
+        if self.changed and self.chars:
+            partial = self._styled(partial=True)
+            self.changed = False
+        return lines, partial
+
+    def _put(self, run):
+        col, n = self.col, len(run)
+        chars = self.chars
+        if col > len(chars):
+            self.styles.extend([()] * (col - len(chars)))
+            chars.extend(" " * (col - len(chars)))
+        chars[col:col + n] = run
+        self.styles[col:col + n] = [self.style] * n
+        self.col = col + n
+        self.changed = True
+
+    def _csi(self, params, final):
+        if final == "m":
+            self._sgr(params)
+            return
+        args = [int(p) if p.isdigit() else 0 for p in params.split(";")] if params else []
+        n = args[0] if args and args[0] else 1
+        if final == "C":
+            self.col += n
+        elif final == "D":
+            self.col = max(0, self.col - n)
+        elif final == "G":
+            self.col = n - 1
+        elif final in "Hf":
+            self.col = (args[1] if len(args) > 1 and args[1] else 1) - 1  # rows are not tracked
+        elif final == "K":
+            mode = args[0] if args else 0
+            if mode == 0:
+                del self.chars[self.col:]
+                del self.styles[self.col:]
+            elif mode == 1:
+                width = min(self.col + 1, len(self.chars))
+                self.chars[:width] = " " * width
+                self.styles[:width] = [()] * width
+            else:
+                self.chars.clear()
+                self.styles.clear()
+            self.changed = True
+        # Vertical moves, scroll regions and screen clears have no meaning in
+        # an append-only log and are ignored
+
+    def _sgr(self, params):
+        codes = [int(p) if p.isdigit() else 0 for p in params.split(";")] if params else [0]
+        i = 0
+        while i < len(codes):
+            code = codes[i]
+            if code == 0:
+                self.fg = self.bg = None
+                self.bold = self.underline = self.inverse = False
+            elif code == 1:
+                self.bold = True
+            elif code == 22:
+                self.bold = False
+            elif code == 4:
+                self.underline = True
+            elif code == 24:
+                self.underline = False
+            elif code == 7:
+                self.inverse = True
+            elif code == 27:
+                self.inverse = False
+            elif 30 <= code <= 37 or 90 <= code <= 97:
+                self.fg = ANSI_PALETTE[code - 30 if code < 90 else code - 82]
+            elif 40 <= code <= 47 or 100 <= code <= 107:
+                self.bg = ANSI_PALETTE[code - 40 if code < 100 else code - 92]
+            elif code == 39:
+                self.fg = None
+            elif code == 49:
+                self.bg = None
+            elif code in (38, 48) and i + 1 < len(codes):
+                # 38;5;n (256 colours) or 38;2;r;g;b (true colour)
+                if codes[i + 1] == 5 and i + 2 < len(codes):
+                    color = ansi_color(codes[i + 2] % 256)
+                    i += 2
+                elif codes[i + 1] == 2 and i + 4 < len(codes):
+                    color = "#%02x%02x%02x" % tuple(min(255, c) for c in codes[i + 2:i + 5])
+                    i += 4
+                else:
+                    color = None
+                if code == 38:
+                    self.fg = color
+                else:
+                    self.bg = color
+            i += 1
+        fg, bg = self.fg, self.bg
+        if self.inverse:
+            fg, bg = bg or ANSI_DEFAULT_BG, fg or ANSI_DEFAULT_FG
+        style = []
+        if fg:
+            style.append("fg" + fg)
+        if bg:
+            style.append("bg" + bg)
+        if self.bold:
+            style.append("bold")
+        if self.underline:
+            style.append("underline")
+        self.style = tuple(style)
+
+    def _styled(self, partial=False):
+        text = "".join(self.chars).rstrip()
+        spans = []
+        if any(self.styles):
+            start = 0
+            for style, cells in groupby(self.styles[:len(text)]):
+                width = sum(1 for _ in cells)
+                for tag in style:
+                    spans.append((start, start + width, tag))
+                start += width
+        return StyledText(text, spans, partial)
+
+    def _line(self):
+        line = self._styled()
+        self.chars = []
+        self.styles = []
+        self.col = 0
+        self.changed = False
+        return line
+
+
+# === Triggers ===
+# User rules checked against every received line right after framing. Rules
+# are compiled together into a few alternations (literals escaped, exact and
+# case-insensitive apart, regexes in another), so a line that matches nothing
+# costs one C-level search per group with 5 or 500 rules. Rules are only
+# checked one by one on lines their group matched. Regexes that can't be
+# combined (inline global flags, named groups, backreferences) are searched
+# on their own.
+TRIGGER_ACTIONS = {
+    "Highlight": "highlight",
+    "Alert": "alert",
+    "Send": "send",
+    "Start capture": "capture_start",
+    "Stop capture": "capture_stop",
+}
+DEFAULT_HIGHLIGHT = "#ffc0c0"
+trigger_escape = re.compile(r"\\(r|n|t|\\|x[0-9a-fA-F]{2})")
+
+
+def unescape(text):
+    # "\r", "\n", "\t", "\\" and "\xHH" in a send argument -> bytes. Text is
+    # UTF-8 encoded, \xHH is exactly that one byte.
+    out = bytearray()
+    pos = 0
+    for m in trigger_escape.finditer(text):
+        out += text[pos:m.start()].encode("utf-8")
+        code = m.group(1)
+        out += {"r": b"\r", "n": b"\n", "t": b"\t", "\\": b"\\"}.get(code) or bytes([int(code[1:], 16)])
+        pos = m.end()
+    out += text[pos:].encode("utf-8")
+    return bytes(out)
+
+
+def literal_pattern(words):
+    # A regex matching any of `words`, factored on shared prefixes so the
+    # engine follows one branch per character rather than trying every word
+    trie = {}
+    for word in words:
+        node = trie
+        for ch in word:
+            node = node.setdefault(ch, {})
+        node[""] = None
+
+    def build(node):
+        branches = [re.escape(ch) + build(child) for ch, child in node.items() if ch]
+        if not branches:
+            return ""
+        if len(branches) == 1 and "" not in node:
+            return branches[0]
+        return "(?:" + "|".join(branches) + (")?" if "" in node else ")")
+
+    return build(trie)
+
+
+# Regex features that break (or change meaning) inside a combined alternation
+uncombinable_regex = re.compile(r"\(\?[aiLmsux-]*[aiLmsux]\)|\(\?P[<=]|\(\?<[A-Za-z_]|\(\?\(|\\[1-9]|\\g")
+
+
+class TriggerRule:
+    FIELDS = ("pattern", "regex", "ignore_case", "action", "argument", "cooldown", "enabled", "hits")
+
+    def __init__(self, pattern, regex=False, ignore_case=False, action="highlight", argument="",
+                 cooldown=0.0, enabled=True, hits=0):
+        self.pattern = pattern
+        self.regex = bool(regex)
+        self.ignore_case = bool(ignore_case)
+        self.action = action
+        self.argument = argument
+        self.cooldown = float(cooldown)  # seconds before the rule can fire again
+        self.enabled = bool(enabled)
+        self.hits = int(hits)
+        self.last_fired = None
+        self.payload = unescape(argument) if action == "send" else b""
+        if self.regex:
+            re.compile(pattern)  # raise re.error now rather than when compiling the set
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.FIELDS}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**{name: data[name] for name in cls.FIELDS if name in data})
+
+
+class TriggerEngine:
+    def __init__(self, rules=()):
+        self.set_rules(rules)
+
+    def set_rules(self, rules):
+        # Compiles into a new tuple that match() picks up in one read. Raises
+        # re.error before changing anything if a rule doesn't compile.
+        rules = list(rules)
+        active = [r for r in rules if r.enabled and r.pattern]
+        # (combined regex or None, [(rule, own regex or substring)], lowercase the line)
+        groups = []
+        # Literals ignoring case are matched lowercased: an IGNORECASE
+        # alternation of hundreds of words is many times slower
+        for fold in (False, True):
+            literals = [(r, r.pattern.lower() if fold else r.pattern) for r in active
+                        if not r.regex and r.ignore_case == fold]
+            if literals:
+                groups.append((re.compile(literal_pattern(word for _, word in literals)), literals, fold))
+        regexes = [(r, re.compile(r.pattern, re.IGNORECASE if r.ignore_case else 0)) for r in active if r.regex]
+        combinable = [(r, regex) for r, regex in regexes
+                      if not regex.groupindex and not uncombinable_regex.search(r.pattern)]
+        if combinable:
+            try:
+                groups.append((re.compile("|".join(
+                    f"(?i:{r.pattern})" if r.ignore_case else f"(?:{r.pattern})" for r, _ in combinable)),
+                    combinable, False))
+            except re.error:
+                combinable = []
+        combined = {id(r) for r, _ in combinable}
+        groups.extend((None, [(r, regex)], False) for r, regex in regexes if id(r) not in combined)
+        self.rules = rules
+        self.compiled = groups
+        # What a pipeline worker needs to rebuild the matchers, and the rules
+        # its results index into
+        self.spec = (tuple((r.pattern, r.regex, r.ignore_case) for r in active), active)
+
+    def candidates(self, line):
+        # Rules whose pattern is in the line, ignoring cooldowns
+        hits = []
+        lowered = None
+        for combined, members, fold in self.compiled:
+            text = line
+            if fold:
+                text = lowered = line.lower() if lowered is None else lowered
+            if combined is not None:
+                if not combined.search(text):
+                    continue
+                if len(members) == 1:
+                    hits.append(members[0][0])
+                    continue
+            for rule, check in members:
+                if check in text if isinstance(check, str) else check.search(text):
+                    hits.append(rule)
+        return hits
+
+    def match(self, line):
+        # Rules firing on this line, in rule order, with hit counts updated
+        return self.fire(self.candidates(line))
+
+    def fire(self, hits):
+        if not hits:
+            return hits
+        now = time.monotonic()
+        fired = []
+        for rule in hits:
+            if rule.cooldown and rule.last_fired is not None and now - rule.last_fired < rule.cooldown:
+                continue
+            rule.last_fired = now
+            rule.hits += 1
+            fired.append(rule)
+        if len(fired) > 1:
+            order = {id(rule): i for i, rule in enumerate(self.rules)}
+            fired.sort(key=lambda rule: order[id(rule)])
+        return fired
+
+    def reset_hits(self):
+        for rule in self.rules:
+            rule.hits = 0
+
+
+def load_triggers(path=TRIGGERS_FILE):
+    if not Path(path).exists():
+        return []
+    with open(path, "r", encoding="utf-8") as f:
+        items = json.load(f)
+    rules = []
+    for item in items:
+        # One bad rule (e.g. a regex an older version accepted) doesn't cost the rest
+        try:
+            rules.append(TriggerRule.from_dict(item))
+        except (re.error, ValueError, TypeError, KeyError) as e:
+            logger.warning(f"Skipped trigger {item.get('pattern')!r}: {e}")
+    return rules
+
+
+def save_triggers(rules, path=TRIGGERS_FILE):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump([rule.to_dict() for rule in rules], f, indent=2)
+
+
+# === Telemetry ===
+# Numeric fields are pulled out of received lines into per-series ring
+# buffers. The I/O thread only queues each read's lines; the GUI tick parses
+# everything queued with one regex pass per pattern over the joined batch.
+# Each series keeps the min/max of every block of points, so a plot reads
+# about one block per screen column however many points it covers.
+DEFAULT_TELEMETRY_PATTERN = r"(?<![A-Za-z_])([A-Za-z_][\w.]{0,63})\s*[=:]\s*([-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)"
+TELEMETRY_CAPACITY = 1 << 19  # points kept per series, about 9 minutes at 1 kHz (8 MB)
+TELEMETRY_CAPACITIES = {"64k": 1 << 16, "512k": 1 << 19, "4M": 1 << 22}  # points per series
+TELEMETRY_BLOCK = 256         # points per precomputed min/max block
+MAX_TELEMETRY_SERIES = 32     # new names beyond this are ignored
+PLOT_REFRESH_MS = 250
+PLOT_WINDOWS = {"10 s": 10, "1 min": 60, "10 min": 600, "1 h": 3600, "All": None}
+PLOT_COLORS = ["#1f77b4", "#d62728", "#2ca02c", "#ff7f0e", "#9467bd", "#8c564b", "#e377c2", "#17becf"]
+
+
+class TelemetrySeries:
+    def __init__(self, name, capacity=TELEMETRY_CAPACITY):
+        self.name = name
+        self.capacity = capacity - capacity % TELEMETRY_BLOCK  # blocks never wrap
+        self.times = array("d")   # monotonic seconds
+        self.values = array("d")
+        self.block_min = array("d")
+        self.block_max = array("d")
+        self.count = 0            # points ever added; the ring holds the newest `capacity`
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    @property
+    def first(self):
+        # Absolute number of the oldest point still held
+        return max(0, self.count - self.capacity)
+
+    def add(self, when, value):
+        slot = self.count % self.capacity
+        if self.count < self.capacity:
+            self.times.append(when)
+            self.values.append(value)
+        else:
+            self.times[slot] = when
+            self.values[slot] = value
+        self.count += 1
+        if self.count % TELEMETRY_BLOCK == 0:
+            start = slot + 1 - TELEMETRY_BLOCK
+            block = self.values[start:slot + 1]
+            b = start // TELEMETRY_BLOCK
+            if b < len(self.block_min):
+                self.block_min[b], self.block_max[b] = min(block), max(block)
+            else:
+                self.block_min.append(min(block))
+                self.block_max.append(max(block))
+
+    def index_at(self, when):
+        # Absolute number of the first point at or after `when`
+        times, capacity = self.times, self.capacity
+        lo, hi = self.first, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if times[mid % capacity] < when:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def min_max(self, lo, hi):
+        # Over absolute points [lo, hi): whole blocks from the block arrays,
+        # the ragged ends from the raw values
+        values, capacity, size = self.values, self.capacity, TELEMETRY_BLOCK
+        complete = self.count - self.count % size
+        low = high = None
+        n = lo
+        while n < hi:
+            if n % size == 0 and n + size <= min(hi, complete):
+                b = n % capacity // size
+                part_min, part_max = self.block_min[b], self.block_max[b]
+                n += size
+            else:
+                end = min(hi, n - n % size + size)
+                slot = n % capacity
+                part = values[slot:slot + end - n]
+                part_min, part_max = min(part), max(part)
+                n = end
+            low = part_min if low is None or part_min < low else low
+            high = part_max if high is None or part_max > high else high
+        return low, high
+
+    def columns(self, start, end, width):
+        # (column, min, max) for each of `width` columns over [start, end)
+        # that holds data
+        bounds = [self.index_at(start + (end - start) * c / width) for c in range(width + 1)]
+        out = []
+        for c in range(width):
+            if bounds[c] < bounds[c + 1]:
+                low, high = self.min_max(bounds[c], bounds[c + 1])
+                out.append((c, low, high))
+        return out
+
+    def snapshot(self):
+        # (times, values) oldest first, copied so they can be written elsewhere
+        if self.count <= self.capacity:
+            return array("d", self.times), array("d", self.values)
+        slot = self.count % self.capacity
+        return self.times[slot:] + self.times[:slot], self.values[slot:] + self.values[:slot]
+
+
+def parse_telemetry(patterns, text):
+    # (name, value) pairs found in text by compiled patterns
+    found = []
+    for regex in patterns:
+        if regex.groupindex:
+            pairs = (item for m in regex.finditer(text) for item in m.groupdict().items())
+        else:
+            pairs = regex.findall(text)
+        for name, value in pairs:
+            try:
+                found.append((name, float(value)))
+            except (TypeError, ValueError):
+                continue  # group did not take part, or not a number
+    return found
+
+
+class Telemetry:
+    def __init__(self, patterns=(DEFAULT_TELEMETRY_PATTERN,), capacity=TELEMETRY_CAPACITY):
+        # (arrival_ns, lines, pairs) from the I/O thread; pairs were already
+        # parsed by a pipeline worker
+        self.pending = deque()
+        self.capacity = capacity  # for series created from now on
+        self.series = {}        # name -> TelemetrySeries, in first-seen order
+        self.set_patterns(patterns)
+
+    def set_patterns(self, patterns):
+        # Named groups are series; a pattern without them gives (name, value)
+        compiled = []
+        for pattern in patterns:
+            regex = re.compile(pattern)
+            if not regex.groupindex and regex.groups != 2:
+                raise ValueError(f"{pattern!r} needs named groups or exactly two groups (name, value)")
+            compiled.append(regex)
+        self.patterns = compiled
+
+    def feed(self, lines, arrival_ns, pairs=None):
+        self.pending.append((arrival_ns, lines, pairs))
+
+    def process(self):
+        # Parse everything queued since the last tick; returns points added
+        added = 0
+        while self.pending:
+            arrival_ns, lines, pairs = self.pending.popleft()
+            when = arrival_ns / 1e9
+            if lines:
+                added += self._add(when, parse_telemetry(self.patterns, "\n".join(lines)))
+            if pairs:
+                added += self._add(when, pairs)
+        return added
+
+    def _add(self, when, pairs):
+        added = 0
+        for name, value in pairs:
+            series = self.series.get(name)
+            if series is None:
+                if len(self.series) >= MAX_TELEMETRY_SERIES:
+                    continue
+                series = self.series[name] = TelemetrySeries(name, self.capacity)
+            series.add(when, value)
+            added += 1
+        return added
+
+
+def load_telemetry_patterns(path=TELEMETRY_FILE):
+    if not Path(path).exists():
+        return [DEFAULT_TELEMETRY_PATTERN]
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_telemetry_patterns(patterns, path=TELEMETRY_FILE):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(patterns, f, indent=2)
+
+
+def export_telemetry(series_list, path):
+    # Long format CSV: time, series, value. Monotonic times become wall-clock
+    offset = time.time() - time.monotonic()
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["time", "series", "value"])
+        for name, times, values in series_list:
+            writer.writerows(
+                (datetime.fromtimestamp(t + offset).isoformat(sep=" ", timespec="milliseconds"), name, v)
+                for t, v in zip(times, values))
+
+
+# === Serial session ===
+TX_QUEUE_SIZE = 1024        # writes waiting to be transmitted
+TX_COALESCE_BYTES = 4096    # small queued writes are merged up to this size
+RX_READ_SIZE = 65536        # bytes per read when the I/O core services a port
+LINE_BATCH = object()       # response_queue item (LINE_BATCH, [(command, line), ...])
+FLOW_CONTROLS = {
+    "None": {},
+    "RTS/CTS": {"rtscts": True},
+    "DSR/DTR": {"dsrdtr": True},
+    "XON/XOFF": {"xonxoff": True},
+}
+PARITIES = {
+    "None": serial.PARITY_NONE,
+    "Even": serial.PARITY_EVEN,
+    "Odd": serial.PARITY_ODD,
+    "Mark": serial.PARITY_MARK,
+    "Space": serial.PARITY_SPACE
+}
+
+
+class IOCore:
+    # One selector thread services every port that has a file descriptor
+    # (serial devices and ptys on Linux/macOS): reads, queued writes and TX
+    # pacing. Ports without one (Windows COM handles, loop://) fall back to
+    # a reader/writer thread pair in SerialSession.
+    def __init__(self):
+        self.selector = None
+        self.thread = None
+        self.lock = threading.Lock()
+        self.calls = deque()
+        self.sessions = set()
+        self.wake_r = self.wake_w = None
+
+    def _ensure_started(self):
+        with self.lock:
+            if self.thread and self.thread.is_alive():
+                return
+            self.selector = selectors.DefaultSelector()
+            self.wake_r, self.wake_w = os.pipe()
+            os.set_blocking(self.wake_r, False)
+            os.set_blocking(self.wake_w, False)
+            self.selector.register(self.wake_r, selectors.EVENT_READ, None)
+            self.thread = threading.Thread(target=self.run, name="IOCore", daemon=True)
+            self.thread.start()
+
+    def wake(self):
+        try:
+            os.write(self.wake_w, b"\0")
+        except (BlockingIOError, OSError, TypeError):
+            pass  # already woken, or not started
+
+    def call(self, fn, wait=False):
+        # Runs fn on the core thread; optionally waits for it to finish
+        if threading.current_thread() is self.thread:
+            fn()
+            return
+        done = threading.Event() if wait else None
+
+        def wrapped():
+            try:
+                fn()
+            finally:
+                if done:
+                    done.set()
+
+        self.calls.append(wrapped)
+        self.wake()
+        if done:
+            done.wait(timeout=2)
+
+    def register(self, session):
+        self._ensure_started()
+        self.call(lambda: self._register(session), wait=True)
+
+    def unregister(self, session):
+        if self.thread:
+            self.call(lambda: self._unregister(session), wait=True)
+
+    def _register(self, session):
+        self.sessions.add(session)
+        self._select(session)
+
+    def _unregister(self, session):
+        if session in self.sessions:
+            self.sessions.discard(session)
+            try:
+                self.selector.unregister(session.fd)
+            except (KeyError, ValueError):
+                pass
+
+    def want_write(self, session, enabled):
+        session.tx_waiting = enabled
+        self._select(session)
+
+    def hold_read(self, session):
+        # The session's rx_holds changed
+        if session in self.sessions:
+            self._select(session)
+
+    def _select(self, session):
+        # Watch the port for what it currently needs; a port whose reads are
+        # held and that has nothing to write is left out of the selector
+        events = (0 if session.rx_holds else selectors.EVENT_READ) | \
+            (selectors.EVENT_WRITE if session.tx_waiting else 0)
+        try:
+            if not events:
+                self.selector.unregister(session.fd)
+            else:
+                try:
+                    self.selector.modify(session.fd, events, session)
+                except KeyError:
+                    self.selector.register(session.fd, events, session)
+        except (KeyError, ValueError):
+            pass
+
+    def run(self):
+        while True:
+            now = time.monotonic()
+            timeout = 0.5
+            for session in self.sessions:
+                if session.tx_ready_at is not None:
+                    timeout = min(timeout, max(0.0, session.tx_ready_at - now))
+                if session.pipeline is not None and session.pipeline.first_ns is not None:
+                    timeout = min(timeout, max(0.0, session.pipeline.due() - now))
+                elif session.hex_pending and session.pipeline is None:
+                    timeout = min(timeout, max(0.0, session.hex_due() - now))
+            for key, mask in self.selector.select(timeout):
+                session = key.data
+                if session is None:
+                    try:
+                        while os.read(self.wake_r, 4096):
+                            pass
+                    except BlockingIOError:
+                        pass
+                    continue
+                if session not in self.sessions:
+                    continue
+                if mask & selectors.EVENT_READ:
+                    session._core_read()
+                if mask & selectors.EVENT_WRITE and session in self.sessions:
+                    session._core_write()
+            while self.calls:
+                self.calls.popleft()()
+            # Start queued writes and expired pacing timers
+            now = time.monotonic()
+            for session in list(self.sessions):
+                if session.tx_waiting:
+                    continue
+                if session.tx_ready_at is None:
+                    if session.tx_buffer or not session.tx_queue.empty():
+                        session._core_write()
+                elif session.tx_ready_at <= now:
+                    session._core_write()
+            # Hand off pipeline blocks whose data has waited long enough, and
+            # finish short hex rows on ports that went quiet. (In pipeline mode
+            # hex reads are applied off this thread, so the row waits for data.)
+            for session in list(self.sessions):
+                feed = session.pipeline
+                if feed is not None and feed.first_ns is not None and feed.due() <= now:
+                    feed.flush()
+                elif feed is None and session.hex_pending and session.hex_due() <= now:
+                    session.hex_flush()
+
+
+io_core = IOCore()
+
+
+class SerialSession:
+    # One open port: framer, TX queue and the queues handed to the GUI.
+    # Reads and writes are serviced by the shared IOCore when the port has a
+    # file descriptor, otherwise by a reader and a writer thread. Either way a
+    # single owner transmits, so callers never block on the port and writes
+    # from different threads never interleave.
+    # Has no Tk dependency so it can also be driven headless (benchmarks, replay).
+    def __init__(self, port, baudrate=DEFAULT_BAUDRATE, parity="None", framing=DEFAULT_FRAMING,
+                 flow="None", char_delay=0.0, line_delay=0.0,
+                 response_queue=None, correlator=None, on_error=None, core=None):
+        self.port = port
+        self.baudrate = baudrate
+        self.parity = parity
+        self.framing = framing
+        self.flow = flow
+        self.char_delay = char_delay  # seconds between bytes
+        self.line_delay = line_delay  # seconds between queued writes
+        self.response_queue = response_queue if response_queue is not None else Queue()
+        self.correlator = correlator if correlator is not None else CommandCorrelator()
+        self.on_error = on_error
+        self.core = io_core if core is None else core  # core=False forces threads
+        self.consume = True  # False: raw taps only, no framing or response queue
+        self.display = "text"  # a DISPLAY_MODES value, can change while open
+        self.ansi = None       # AnsiTerminal, created on first use
+        self.hex_pending = bytearray()  # bytes of the hex row being filled
+        self.hex_last_ns = 0            # arrival of its last byte
+        self.triggers = None   # TriggerEngine checked against every line
+        self.on_trigger = None # called with (rule, line) for non-highlight actions
+        self.telemetry = None  # Telemetry fed each read's lines, parsed on the GUI tick
+        self.pipeline = None   # PipelineFeed when text is processed in the process pool
+        self.taps = []       # callables receiving every raw RX chunk (routing)
+        self.rx_holds = set()  # whoever has reading paused (routes applying backpressure)
+        self.ser = None
+        self.fd = None
+        self.framer = None
+        self.capture = None
+        self.reader_thread = None
+        self.writer_thread = None
+        self.tx_queue = Queue(maxsize=TX_QUEUE_SIZE)
+        self.running = False
+        self.reconnecting = False  # lost, a supervisor is reopening it; writes are held
+        self.supervisor = None     # ConnectionSupervisor, when reconnecting automatically
+        # Core-mode TX state, only touched on the core thread. In thread mode it
+        # holds a write that failed, to be sent first after a reopen.
+        self.tx_buffer = bytearray()
+        self.tx_ready_at = None  # pacing timer: next write not before this time
+        self.tx_waiting = False  # waiting for the port to become writable
+        # Counters for the stats panel and metrics endpoint
+        self.rx_bytes = 0
+        self.rx_reads = 0
+        self.rx_lines = 0
+        self.undecodable_bytes = 0  # dropped by decoding
+        self.tx_bytes = 0
+        self.tx_writes = 0
+
+    @property
+    def is_open(self):
+        return self.ser is not None and self.ser.is_open
+
+    @property
+    def io_thread(self):
+        # Thread doing this session's receive work
+        return self.core.thread if self.fd is not None else self.reader_thread
+
+    def open(self):
+        self.ser = serial.serial_for_url(
+            self.port,
+            baudrate=self.baudrate,
+            parity=PARITIES[self.parity],
+            bytesize=serial.EIGHTBITS,
+            stopbits=serial.STOPBITS_ONE,
+            timeout=TIMEOUT,
+            **FLOW_CONTROLS[self.flow]
+        )
+        self.framer = LineFramer.from_name(self.framing)
+        self.running = True
+        if self.core and os.name == "posix":
+            try:
+                self.fd = self.ser.fileno()
+            except Exception:
+                self.fd = None
+        if self.fd is not None:
+            os.set_blocking(self.fd, False)
+            self.core.register(self)
+            return
+        self.reader_thread = threading.Thread(target=self.reader, name=f"reader-{self.port}", daemon=True)
+        self.reader_thread.start()
+        self.writer_thread = threading.Thread(target=self.writer, name=f"writer-{self.port}", daemon=True)
+        self.writer_thread.start()
+
+    def reopen(self, port=None):
+        # Opens the port again after fail() with the same settings, under a new
+        # name if given. The TX queue, unsent bytes, counters and taps carry over.
+        self.running = False
+        if self.fd is not None:
+            self.core.unregister(self)
+            self.fd = None
+        if self.ser:
+            try:
+                self.ser.close()
+            except Exception:
+                pass
+        for thread in (self.writer_thread, self.reader_thread):
+            if thread and thread.is_alive() and thread is not threading.current_thread():
+                thread.join(timeout=2)
+        self.reader_thread = self.writer_thread = None
+        self.tx_ready_at = None
+        self.tx_waiting = False
+        if port:
+            self.port = port
+        self.open()
+
+    def close(self):
+        if self.supervisor:
+            self.supervisor.stop()
+        self.reconnecting = False
+        self.running = False
+        if self.fd is not None:
+            self.core.unregister(self)
+        if self.pipeline:
+            self.pipeline.close()
+        try:
+            self.tx_queue.put_nowait(None)  # wake the writer
+        except Full:
+            pass
+        for thread in (self.writer_thread, self.reader_thread):
+            if thread and thread.is_alive() and thread is not threading.current_thread():
+                if thread is self.reader_thread and self.ser:
+                    self.ser.close()
+                thread.join(timeout=2)  # Wait up to 2 sec to stop
+        ser, self.ser = self.ser, None
+        if ser:
+            ser.close()
+
+    def set_pacing(self, char_delay=0.0, line_delay=0.0):
+        self.char_delay = max(0.0, float(char_delay))
+        self.line_delay = max(0.0, float(line_delay))
+
+    def tx_depth(self):
+        return self.tx_queue.qsize()
+
+    def handle_rx(self, chunk, arrival_ns):
+        self._rx_raw(chunk, arrival_ns)
+        self._rx_consume(chunk, arrival_ns)
+
+    def _rx_raw(self, chunk, arrival_ns):
+        # Counters, capture and taps: everything that needs the bytes as read
+        self.rx_bytes += len(chunk)
+        self.rx_reads += 1
+        capture = self.capture
+        if capture:
+            capture.write(CAPTURE_RX, self.port, chunk, arrival_ns)
+        for tap in self.taps:
+            tap(chunk)
+
+    def _rx_consume(self, chunk, arrival_ns):
+        if not self.consume:
+            return
+        if self.display == "ansi":
+            self._ansi_rx(chunk, arrival_ns)
+            return
+        if self.display != "text":
+            self._hex_rx(chunk, arrival_ns)
+            return
+        if self.hex_pending:
+            self.hex_flush()  # switched away from hex
+        lines = self._clean_frames(self.framer.feed(chunk))
+        for cleaned in lines:
+            if self.triggers:
+                cleaned = self._trigger(cleaned)
+            self.rx_lines += 1
+            cmd = self.correlator.on_line(cleaned, arrival_ns)
+            self.response_queue.put((cmd, cleaned))
+        if lines and self.telemetry:
+            self.telemetry.feed(lines, arrival_ns)
+
+    def _hex_rx(self, chunk, arrival_ns):
+        # Rows fill up to HEX_ROW_BYTES across reads; the short row left over
+        # is shown as a partial line until it fills or the port goes quiet
+        if self.hex_pending and arrival_ns - self.hex_last_ns > HEX_ROW_IDLE * 1e9:
+            self.hex_flush()
+        if self.hex_pending:
+            self.hex_pending += chunk
+            chunk = bytes(self.hex_pending)
+        full = len(chunk) - len(chunk) % HEX_ROW_BYTES
+        rows = hexdump_rows(chunk[:full], self.display)
+        self.rx_lines += len(rows)
+        for row in rows:
+            self.response_queue.put((UNKNOWN_COMMAND, row))
+        self.hex_pending[:] = chunk[full:]
+        self.hex_last_ns = arrival_ns
+        if self.hex_pending:
+            row = hexdump_rows(bytes(self.hex_pending), self.display)[0]
+            self.response_queue.put((UNKNOWN_COMMAND, StyledText(row, partial=True)))
+
+    def hex_due(self):
+        # When the short hex row should be finished, in time.monotonic() seconds
+        return self.hex_last_ns / 1e9 + HEX_ROW_IDLE if self.hex_pending else None
+
+    def hex_flush(self):
+        # Finish the short hex row (on the thread that reads the port)
+        if self.hex_pending:
+            row = hexdump_rows(bytes(self.hex_pending), self.display if self.display != "text" else "hex")[0]
+            self.hex_pending.clear()
+            self.rx_lines += 1
+            self.response_queue.put((UNKNOWN_COMMAND, row))
+
+    def _clean_frames(self, frames):
+        lines = []
+        for frame in frames:
+            # Decode once per complete frame instead of once per chunk
+            try:
+                text = frame.decode()
+            except UnicodeDecodeError:
+                text = frame.decode(errors='ignore')
+                self.undecodable_bytes += len(frame) - len(text.encode())
+            cleaned = clean_line(text)
+            if cleaned:
+                lines.append(cleaned)
+        return lines
+
+    def _ansi_rx(self, chunk, arrival_ns):
+        if self.ansi is None:
+            self.ansi = AnsiTerminal()
+        lines, partial = self.ansi.feed(chunk)
+        for line in lines:
+            self.rx_lines += 1
+            if self.triggers and line:
+                line = self._trigger(line)
+            plain = line.strip()
+            cmd = self.correlator.on_line(plain, arrival_ns) if plain else UNKNOWN_COMMAND
+            self.response_queue.put((cmd, line))
+        if partial:
+            self.response_queue.put((UNKNOWN_COMMAND, partial))
+
+    def _trigger(self, line, hits=None):
+        # Runs matching rules; highlights come back as a style span on the line.
+        # `hits` are rules a pipeline worker already matched.
+        fired = self.triggers.match(line) if hits is None else self.triggers.fire(hits)
+        if not fired:
+            return line
+        spans = list(getattr(line, "spans", ()))
+        for rule in fired:
+            if rule.action == "highlight":
+                spans.append((0, len(line), "bg" + (rule.argument or DEFAULT_HIGHLIGHT)))
+                continue
+            if rule.action == "send" and rule.payload:
+                # Answer straight from the I/O thread, the GUI may be busy
+                try:
+                    self.transmit(rule.payload, block=False)
+                except RuntimeError:
+                    pass
+            if self.on_trigger:
+                self.on_trigger(rule, str(line))
+        return StyledText(line, spans) if spans else line
+
+    def fail(self, e):
+        # Stop servicing the port after an I/O error and report it once
+        if self.fd is not None:
+            self.core.unregister(self)
+        if self.running and self.on_error:
+            self.on_error(e)
+        self.running = False
+
+    def reader(self):
+        ser = self.ser
+        feed = self.pipeline
+        while self.running and ser.is_open:
+            try:
+                chunk = ser.read(ser.in_waiting or 1)
+                if feed is None:
+                    if chunk:
+                        self.handle_rx(chunk, time.monotonic_ns())
+                    elif self.hex_pending:
+                        self.hex_flush()  # the read timed out, the port is idle
+                    continue
+                if not chunk:
+                    feed.flush()
+                    continue
+                arrival_ns = time.monotonic_ns()
+                self._rx_raw(chunk, arrival_ns)
+                if not self._pooled():
+                    feed.raw(chunk, arrival_ns)
+                    continue
+                feed.add(chunk, arrival_ns)
+                if not ser.in_waiting:
+                    feed.flush()  # the port went quiet, don't sit on the data
+            except Exception as e:
+                self.fail(e)
+                break
+
+    def transmit(self, data, command=None, block=True, timeout=None):
+        # Queues data for transmission. Returns the correlator entry when
+        # `command` is given. Raises RuntimeError if the TX queue stays full.
+        if not (self.running or self.reconnecting):
+            raise RuntimeError("Port is closed")
+        entry = self.correlator.sent(command) if command is not None else None
+        try:
+            self.tx_queue.put((data, entry), block=block, timeout=timeout)
+        except Full:
+            if entry:
+                self.correlator.cancel(entry, count_timeout=False)
+            raise RuntimeError("TX queue full")
+        if self.fd is not None:
+            self.core.wake()
+        return entry
+
+    # --- I/O core mode (runs on the core thread) ---
+    def _pooled(self):
+        # Whether received data goes to the pipeline's pool rather than straight through
+        return self.consume and self.display == "text" and self.framer.mode in ("line", "delimiter")
+
+    def _core_read(self):
+        feed = self.pipeline
+        if feed is not None and self._pooled():
+            self._core_read_block(feed)
+            return
+        try:
+            chunk = os.read(self.fd, RX_READ_SIZE)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError as e:
+            self.fail(e)
+            return
+        if not chunk:
+            self.fail(serial.SerialException("Port closed by device"))
+            return
+        if feed is None:
+            self.handle_rx(chunk, time.monotonic_ns())
+            return
+        arrival_ns = time.monotonic_ns()
+        self._rx_raw(chunk, arrival_ns)
+        feed.raw(chunk, arrival_ns)
+
+    def _core_read_block(self, feed):
+        # Pipeline mode: read straight into the shared memory slot being filled
+        view = feed.space()
+        try:
+            n = os.readv(self.fd, [view])
+        except (BlockingIOError, InterruptedError):
+            view.release()
+            return
+        except OSError as e:
+            view.release()
+            self.fail(e)
+            return
+        if not n:
+            view.release()
+            self.fail(serial.SerialException("Port closed by device"))
+            return
+        arrival_ns = time.monotonic_ns()
+        if self.capture or self.taps:
+            self._rx_raw(bytes(view[:n]), arrival_ns)
+        else:
+            self.rx_bytes += n
+            self.rx_reads += 1
+        view.release()
+        feed.commit(n, arrival_ns)
+
+    def _core_next_item(self):
+        try:
+            return self.tx_queue.get_nowait()
+        except Empty:
+            return None
+
+    def hold_rx(self, holder, held):
+        # Pauses reading the port while any holder can't keep up. Only for
+        # ports on the core: a thread-mode tap blocks its own reader instead.
+        if held:
+            self.rx_holds.add(holder)
+        else:
+            self.rx_holds.discard(holder)
+        if self.fd is not None:
+            self.core.call(lambda: self.core.hold_read(self))
+
+    def _core_write(self):
+        if self.tx_ready_at is not None and self.tx_ready_at > time.monotonic():
+            return
+        self.tx_ready_at = None
+        try:
+            while True:
+                if not self.tx_buffer:
+                    if not self._core_fill():
+                        if self.tx_waiting:
+                            self.core.want_write(self, False)
+                        return
+                size = 1 if self.char_delay else len(self.tx_buffer)
+                written = os.write(self.fd, self.tx_buffer[:size])
+                del self.tx_buffer[:written]
+                if self.char_delay or (self.line_delay and not self.tx_buffer):
+                    delay = self.char_delay if self.tx_buffer else max(self.char_delay, self.line_delay)
+                    self.tx_ready_at = time.monotonic() + delay
+                    if self.tx_waiting:
+                        self.core.want_write(self, False)
+                    return
+        except BlockingIOError:
+            # Port (or flow control) is holding us back, continue when writable
+            self.core.want_write(self, True)
+        except OSError as e:
+            self.fail(e)
+
+    def _core_fill(self):
+        # Moves queued writes into tx_buffer, merged unless pacing is on
+        item = self._core_next_item()
+        if item is None:
+            return False
+        now_ns = time.monotonic_ns()
+        while True:
+            data, entry = item
+            if entry:
+                entry.sent_ns = now_ns  # latency counts from the actual write
+            self.tx_buffer += data
+            self._written(data)
+            if self.char_delay or self.line_delay or len(self.tx_buffer) >= TX_COALESCE_BYTES:
+                return True
+            item = self._core_next_item()
+            if item is None:
+                return True
+
+    # --- Thread mode ---
+    def writer(self):
+        ser = self.ser
+        tx_queue = self.tx_queue
+        if self.tx_buffer:
+            # Failed before the port was reopened
+            try:
+                ser.write(self.tx_buffer)
+                self._written(bytes(self.tx_buffer))
+                self.tx_buffer.clear()
+            except Exception as e:
+                self.fail(e)
+                return
+        while self.running:
+            try:
+                item = tx_queue.get(timeout=0.5)
+            except Empty:
+                continue
+            if item is None:
+                break
+            if not self.running:
+                self.tx_buffer += item[0]  # failed meanwhile: held for the reopen
+                break
+            batch = [item]
+            if not (self.char_delay or self.line_delay):
+                # Coalesce whatever else is already queued into one write
+                size = len(item[0])
+                while size < TX_COALESCE_BYTES:
+                    try:
+                        item = tx_queue.get_nowait()
+                    except Empty:
+                        break
+                    if item is None:
+                        self.running = False
+                        break
+                    batch.append(item)
+                    size += len(item[0])
+            try:
+                self._write_batch(ser, batch)
+                if tx_queue.empty():
+                    ser.flush()
+            except Exception as e:
+                # Kept for a reopen; may repeat bytes that were partly written
+                self.tx_buffer += b"".join(data for data, _ in batch)
+                self.fail(e)
+                break
+
+    def _write_batch(self, ser, batch):
+        now = time.monotonic_ns()
+        for _, entry in batch:
+            if entry:
+                entry.sent_ns = now  # latency counts from the actual write
+        if self.char_delay:
+            # Paced byte by byte on monotonic deadlines so delays don't accumulate drift
+            deadline = time.monotonic()
+            for data, _ in batch:
+                for i in range(len(data)):
+                    ser.write(data[i:i + 1])
+                    deadline += self.char_delay
+                    wait = deadline - time.monotonic()
+                    if wait > 0:
+                        time.sleep(wait)
+                self._written(data)
+                if self.line_delay:
+                    time.sleep(self.line_delay)
+        elif self.line_delay:
+            for data, entry in batch:
+                if entry:
+                    entry.sent_ns = time.monotonic_ns()
+                ser.write(data)
+                self._written(data)
+                time.sleep(self.line_delay)
+        else:
+            data = batch[0][0] if len(batch) == 1 else b"".join(d for d, _ in batch)
+            ser.write(data)
+            self._written(data)
+
+    def _written(self, data):
+        self.tx_bytes += len(data)
+        self.tx_writes += 1
+        capture = self.capture
+        if capture:
+            capture.write(CAPTURE_TX, self.port, data)
+
+
+# === Connection supervision ===
+# A supervised session that fails (I/O error, device unplugged, or no data for
+# `watchdog` seconds) is reopened in the background with exponential backoff,
+# on whichever port now holds the same USB adapter. During the outage
+# transmit() keeps filling the bounded TX queue and pending commands don't
+# time out, so what was queued is sent once the port is back.
+RECONNECT_MIN_DELAY = 0.25  # seconds before the second attempt, doubling from there
+RECONNECT_MAX_DELAY = 30.0
+DEFAULT_WATCHDOG = 0.0      # seconds without RX that count as a stall, 0 = off
+
+
+class ConnectionSupervisor(threading.Thread):
+    def __init__(self, session, monitor=None, identity=None, watchdog=DEFAULT_WATCHDOG, on_event=None):
+        super().__init__(name=f"supervisor-{session.port}", daemon=True)
+        self.session = session
+        self.monitor = monitor    # PortMonitor, to find a renamed adapter
+        self.identity = identity  # (vid, pid, serial) of the adapter, if known
+        self.watchdog = max(0.0, float(watchdog))
+        self.on_event = on_event  # on_event(kind, text): "lost", "retry" or "reconnected"
+        self.lock = threading.Lock()  # held while reopening, so stop() can't race it
+        self.wake = threading.Event()
+        self.running = True
+        self.lost_ns = None       # start of the current outage
+        self.reconnects = 0
+        self.recovery = LatencyHistogram()  # outage durations
+        self.last_recovery_s = None
+        session.supervisor = self
+        session.on_error = self.lost
+
+    def lost(self, error):
+        # Called on the session's I/O thread, or ours for a stall
+        if self.lost_ns is None:
+            session = self.session
+            self.lost_ns = time.monotonic_ns()
+            session.reconnecting = True
+            session.correlator.pause(self.lost_ns)
+            self._event("lost", f"Port {session.port} lost: {error}")
+        self.wake.set()
+
+    def matches(self, info):
+        return info.device == self.session.port or (self.identity is not None and info.identity == self.identity)
+
+    def device_removed(self, info):
+        # The monitor can notice an unplug before a read fails
+        if self.lost_ns is None and self.session.running and self.matches(info):
+            self.session.fail(serial.SerialException("Device removed"))
+
+    def device_added(self, info):
+        if self.lost_ns is not None and self.matches(info):
+            self.wake.set()  # try now instead of sitting out the backoff
+
+    def target(self):
+        # The same name unless the adapter came back under another one
+        port = self.session.port
+        if self.identity is None or self.monitor is None:
+            return port
+        info = self.monitor.inventory.get(port)
+        if info and info.identity == self.identity:
+            return port
+        info = self.monitor.find(self.identity)
+        return info.device if info else port
+
+    def run(self):
+        session = self.session
+        delay = RECONNECT_MIN_DELAY
+        seen = (session.rx_bytes, time.monotonic())
+        while self.running:
+            if self.lost_ns is None:
+                self.wake.wait(min(self.watchdog, 1.0) if self.watchdog else None)
+                self.wake.clear()
+                if not self.running:
+                    break
+                if not session.running:
+                    self.lost(serial.SerialException("Port stopped"))  # failed during a reopen
+                elif self.watchdog:
+                    now = time.monotonic()
+                    if session.rx_bytes != seen[0]:
+                        seen = (session.rx_bytes, now)
+                    elif now - seen[1] >= self.watchdog:
+                        session.fail(TimeoutError(f"no data for {self.watchdog:g} s"))
+                continue
+            port = self.target()
+            held = session.tx_depth()
+            with self.lock:
+                if not self.running:
+                    break
+                try:
+                    session.reopen(port)
+                except Exception as e:
+                    error = e
+                else:
+                    error = None
+            if error:
+                self._event("retry", f"Reconnect to {port} failed ({error}), next try in {delay:g} s")
+                self.wake.wait(delay)
+                self.wake.clear()
+                delay = min(delay * 2, RECONNECT_MAX_DELAY)
+                continue
+            now = time.monotonic_ns()
+            outage = now - self.lost_ns
+            self.recovery.add(outage)
+            self.last_recovery_s = outage / 1e9
+            self.reconnects += 1
+            session.correlator.resume(now)
+            session.reconnecting = False
+            self.lost_ns = None
+            delay = RECONNECT_MIN_DELAY
+            seen = (session.rx_bytes, time.monotonic())
+            self._event("reconnected", f"Reconnected to {port} after {outage / 1e9:.2f} s, "
+                                       f"{held} queued writes held")
+
+    def _event(self, kind, text):
+        capture = self.session.capture
+        if capture and kind != "retry":
+            capture.note(self.session.port, text)  # the gap shows up in captures too
+        if self.on_event:
+            self.on_event(kind, text)
+
+    def stop(self):
+        with self.lock:
+            self.running = False
+        self.wake.set()
+        if self.is_alive() and self is not threading.current_thread():
+            self.join(timeout=2)
+
+
+# === Receive pipeline ===
+# Optional multi-core receive path for very high rates. The reader only reads,
+# straight into slots of the port's shared memory block, and hands each filled
+# slot to a process pool by name and offset. Workers frame, decode, clean,
+# match triggers and parse telemetry for the lines wholly inside the block;
+# the partial lines at its edges go through the session's own framer when the
+# result is applied. Results are applied strictly in read order, so command
+# pairing stays sequential, and reach the GUI as one batch per block.
+# The pool does about as much work per byte as the plain receive path, so the
+# pipeline only pays off with a core per worker beside the reader's; on a
+# single core it is slower (benchmark.py --scaling reports the crossover).
+PIPELINE_BLOCK = 256 * 1024     # bytes per shared memory slot
+PIPELINE_SLOTS = 16             # slots per port; with all out, reads go to a plain buffer
+PIPELINE_MIN_BLOCK = 128 * 1024 # a block is handed off once it holds this much ...
+PIPELINE_LATENCY = 0.02         # ... or its oldest byte has waited this long (seconds)
+PIPELINE_BATCH_LINES = 1000     # lines per LINE_BATCH item
+PIPELINE_WORKERS = max(1, (os.cpu_count() or 2) - 1)
+PIPELINE_MIN_CPUS = 2           # fewer cores and the pool only competes with the reader
+pipeline_available = (os.cpu_count() or 1) >= PIPELINE_MIN_CPUS
+PIPELINE_MAPPINGS = 16          # shared memory blocks a worker keeps attached
+
+_worker_blocks = {}    # worker side: shared memory name -> SharedMemory
+_worker_triggers = {}  # worker side: trigger spec -> TriggerEngine
+
+
+def clean_block(body, mode, delimiter):
+    # The lines clean_line gives frame by frame for a run of whole frames
+    # (no terminator at either end), with the undecodable byte count. Like the
+    # framer given one large read, whole frames are never cut at max_frame.
+    # Valid UTF-8 is cleaned in whole-block passes; ANSI sequences never
+    # contain CR or LF, so none spans two frames.
+    try:
+        text = body.decode()
+    except UnicodeDecodeError:
+        text = None
+    if text is not None:
+        text = ansi_escape.sub('', text).replace('\x00', '')
+        parts = text_line_break.split(text) if mode == "line" else text.split(delimiter.decode())
+        return [line for line in (part.replace('\r', '').strip() for part in parts) if line], 0
+    lines = []
+    undecodable = 0
+    for frame in (line_break.split(body) if mode == "line" else body.split(delimiter)):
+        text = frame.decode(errors='ignore')
+        undecodable += len(frame) - len(text.encode())
+        cleaned = clean_line(text)
+        if cleaned:
+            lines.append(cleaned)
+    return lines, undecodable
+
+
+def pipeline_block(job):
+    # Runs in a pool process. Returns None when the block holds no terminator,
+    # else (head_end, tail_start, lines, hits, pairs, undecodable):
+    # data[:head_end] ends the previous block's last frame, data[tail_start:]
+    # starts the next one's, hits are (line, [rule index]) into the trigger spec
+    name, offset, length, data, mode, delimiter, trigger_spec, telemetry_patterns = job
+    if data is None:
+        memory = _worker_blocks.get(name)
+        if memory is None:
+            from multiprocessing import shared_memory
+            if len(_worker_blocks) >= PIPELINE_MAPPINGS:
+                _worker_blocks.pop(next(iter(_worker_blocks))).close()
+            memory = _worker_blocks[name] = shared_memory.SharedMemory(name)
+        data = bytes(memory.buf[offset:offset + length])
+    if mode == "line":
+        first = line_break.search(data)
+        if first is None:
+            return None
+        head_end = first.end()
+        tail_start = max(data.rfind(b"\r"), data.rfind(b"\n")) + 1
+        body = data[head_end:tail_start]
+    else:
+        first = data.find(delimiter)
+        if first < 0:
+            return None
+        head_end = first + len(delimiter)
+        last = data.rfind(delimiter)
+        tail_start = max(last + len(delimiter), head_end)
+        body = data[head_end:last] if last >= head_end else b""
+    lines, undecodable = clean_block(body, mode, delimiter) if body else ([], 0)
+    hits = []
+    if trigger_spec and lines:
+        engine = _worker_triggers.get(trigger_spec)
+        if engine is None:
+            _worker_triggers.clear()  # rules changed
+            engine = _worker_triggers[trigger_spec] = TriggerEngine(
+                [TriggerRule(pattern, regex, ignore_case) for pattern, regex, ignore_case in trigger_spec])
+        index = {id(rule): i for i, rule in enumerate(engine.rules)}
+        for n, line in enumerate(lines):
+            found = engine.candidates(line)
+            if found:
+                hits.append((n, [index[id(rule)] for rule in found]))
+    pairs = []
+    if telemetry_patterns and lines:
+        pairs = parse_telemetry([re.compile(p) for p in telemetry_patterns], "\n".join(lines))
+    return head_end, tail_start, lines, hits, pairs, undecodable
+
+
+class ReceivePipeline:
+    # The process pool shared by every port in pipeline mode, started on first use
+    def __init__(self, workers=PIPELINE_WORKERS):
+        self.workers = workers
+        self.executor = None
+        self.lock = threading.Lock()
+
+    def submit(self, job):
+        with self.lock:
+            if self.executor is None:
+                # spawn everywhere: forking a process that runs Tk and I/O threads is unsafe
+                self.executor = futures.ProcessPoolExecutor(
+                    self.workers, mp_context=multiprocessing.get_context("spawn"))
+            try:
+                return self.executor.submit(pipeline_block, job)
+            except futures.BrokenExecutor:
+                self.executor = None  # a worker died; start a fresh pool next time
+                raise
+
+    def stop(self):
+        with self.lock:
+            executor, self.executor = self.executor, None
+        if executor:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+rx_pipeline = ReceivePipeline()
+
+
+class PipelineFeed:
+    # One port's share of the pipeline. space/commit/add/flush run on the
+    # session's reader only; results come back on the pool's callback thread
+    # in any order and are applied by sequence number.
+    def __init__(self, session, pipeline=None):
+        from multiprocessing import shared_memory
+        self.session = session
+        self.pipeline = pipeline or rx_pipeline
+        self.memory = shared_memory.SharedMemory(create=True, size=PIPELINE_SLOTS * PIPELINE_BLOCK)
+        self.free = deque(range(1, PIPELINE_SLOTS))
+        self.slot = 0                # slot being filled, None while all are out
+        self.fill = 0
+        self.overflow = bytearray()  # block being filled while slot is None
+        self.scratch = bytearray(RX_READ_SIZE)
+        self.first_ns = None         # arrival of the oldest byte not handed off
+        self.last_ns = None
+        self.next_seq = 0
+        self.lock = threading.Lock()
+        self.ready = {}              # seq -> finished item waiting for its turn
+        self.next_apply = 0
+        self.applying = False
+        self.in_flight = 0
+        self.closed = False
+        self.released = False
+        self.blocks = 0
+        self.overflow_blocks = 0
+        self.errors = 0              # blocks the pool failed on, framed here instead
+
+    @property
+    def saturated(self):
+        # Every slot is out in the pool
+        return self.slot is None and not self.free
+
+    def due(self):
+        # When the data waiting in the current block must be handed off
+        return None if self.first_ns is None else self.first_ns / 1e9 + PIPELINE_LATENCY
+
+    def space(self):
+        # Where the next read goes
+        if self.slot is None and not self.overflow and self.free:
+            self.slot = self.free.popleft()
+            self.fill = 0
+        if self.slot is None:
+            return memoryview(self.scratch)
+        start = self.slot * PIPELINE_BLOCK
+        return self.memory.buf[start + self.fill:start + PIPELINE_BLOCK]
+
+    def commit(self, n, arrival_ns):
+        # After reading n bytes into space()
+        if self.slot is None:
+            self.overflow += memoryview(self.scratch)[:n]
+            size = len(self.overflow)
+        else:
+            self.fill += n
+            size = self.fill
+        if self.first_ns is None:
+            self.first_ns = arrival_ns
+        self.last_ns = arrival_ns
+        if size >= PIPELINE_MIN_BLOCK or (self.slot is not None and self.fill == PIPELINE_BLOCK):
+            self.flush()
+
+    def add(self, chunk, arrival_ns):
+        # Copies a chunk already read (thread mode) into the current block
+        view = memoryview(chunk)
+        while view:
+            space = self.space()
+            n = min(len(space), len(view))
+            space[:n] = view[:n]
+            space.release()
+            self.commit(n, arrival_ns)
+            view = view[n:]
+
+    def flush(self):
+        # Hand the block being filled to the pool
+        if self.slot is not None and self.fill:
+            slot, offset, length, data = self.slot, self.slot * PIPELINE_BLOCK, self.fill, None
+            self.slot = self.free.popleft() if self.free else None
+            self.fill = 0
+        elif self.slot is None and self.overflow:
+            slot, offset, length, data = None, 0, len(self.overflow), bytes(self.overflow)
+            self.overflow.clear()
+            self.overflow_blocks += 1
+        else:
+            return
+        self.first_ns = None
+        session = self.session
+        spec, active = session.triggers.spec if session.triggers else ((), [])
+        telemetry = session.telemetry
+        patterns = tuple(regex.pattern for regex in telemetry.patterns) if telemetry else ()
+        framer = session.framer
+        job = (self.memory.name, offset, length, data, framer.mode, framer.delimiter, spec, patterns)
+        block = (slot, offset, length, data, self.last_ns, active)
+        seq = self.next_seq
+        self.next_seq += 1
+        self.blocks += 1
+        with self.lock:
+            self.in_flight += 1
+        try:
+            future = self.pipeline.submit(job)
+        except Exception as e:
+            self._ready(seq, ("block", block, None, e))
+            return
+        future.add_done_callback(lambda f: self._done(seq, block, f))
+
+    def raw(self, chunk, arrival_ns):
+        # A read that doesn't go through the pool (hex/ANSI display, taps
+        # only) is still applied after the blocks read before it
+        self.flush()
+        seq = self.next_seq
+        self.next_seq += 1
+        self._ready(seq, ("raw", chunk, arrival_ns))
+
+    def _done(self, seq, block, future):
+        try:
+            result, error = future.result(), None
+        except Exception as e:
+            result, error = None, e
+        self._ready(seq, ("block", block, result, error))
+
+    def _ready(self, seq, item):
+        # Whichever thread finds the next item in sequence applies it and
+        # any that follow; the rest just leave theirs
+        with self.lock:
+            self.ready[seq] = item
+            if self.applying:
+                return
+            self.applying = True
+        while True:
+            with self.lock:
+                item = self.ready.pop(self.next_apply, None)
+                if item is None:
+                    self.applying = False
+                    return
+                self.next_apply += 1
+            if item[0] == "raw":
+                if not self.closed:
+                    self.session._rx_consume(item[1], item[2])
+                continue
+            try:
+                if not self.closed:
+                    self._apply(*item[1:])
+            finally:
+                slot = item[1][0]
+                if slot is not None:
+                    self.free.append(slot)
+                with self.lock:
+                    self.in_flight -= 1
+                    release = self.closed and not self.in_flight
+                if release:
+                    self._release()
+
+    def _apply(self, block, result, error):
+        slot, offset, length, data, arrival_ns, active = block
+        session = self.session
+        framer = session.framer
+        view = memoryview(data) if data is not None else self.memory.buf[offset:offset + length]
+        try:
+            if result is None:
+                # No terminator in the block, or the pool failed on it
+                if error is not None:
+                    self.errors += 1
+                session._rx_consume(bytes(view), arrival_ns)
+                return
+            head_end, tail_start, lines, hits, pairs, undecodable = result
+            head = session._clean_frames(framer.feed(view[:head_end]))
+            tail = session._clean_frames(framer.feed(view[tail_start:]))
+        finally:
+            view.release()
+        session.undecodable_bytes += undecodable
+        if head or tail:
+            lines = head + lines + tail
+        if session.triggers:
+            for i in range(len(head)):
+                lines[i] = session._trigger(lines[i])
+            for n, rules in hits:
+                i = len(head) + n
+                lines[i] = session._trigger(lines[i], [active[r] for r in rules])
+            for i in range(len(lines) - len(tail), len(lines)):
+                lines[i] = session._trigger(lines[i])
+        if not lines:
+            return
+        session.rx_lines += len(lines)
+        commands = session.correlator.on_lines(lines, arrival_ns)
+        for start in range(0, len(lines), PIPELINE_BATCH_LINES):
+            end = start + PIPELINE_BATCH_LINES
+            session.response_queue.put((LINE_BATCH, list(zip(commands[start:end], lines[start:end]))))
+        if session.telemetry:
+            session.telemetry.feed(head + tail, arrival_ns, pairs)
+
+    def close(self):
+        # The shared memory goes once no block is out in the pool
+        with self.lock:
+            self.closed = True
+            release = not self.in_flight
+        if release:
+            self._release()
+
+    def _release(self):
+        with self.lock:
+            if self.released:
+                return
+            self.released = True
+        try:
+            self.memory.unlink()
+        except FileNotFoundError:
+            pass
+        try:
+            self.memory.close()
+        except BufferError:
+            pass  # a view is still alive; the mapping goes with it
+
+
+# === Port probing ===
+# Every candidate port is probed on its own thread. On each port the baud
+# rates are tried in a fast sequence on the already open handle (most common
+# first), then parity variants of the best rates. Received data is scored by
+# how much of it is printable text with line endings; a wrong baud rate turns
+# it into framing garbage (NULs, 0xFF, high bytes).
+BAUD_RATES = [300, 1200, 2400, 4800, 9600, 19200, 38400, 57600, 115200,
+              230400, 460800, 921600, 1000000, 1500000, 2000000, 3000000]
+PROBE_BAUDS = [115200, 9600, 57600, 38400, 19200, 230400, 460800, 921600, 4800, 2400,
+               1200, 1000000, 1500000, 2000000, 3000000, 300]
+PROBE_PARITIES = ["None", "Even", "Odd"]
+PROBE_BUDGET = 10.0        # seconds for the whole scan
+PROBE_LISTEN = 0.25        # minimum seconds listened per setting
+PROBE_MIN_BYTES = 32       # less than this lowers the score
+PROBE_MAX_BYTES = 4096     # stop listening once this much arrived
+PROBE_READ_TIMEOUT = 0.05
+PROBE_GOOD_SCORE = 1.05    # clean text with line endings: stop trying rates
+PROBE_PARITY_CANDIDATES = 2  # best rates per port retried with parity
+TEXT_BYTES = bytes([9, 10, 13]) + bytes(range(32, 127))
+
+
+def score_probe(data, pattern=None):
+    # (score, matched): printable ratio, +0.1 for line endings, scaled down
+    # when little arrived, +1 when the expected response pattern is seen
+    if not data:
+        return 0.0, False
+    score = 1.0 - len(data.translate(None, TEXT_BYTES)) / len(data)
+    if b"\n" in data or b"\r" in data:
+        score += 0.1
+    score *= min(1.0, len(data) / PROBE_MIN_BYTES)
+    matched = bool(pattern and pattern.search(data.decode("latin-1")))
+    if matched:
+        score += 1.0
+    return round(score, 3), matched
+
+
+class ProbeResult:
+    __slots__ = ("port", "baudrate", "parity", "score", "matched", "received", "sample", "error")
+
+    def __init__(self, port, baudrate=None, parity="None", score=0.0, matched=False,
+                 received=0, sample="", error=None):
+        self.port = port
+        self.baudrate = baudrate
+        self.parity = parity
+        self.score = score
+        self.matched = matched
+        self.received = received
+        self.sample = sample
+        self.error = error
+
+
+class PortProber:
+    def __init__(self, ports, bauds=PROBE_BAUDS, parities=PROBE_PARITIES, budget=PROBE_BUDGET,
+                 stimulus=b"", pattern=None):
+        self.ports = list(ports)
+        self.bauds = list(bauds)
+        self.parities = list(parities)
+        self.budget = budget
+        self.stimulus = stimulus  # sent after each change, for devices that only answer
+        self.pattern = re.compile(pattern) if pattern else None
+        self.results = []
+        self.lock = threading.Lock()
+        self.stopping = threading.Event()
+        extra = PROBE_PARITY_CANDIDATES * (len(self.parities) - 1)
+        self.total = len(self.ports) * (len(self.bauds) + extra)
+        self.tried = 0
+        self.deadline = None
+
+    def run(self):
+        # Blocks until every port is done or the budget is spent
+        self.deadline = time.monotonic() + self.budget
+        threads = [threading.Thread(target=self.probe_port, args=(port,), name=f"probe-{port}", daemon=True)
+                   for port in self.ports]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return self.ranked()
+
+    def stop(self):
+        self.stopping.set()
+
+    def remaining(self):
+        return self.deadline - time.monotonic()
+
+    def probe_port(self, port):
+        try:
+            ser = serial.serial_for_url(port, baudrate=self.bauds[0], timeout=PROBE_READ_TIMEOUT)
+        except Exception as e:
+            self.add(ProbeResult(port, error=str(e)))
+            return
+        with ser:
+            found = []
+            for baud in self.bauds:
+                if self.stopping.is_set() or self.remaining() <= 0:
+                    return
+                result = self.try_setting(ser, port, baud, "None")
+                if result:
+                    found.append(result)
+                    if result.score >= PROBE_GOOD_SCORE:
+                        return
+            best = sorted((r for r in found if r.received), key=lambda r: r.score, reverse=True)
+            for result in best[:PROBE_PARITY_CANDIDATES]:
+                for parity in self.parities[1:]:
+                    if self.stopping.is_set() or self.remaining() <= 0:
+                        return
+                    self.try_setting(ser, port, result.baudrate, parity)
+
+    def try_setting(self, ser, port, baud, parity):
+        try:
+            ser.baudrate = baud
+            ser.parity = PARITIES[parity]
+            ser.reset_input_buffer()
+            if self.stimulus:
+                ser.write(self.stimulus)
+            # Slow rates need longer to deliver enough characters to judge
+            listen = min(max(PROBE_LISTEN, PROBE_MIN_BYTES * 10 / baud), self.remaining())
+            end = time.monotonic() + listen
+            data = bytearray()
+            while len(data) < PROBE_MAX_BYTES:
+                left = end - time.monotonic()
+                if left <= 0 or self.stopping.is_set():
+                    break
+                data += ser.read(ser.in_waiting or 1)
+        except Exception as e:
+            # Settings the driver cannot do are skipped, not fatal for the port
+            self.add(ProbeResult(port, baud, parity, error=str(e)))
+            return None
+        score, matched = score_probe(bytes(data), self.pattern)
+        sample = bytes(data[:48]).translate(PRINTABLE_ASCII).decode("ascii")
+        result = ProbeResult(port, baud, parity, score, matched, len(data), sample)
+        self.add(result)
+        return result
+
+    def add(self, result):
+        with self.lock:
+            self.results.append(result)
+            self.tried += 1
+
+    def ranked(self):
+        # Best first; failed settings last
+        with self.lock:
+            results = list(self.results)
+        return sorted(results, key=lambda r: (r.error is None, r.score, r.received), reverse=True)
+
+
+# === Instrumentation ===
+# Sessions keep plain counters; the GUI samples them (and its own event-loop
+# lag) once a second. The latest sample is what the stats panel shows and what
+# the local HTTP endpoint serves as JSON (/metrics.json) or Prometheus text
+# (/metrics), so a scraper never touches live app state.
+METRICS_HOST = "127.0.0.1"
+METRICS_PORT = int(os.environ.get("SERIAL_TERMINAL_METRICS_PORT", "0"))  # 0: start it from the Stats window
+DEFAULT_METRICS_PORT = 9108
+METRICS_INTERVAL_MS = 1000
+SESSION_COUNTERS = ("rx_bytes", "rx_reads", "rx_lines", "undecodable_bytes", "tx_bytes", "tx_writes")
+RATE_COUNTERS = ("rx_bytes", "rx_lines", "tx_bytes", "tx_writes")
+COUNTER_METRICS = SESSION_COUNTERS + ("reconnects", "pipeline_blocks", "pipeline_overflow_blocks")
+
+
+class MetricsSampler:
+    def __init__(self):
+        self.previous = {}  # session -> (time, counters) of the last sample
+        self.latest = {"timestamp": time.time(), "ports": {}, "app": {}}
+
+    def sample(self, sessions, app):
+        # sessions: (label, SerialSession) pairs; app: app-wide gauges
+        now = time.monotonic()
+        ports = {}
+        previous = {}
+        for label, session in sessions:
+            counters = {name: getattr(session, name) for name in SESSION_COUNTERS}
+            values = dict(counters)
+            values["response_queue"] = session.response_queue.qsize()
+            values["tx_queue"] = session.tx_depth()
+            values["oversized_frames"] = session.framer.oversized if session.framer else 0
+            feed = session.pipeline
+            if feed:
+                values["pipeline_blocks"] = feed.blocks
+                values["pipeline_in_flight"] = feed.in_flight
+                values["pipeline_overflow_blocks"] = feed.overflow_blocks
+            supervisor = session.supervisor
+            if supervisor:
+                values["reconnecting"] = int(session.reconnecting)
+                values["reconnects"] = supervisor.reconnects
+                if supervisor.last_recovery_s is not None:
+                    values["last_recovery_seconds"] = round(supervisor.last_recovery_s, 3)
+                    values["max_recovery_seconds"] = round(supervisor.recovery.max_ns / 1e9, 3)
+            last = self.previous.get(session)
+            for name in RATE_COUNTERS:
+                if last and now > last[0]:
+                    values[f"{name}_per_s"] = round((counters[name] - last[1][name]) / (now - last[0]), 1)
+                else:
+                    values[f"{name}_per_s"] = 0.0
+            previous[session] = (now, counters)
+            ports[label] = values
+        self.previous = previous
+        self.latest = {"timestamp": time.time(), "ports": ports, "app": app}
+        return self.latest
+
+    def prometheus(self):
+        sample = self.latest
+        out = []
+
+        def label(value):
+            return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+        names = sorted({name for values in sample["ports"].values() for name in values})
+        for name in names:
+            counter = name in COUNTER_METRICS
+            metric = f"serial_terminal_{name.replace('_per_s', '_per_second')}" + ("_total" if counter else "")
+            out.append(f"# TYPE {metric} {'counter' if counter else 'gauge'}")
+            for port, values in sample["ports"].items():
+                if name in values:
+                    out.append(f'{metric}{{port="{label(port)}"}} {values[name]}')
+        for name, value in sample["app"].items():
+            if value is None:
+                continue
+            metric = f"serial_terminal_{name}"
+            out.append(f"# TYPE {metric} gauge")
+            out.append(f"{metric} {value}")
+        return "\n".join(out) + "\n"
+
+
+class MetricsHandler:
+    # Mixed into http.server's BaseHTTPRequestHandler when the server starts
+    def do_GET(self):
+        sampler = self.server.sampler
+        path = self.path.split("?")[0]
+        if path == "/metrics":
+            body = sampler.prometheus().encode()
+            content_type = "text/plain; version=0.0.4"
+        elif path == "/metrics.json":
+            body = json.dumps(sampler.latest).encode()
+            content_type = "application/json"
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # keep scrapes out of stderr
+
+
+class MetricsServer:
+    def __init__(self, sampler, port=DEFAULT_METRICS_PORT, host=METRICS_HOST):
+        handler = type("MetricsHandler", (MetricsHandler, http_server.BaseHTTPRequestHandler), {})
+        self.httpd = http_server.ThreadingHTTPServer((host, port), handler)
+        self.httpd.daemon_threads = True
+        self.httpd.sampler = sampler
+        self.port = self.httpd.server_address[1]
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name="metrics-http", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        self.thread.join(timeout=2)
+
+
+# === Remote monitoring (telnet/raw TCP) ===
+# One asyncio loop thread serves any number of clients for a port. It listens
+# on this machine only and clients are read-only viewers unless the user picks
+# another address and turns writing on; even then only the client the user
+# hands the write lock to can write, until it leaves.
+IAC, DONT, DO, WONT, WILL, SB, SE = 255, 254, 253, 252, 251, 250, 240
+TELNET_ECHO, TELNET_SGA = 1, 3
+SERVER_HOST = "127.0.0.1"
+SERVER_HOSTS = ["127.0.0.1", "0.0.0.0"]  # offered in the GUI, any local address can be typed
+DEFAULT_SERVER_PORT = 2323
+CLIENT_QUEUE_BYTES = 256 * 1024   # per client, beyond this it skips ahead
+SCROLLBACK_BYTES = 64 * 1024
+SERVER_OVERFLOW = {"Skip ahead": "skip", "Disconnect": "drop"}
+
+
+class TelnetParser:
+    # Strips option negotiation from client input and answers it. We offer
+    # ECHO and SGA (character mode); anything else the client asks for is refused.
+    def __init__(self):
+        self.state = None
+        self.option_cmd = None
+
+    @staticmethod
+    def greeting():
+        return bytes([IAC, WILL, TELNET_ECHO, IAC, WILL, TELNET_SGA, IAC, DO, TELNET_SGA])
+
+    @staticmethod
+    def escape(data):
+        return data.replace(b"\xff", b"\xff\xff")
+
+    def feed(self, data):
+        out = bytearray()
+        replies = bytearray()
+        for b in data:
+            state = self.state
+            if state is None:
+                if b == IAC:
+                    self.state = "iac"
+                elif b == 0 and out[-1:] == b"\r":
+                    pass  # CR NUL is a bare CR
+                else:
+                    out.append(b)
+            elif state == "iac":
+                if b == IAC:
+                    out.append(b)
+                    self.state = None
+                elif b in (DO, DONT, WILL, WONT):
+                    self.option_cmd = b
+                    self.state = "option"
+                elif b == SB:
+                    self.state = "sb"
+                else:
+                    self.state = None  # NOP, AYT, ... ignored
+            elif state == "option":
+                cmd = self.option_cmd
+                if cmd == DO and b not in (TELNET_ECHO, TELNET_SGA):
+                    replies += bytes([IAC, WONT, b])
+                elif cmd == WILL and b != TELNET_SGA:
+                    replies += bytes([IAC, DONT, b])
+                self.state = None
+            elif state == "sb":
+                if b == IAC:
+                    self.state = "sb-iac"
+            elif state == "sb-iac":
+                self.state = None if b == SE else "sb"
+        return bytes(out), bytes(replies)
+
+
+class StreamClient:
+    __slots__ = ("writer", "name", "pending", "pending_bytes", "wake", "bytes_sent",
+                 "skipped_bytes", "skips", "skip_notice", "telnet", "closed")
+
+    def __init__(self, writer, name, telnet):
+        self.writer = writer
+        self.name = name
+        self.telnet = telnet
+        self.pending = deque()
+        self.pending_bytes = 0
+        self.wake = asyncio.Event()
+        self.bytes_sent = 0
+        self.skipped_bytes = 0
+        self.skips = 0
+        self.skip_notice = 0
+        self.closed = False
+
+
+class StreamServer:
+    # Streams the raw bytes of a SerialSession to TCP clients. The session
+    # feeds it through a tap, so sessions can be swapped (reconnect) without
+    # dropping clients.
+    def __init__(self, port=DEFAULT_SERVER_PORT, host=SERVER_HOST, telnet=True, allow_write=False,
+                 replay=True, overflow="skip", queue_bytes=CLIENT_QUEUE_BYTES):
+        self.host = host
+        self.port = port
+        self.telnet = telnet
+        self.allow_write = allow_write
+        self.replay = replay
+        self.overflow = overflow
+        self.queue_bytes = queue_bytes
+        self.name = f"{'telnet' if telnet else 'tcp'}:{host}:{port}"
+        self.session = None
+        self.clients = []
+        self.writer_client = None
+        self.scrollback = deque()
+        self.scrollback_bytes = 0
+        self.loop = None
+        self.server = None
+        self.thread = None
+        self.state = "starting"
+        self.error = None
+        self.accepted = 0
+        self.dropped_clients = 0
+        self.bytes_in = 0
+        self.bytes_up = 0
+
+    def start(self, session=None):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name=self.name, daemon=True)
+        self.thread.start()
+        try:
+            asyncio.run_coroutine_threadsafe(self._open(), self.loop).result(timeout=5)
+        except Exception:
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.thread.join(timeout=2)
+            self.loop.close()
+            raise
+        self.state = "ok"
+        if session:
+            self.attach(session)
+
+    async def _open(self):
+        self.server = await asyncio.start_server(self._serve, self.host, self.port)
+
+    def attach(self, session):
+        self.detach()
+        self.session = session
+        session.taps.append(self.feed)
+
+    def detach(self):
+        session, self.session = self.session, None
+        if session and self.feed in session.taps:
+            session.taps.remove(self.feed)
+
+    def feed(self, chunk):
+        # Called on the session's I/O thread
+        loop = self.loop
+        if loop and self.state == "ok":
+            loop.call_soon_threadsafe(self._broadcast, chunk)
+
+    def grant_write(self, client_name):
+        # From the GUI: give the write lock to the client called `client_name`
+        # (its "host:port"), or take it away with None
+        loop = self.loop
+        if loop and self.state == "ok":
+            loop.call_soon_threadsafe(self._grant_write, client_name)
+
+    def stop(self):
+        self.detach()
+        loop = self.loop
+        if not loop or self.state == "stopped":
+            return
+        self.state = "stopped"
+        try:
+            asyncio.run_coroutine_threadsafe(self._close(), loop).result(timeout=5)
+        except Exception:
+            pass
+        loop.call_soon_threadsafe(loop.stop)
+        self.thread.join(timeout=2)
+        loop.close()
+
+    async def _close(self):
+        self.server.close()
+        for client in list(self.clients):
+            self._drop(client)
+        await self.server.wait_closed()
+
+    # --- Loop thread ---
+    def _grant_write(self, client_name):
+        client = next((c for c in self.clients if c.name == client_name), None)
+        if client is None or not self.allow_write:
+            self.writer_client = None
+            return
+        self.writer_client = client
+        client.writer.write(b"\r\n[write lock granted]\r\n")
+
+    def _broadcast(self, chunk):
+        self.bytes_in += len(chunk)
+        self.scrollback.append(chunk)
+        self.scrollback_bytes += len(chunk)
+        while self.scrollback_bytes > SCROLLBACK_BYTES and len(self.scrollback) > 1:
+            self.scrollback_bytes -= len(self.scrollback.popleft())
+        for client in self.clients:
+            self._queue(client, chunk)
+
+    def _queue(self, client, chunk):
+        if client.pending_bytes + len(chunk) > self.queue_bytes:
+            if self.overflow == "drop":
+                self._drop(client)
+                self.dropped_clients += 1
+                return
+            # Skip ahead: discard the backlog and tell the client how much it missed
+            client.skipped_bytes += client.pending_bytes
+            client.skip_notice += client.pending_bytes
+            client.skips += 1
+            client.pending.clear()
+            client.pending_bytes = 0
+        client.pending.append(chunk)
+        client.pending_bytes += len(chunk)
+        client.wake.set()
+
+    def _drop(self, client):
+        if client.closed:
+            return
+        client.closed = True
+        client.wake.set()
+        client.writer.close()
+        if client in self.clients:
+            self.clients.remove(client)
+        if self.writer_client is client:
+            self.writer_client = None
+
+    async def _serve(self, reader, writer):
+        peer = writer.get_extra_info("peername") or ("?", 0)
+        sock = writer.get_extra_info("socket")
+        if sock is not None:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        # Keep the kernel/transport buffer small so backlog lands in our bounded queue
+        writer.transport.set_write_buffer_limits(high=64 * 1024)
+        client = StreamClient(writer, f"{peer[0]}:{peer[1]}", self.telnet)
+        self.accepted += 1
+        if self.telnet:
+            writer.write(TelnetParser.greeting())
+        if self.replay and self.scrollback:
+            self._queue(client, b"".join(self.scrollback))
+        self.clients.append(client)
+        sender = asyncio.ensure_future(self._send(client))
+        try:
+            await self._receive(client, reader)
+        finally:
+            self._drop(client)
+            await sender
+
+    async def _send(self, client):
+        writer = client.writer
+        try:
+            while not client.closed:
+                await client.wake.wait()
+                client.wake.clear()
+                if client.closed:
+                    break
+                data = b"".join(client.pending)
+                client.pending.clear()
+                client.pending_bytes = 0
+                if client.skip_notice:
+                    data = f"\r\n[... skipped {client.skip_notice} bytes]\r\n".encode() + data
+                    client.skip_notice = 0
+                if client.telnet:
+                    data = TelnetParser.escape(data)
+                writer.write(data)
+                client.bytes_sent += len(data)
+                await writer.drain()
+        except (ConnectionError, OSError):
+            self._drop(client)
+
+    async def _receive(self, client, reader):
+        parser = TelnetParser() if client.telnet else None
+        while True:
+            try:
+                data = await reader.read(4096)
+            except (ConnectionError, OSError):
+                return
+            if not data:
+                return
+            if parser:
+                data, replies = parser.feed(data)
+                if replies:
+                    client.writer.write(replies)
+                if not data:
+                    continue
+            self._input(client, data)
+
+    def _input(self, client, data):
+        if self.writer_client is not client:
+            client.writer.write(b"\r\n[read-only]\r\n")
+            return
+        session = self.session
+        if session is None or not (session.is_open or session.reconnecting):
+            return
+        try:
+            session.transmit(data, block=False)
+            self.bytes_up += len(data)
+        except RuntimeError:
+            pass
+
+    def stats(self):
+        # Snapshot from the GUI thread; the lists are only mutated on the loop thread
+        rows = [{
+            "name": self.name,
+            "state": self.state if not self.error else f"error: {self.error}",
+            "bytes": self.bytes_in,
+            "buffered": 0,
+            "drops": self.dropped_clients,
+            "dropped_bytes": 0,
+            "clients": len(self.clients),
+        }]
+        writer_client = self.writer_client
+        for client in list(self.clients):
+            rows.append({
+                "name": f"{self.name} {client.name}",
+                "client": client.name,
+                "state": "writer" if client is writer_client else "viewer",
+                "bytes": client.bytes_sent,
+                "buffered": client.pending_bytes,
+                "drops": client.skips,
+                "dropped_bytes": client.skipped_bytes,
+            })
+        return rows
+
+
+# === Routing ===
+# In-process replacement for hub4com/com2tcp: the source port is read once and
+# every chunk is fanned out to any number of serial ports and files; TCP
+# clients are served by a StreamServer tapping the same source.
+ROUTE_POLICIES = ["drop-oldest", "block", "disconnect"]
+DEFAULT_ROUTE_POLICY = "drop-oldest"
+ROUTE_BUFFER_BYTES = 1024 * 1024   # per destination
+ROUTE_FOLDER = app_folder / "routes"
+
+
+class RouteSink(ABC):
+    # One destination with its own bounded buffer and sender thread, so a slow
+    # sink only delays itself. When the buffer is full the policy decides:
+    #   "drop-oldest" - discard the oldest buffered data and count the drop
+    #   "block"       - hold up the source until there is room (backpressure).
+    #                   A source on the shared IOCore has its reads paused
+    #                   instead, so other ports keep being serviced.
+    #   "disconnect"  - close this destination
+    def __init__(self, name, policy=DEFAULT_ROUTE_POLICY, max_bytes=ROUTE_BUFFER_BYTES):
+        self.name = name
+        self.policy = policy
+        self.max_bytes = max_bytes
+        self.buffer = deque()
+        self.buffered = 0
+        self.cond = threading.Condition()
+        self.running = False
+        self.thread = None
+        self.router = None
+        self.bytes_sent = 0
+        self.drops = 0
+        self.dropped_bytes = 0
+        self.state = "starting"
+        self.error = None
+
+    def start(self, router):
+        self.router = router
+        self.open()
+        self.running = True
+        self.state = "ok"
+        self.thread = threading.Thread(target=self.run, name=f"route-{self.name}", daemon=True)
+        self.thread.start()
+
+    def offer(self, chunk):
+        with self.cond:
+            if not self.running:
+                return
+            if self.buffered + len(chunk) > self.max_bytes:
+                if self.policy == "block" and self.router and self.router.source.fd is not None:
+                    # Keep this chunk (the buffer runs over by one read at
+                    # most) and stop reading the source until run() drains it
+                    if self.state != "blocked":
+                        self.state = "blocked"
+                        self.router.source.hold_rx(self, True)
+                elif self.policy == "block":
+                    self.state = "blocked"
+                    while self.running and self.buffered and self.buffered + len(chunk) > self.max_bytes:
+                        self.cond.wait(0.5)
+                    if not self.running:
+                        return
+                    self.state = "ok"
+                elif self.policy == "drop-oldest":
+                    while self.buffer and self.buffered + len(chunk) > self.max_bytes:
+                        old = self.buffer.popleft()
+                        self.buffered -= len(old)
+                        self.dropped_bytes += len(old)
+                        self.drops += 1
+                else:
+                    self.state = "disconnected"
+                    self.running = False
+                    self.cond.notify_all()
+                    return
+            self.buffer.append(chunk)
+            self.buffered += len(chunk)
+            self.cond.notify_all()
+
+    def run(self):
+        while True:
+            with self.cond:
+                while self.running and not self.buffer:
+                    self.cond.wait(0.5)
+                if not self.running:
+                    break
+                data = b"".join(self.buffer)
+                self.buffer.clear()
+                self.buffered = 0
+                self.cond.notify_all()
+                self._release()
+            try:
+                self.send(data)
+                self.bytes_sent += len(data)
+            except Exception as e:
+                self.state = "error"
+                self.error = e
+                self.running = False
+                break
+        with self.cond:
+            self._release()
+        self.close()
+        if self.router:
+            self.router.sink_closed(self)
+
+    def _release(self):
+        # Resume a source paused by this sink (called holding cond)
+        source = self.router.source if self.router else None
+        if source is not None and self in source.rx_holds:
+            source.hold_rx(self, False)
+            if self.state == "blocked":
+                self.state = "ok"
+
+    def stop(self):
+        with self.cond:
+            self.running = False
+            self.cond.notify_all()
+            self._release()
+        if self.thread and self.thread is not threading.current_thread():
+            self.thread.join(timeout=2)
+        self.close()
+
+    def stats(self):
+        return {
+            "name": self.name,
+            "state": self.state if not self.error else f"error: {self.error}",
+            "bytes": self.bytes_sent,
+            "buffered": self.buffered,
+            "drops": self.drops,
+            "dropped_bytes": self.dropped_bytes,
+        }
+
+    # Hooks for destination types
+    def open(self):
+        pass
+
+    @abstractmethod
+    def send(self, data):
+        ...
+
+    def close(self):
+        pass
+
+
+class SerialRouteSink(RouteSink):
+    def __init__(self, port, baudrate, bidirectional=False, **kwargs):
+        super().__init__(port, **kwargs)
+        self.port = port
+        self.baudrate = baudrate
+        self.bidirectional = bidirectional
+        self.ser = None
+
+    def open(self):
+        self.ser = serial.serial_for_url(self.port, baudrate=self.baudrate, timeout=0.5, write_timeout=TIMEOUT)
+        if self.bidirectional:
+            threading.Thread(target=self.read_back, name=f"route-rx-{self.port}", daemon=True).start()
+
+    def read_back(self):
+        ser = self.ser
+        while self.running or self.state == "starting":
+            try:
+                data = ser.read(ser.in_waiting or 1)
+            except Exception:
+                break
+            if data:
+                self.router.upstream(data)
+
+    def send(self, data):
+        self.ser.write(data)
+
+    def close(self):
+        ser, self.ser = self.ser, None
+        if ser:
+            ser.close()
+
+
+class FileRouteSink(RouteSink):
+    def __init__(self, path, **kwargs):
+        super().__init__(f"file:{Path(path).name}", **kwargs)
+        self.path = Path(path)
+        self.file = None
+
+    def open(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.file = open(self.path, "ab", buffering=1024 * 1024)
+
+    def send(self, data):
+        self.file.write(data)
+
+    def close(self):
+        f, self.file = self.file, None
+        if f:
+            f.close()
+
+
+class Router:
+    # Fans every chunk read from `source` (a SerialSession) out to the sinks.
+    # With bidirectional set, data arriving from destinations is written back
+    # to the source port.
+    def __init__(self, source, owns_source=False, bidirectional=False):
+        self.source = source
+        self.owns_source = owns_source
+        self.bidirectional = bidirectional
+        self.lock = threading.Lock()
+        self.sinks = []
+        self.listeners = []
+        self.closed_sinks = []
+        self.bytes_in = 0
+        self.bytes_up = 0
+        self.upstream_drops = 0
+        self.running = False
+
+    def add_sink(self, sink):
+        try:
+            sink.start(self)
+        except Exception as e:
+            sink.state = "error"
+            sink.error = e
+            with self.lock:
+                self.closed_sinks.append(sink)
+            return
+        with self.lock:
+            self.sinks = self.sinks + [sink]
+
+    def add_listener(self, listener):
+        listener.start(self.source)
+        self.listeners.append(listener)
+
+    def sink_closed(self, sink):
+        with self.lock:
+            if sink in self.sinks:
+                self.sinks = [s for s in self.sinks if s is not sink]
+                self.closed_sinks.append(sink)
+                del self.closed_sinks[:-20]  # keep the last few for the stats view
+
+    def start(self):
+        self.running = True
+        self.source.taps.append(self.fan_out)
+
+    def fan_out(self, chunk):
+        # Runs on the source's read thread. self.sinks is replaced, never
+        # changed in place, so a sink closing meanwhile can't make this skip one
+        self.bytes_in += len(chunk)
+        for sink in self.sinks:
+            sink.offer(chunk)
+
+    def upstream(self, data):
+        if not (self.running and self.bidirectional):
+            return
+        try:
+            self.source.transmit(data, block=False)
+            self.bytes_up += len(data)
+        except RuntimeError:
+            self.upstream_drops += 1
+
+    def stop(self):
+        self.running = False
+        if self.fan_out in self.source.taps:
+            self.source.taps.remove(self.fan_out)
+        for listener in self.listeners:
+            listener.stop()
+        with self.lock:
+            sinks, self.sinks = self.sinks, []
+        for sink in sinks:
+            sink.stop()
+        if self.owns_source:
+            self.source.close()
+
+    def health(self):
+        # "ok", "degraded" (some route dropping or down) or "failed" (source gone)
+        if not self.running or not self.source.running:
+            return "failed"
+        with self.lock:
+            sinks = list(self.sinks)
+            closed = list(self.closed_sinks)
+        if not sinks and not self.listeners:
+            return "failed"
+        if closed or any(s.state != "ok" or s.drops for s in sinks) or any(l.state != "ok" for l in self.listeners):
+            return "degraded"
+        return "ok"
+
+    def stats(self):
+        with self.lock:
+            rows = [s.stats() for s in self.sinks]
+            rows += [dict(s.stats(), state=s.stats()["state"] + " (closed)") for s in self.closed_sinks]
+        rows += [l.stats() for l in self.listeners]
+        return rows
+
+
+class PagedView:
+    # Text widget showing one page of a list too large to insert: rows are
+    # fetched on demand and the scrollbar is driven by hand
+    def __init__(self, parent, font, fetch, page=30, width=110):
+        self.fetch = fetch      # fetch(top, count) -> [(prefix, text), ...]
+        self.page = page
+        self.total = 0
+        self.top = 0
+        self.regex = None       # highlighted in the text part of each row
+        self.on_scroll = None   # called when the user scrolls
+        self.frame = ttk.Frame(parent)
+        self.text = tk.Text(self.frame, height=page, width=width, font=font, wrap=tk.NONE, state='disabled')
+        self.text.tag_configure("match", background="yellow")
+        self.scrollbar = ttk.Scrollbar(self.frame, orient=tk.VERTICAL, command=self.scroll)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.text.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        for sequence in ("<MouseWheel>", "<Button-4>", "<Button-5>"):
+            self.text.bind(sequence, self.wheel)
+
+    def render(self, total=None):
+        if total is not None:
+            self.total = total
+        total, page = self.total, self.page
+        top = self.top = max(0, min(self.top, total - page))
+        rows = self.fetch(top, min(page, total - top)) if total else []
+        text = self.text
+        text.configure(state='normal')
+        text.delete("1.0", tk.END)
+        for row, (prefix, line) in enumerate(rows, start=1):
+            text.insert(tk.END, prefix + line + "\n")
+            if self.regex:
+                for m in self.regex.finditer(line):
+                    text.tag_add("match", f"{row}.{len(prefix) + m.start()}", f"{row}.{len(prefix) + m.end()}")
+        text.configure(state='disabled')
+        if total:
+            self.scrollbar.set(top / total, (top + page) / total)
+        else:
+            self.scrollbar.set(0, 1)
+
+    def go_to(self, n):
+        self.top = n
+        self.render()
+
+    def scroll(self, *args):
+        if args[0] == "moveto":
+            self.top = int(float(args[1]) * self.total)
+        else:
+            self.top += int(args[1]) * (self.page if args[2] == "pages" else 1)
+        if self.on_scroll:
+            self.on_scroll()
+        self.render()
+
+    def wheel(self, event):
+        step = -3 if getattr(event, "num", 0) == 4 or getattr(event, "delta", 0) > 0 else 3
+        self.scroll("scroll", step, "units")
+        return "break"
+
+    def row_at(self, event):
+        # List position of the row under the mouse, or None
+        n = self.top + int(self.text.index(f"@{event.x},{event.y}").split(".")[0]) - 1
+        return n if n < self.total else None
+
+
+class SessionTab:
+    # GUI state of one port: its output widget, queues, correlator and session
+    def __init__(self, notebook, font):
+        self.frame = ttk.Frame(notebook)
+        self.output_text = scrolledtext.ScrolledText(self.frame, height=20, width=20, state='disabled', font=font)
+        self.output_text.pack(fill=tk.BOTH, expand=True)
+        self.output_text.tag_configure("match", background="yellow")
+        self.output_text.tag_configure("found", background="orange")
+        self.font = font
+        self.ansi_tags = set()      # ANSI style tags configured on output_text
+        self.partial_shown = False  # last widget line is an unfinished ANSI line
+        self.trigger_events = Queue()  # (rule, line) from the I/O thread
+        self.port_events = Queue()     # (kind, text) from the I/O and supervisor threads
+        self.send_events = Queue()     # (kind, text) from the file sender and scheduler threads
+        self.response_queue = Queue()
+        self.correlator = CommandCorrelator()
+        self.session = None
+        self.replayer = None
+        self.virtual_port_close = None
+        self.batch = None
+        self.server = None  # StreamServer for remote viewers, survives reconnects
+        self.device_id = None  # USB (vid, pid, serial) of the port, to find it again
+        self.telemetry = None  # Telemetry, once extraction is turned on
+        self.index = LineIndex()  # every line shown, for search
+        self.widget_first = 0     # index line shown on the widget's first line
+        self.highlight = None     # regex highlighted in new output
+        self.settings = {
+            "port": DEFAULT_PORT,
+            "baud": str(DEFAULT_BAUDRATE),
+            "parity": "None",
+            "framing": DEFAULT_FRAMING,
+            "display": DEFAULT_DISPLAY,
+        }
+
+    @property
+    def connected(self):
+        # Still connected while a supervisor is reopening the port
+        return self.session is not None and (self.session.is_open or self.session.reconnecting)
+
+    @property
+    def title(self):
+        return self.session.port if self.session else "Not connected"
+
+
+class SerialTerminal:
+    def __init__(self, root, profile=None):
+        self.root = root
+        self.profile = profile or StartupProfile()
+        self.root.title("Serial Terminal")
+        self.tabs = []
+        self.capture = None
+        self.tick_ms = MIN_TICK_MS
+        self.tick_due = None          # when process_queue should next run
+        self.ui_lag = LatencyHistogram()  # how late it ran, per sample interval
+        self.metrics = MetricsSampler()
+        self.metrics_server = None
+        self.triggers = TriggerEngine()
+        self.setup_gui()
+        self.profile.mark("build window")
+        self.root.protocol("WM_DELETE_WINDOW", self.on_closing)
+        self.scheduler = PeriodicScheduler(self.scheduled_send)
+        self.scheduler.start()
+        self.loaded_commands = False
+        self.load_saved_commands()
+        self.loaded_commands = True
+        self.load_trigger_rules()
+        self.profile.mark("load settings")
+        # Ports fill in when the first background scan reports
+        self.port_monitor = PortMonitor()
+        self.port_monitor.start()
+        self.profile.mark("start monitor")
+        self.router = None
+        self.root.after(self.tick_ms, self.process_queue)
+        self.root.after(METRICS_INTERVAL_MS, self.sample_metrics)
+        if METRICS_PORT:
+            self.start_metrics_server(METRICS_PORT)
+        self.root.after_idle(self.startup_finished)
+
+    def startup_finished(self):
+        self.profile.mark("first draw")
+        self.profile.report()
+
+##        self.auto_save_commands()
+
+    def on_closing(self):
+        for tab in self.tabs:
+            if tab.replayer:
+                tab.replayer.stop()
+            if tab.batch:
+                tab.batch.abort()
+            if tab.session:
+                tab.session.close()  # Stop reader/writer
+            if tab.server:
+                tab.server.stop()
+            tab.index.close()
+        self.stop_routing()
+        self.stop_metrics_server()
+        rx_pipeline.stop()
+        self.port_monitor.stop()
+        self.scheduler.stop()
+        self.save_saved_commands()
+        self.save_trigger_rules()
+        self.stop_capture()
+        if log_writer:
+            log_writer.stop()
+        self.root.destroy()
+
+
+    def setup_gui(self):
+        # Use a frame to hold left and right side
+        main_frame = ttk.Frame(self.root)
+        main_frame.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+
+        # Left frame: config + output + input
+        left_frame = ttk.Frame(main_frame)
+        left_frame.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+
+        # Config Frame
+        config_frame = ttk.Frame(left_frame)
+        config_frame.pack(padx=5, pady=5, fill=tk.X)
+
+        ttk.Label(config_frame, text="Port:").pack(side=tk.LEFT)
+        self.port_var = tk.StringVar(value=DEFAULT_PORT)
+        self.port_menu = ttk.Combobox(config_frame, textvariable=self.port_var, state="normal",width=8)
+        self.port_menu.pack(side=tk.LEFT, padx=5)
+        self.port_menu.bind("<Double-Button-1>", self.scan_ports)
+        self.port_menu.bind("<<ComboboxSelected>>", self.port_selected)
+
+        ttk.Button(config_frame, text="Scan Ports", command=self.scan_ports).pack(side=tk.LEFT, padx=5)
+        ttk.Button(config_frame, text="Probe", command=self.show_probe).pack(side=tk.LEFT, padx=5)
+
+        ttk.Label(config_frame, text="Baud Rate:").pack(side=tk.LEFT,padx=3)
+        self.baud_var = tk.StringVar(value=str(DEFAULT_BAUDRATE))
+        self.baud_menu = ttk.Combobox(
+            config_frame, textvariable=self.baud_var, state="readonly",
+            values=[str(b) for b in BAUD_RATES],
+            width=8
+        )
+        self.baud_menu.pack(side=tk.LEFT, padx=5)
+
+        ttk.Label(config_frame, text="Parity:").pack(side=tk.LEFT)
+        self.parity_var = tk.StringVar(value="None")
+        self.parity_menu = ttk.Combobox(
+            config_frame, textvariable=self.parity_var, state="readonly",
+            values=["None", "Even", "Odd", "Mark", "Space"],
+            width=8
+        )
+        self.parity_menu.pack(side=tk.LEFT, padx=5)
+
+        ttk.Label(config_frame, text="Framing:").pack(side=tk.LEFT)
+        self.framing_var = tk.StringVar(value=DEFAULT_FRAMING)
+        self.framing_menu = ttk.Combobox(
+            config_frame, textvariable=self.framing_var, state="readonly",
+            values=list(FRAMING_MODES), width=10
+        )
+        self.framing_menu.pack(side=tk.LEFT, padx=5)
+
+        ttk.Label(config_frame, text="Display:").pack(side=tk.LEFT)
+        self.display_var = tk.StringVar(value=DEFAULT_DISPLAY)
+        display_menu = ttk.Combobox(
+            config_frame, textvariable=self.display_var, state="readonly",
+            values=list(DISPLAY_MODES), width=9
+        )
+        display_menu.pack(side=tk.LEFT, padx=5)
+        display_menu.bind("<<ComboboxSelected>>", self.display_changed)
+
+        self.connect_button = ttk.Button(config_frame, text="Connect", command=self.toggle_connect)
+        self.connect_button.pack(side=tk.LEFT, padx=5)
+        ttk.Button(config_frame, text="Port Settings", command=self.show_port_settings).pack(side=tk.LEFT, padx=5)
+        ttk.Button(config_frame, text="New Tab", command=self.new_tab).pack(side=tk.LEFT, padx=5)
+        ttk.Button(config_frame, text="Close Tab", command=self.close_tab).pack(side=tk.LEFT, padx=5)
+        self.tx_depth_var = tk.StringVar(value="TX: 0")
+        ttk.Label(config_frame, textvariable=self.tx_depth_var, width=8).pack(side=tk.LEFT, padx=5)
+
+        # Set smaller font about 85% of default for output text and saved commands
+        default_font = tkfont.nametofont("TkTextFont")
+        smaller_font = (default_font.actual("family"), max(10, int(default_font.actual("size") * 0.85)))
+
+        # One tab per port session
+        self.output_font = smaller_font
+        self.notebook = ttk.Notebook(left_frame)
+        self.notebook.pack(padx=5, pady=5, fill=tk.BOTH, expand=True)
+        self.notebook.bind("<<NotebookTabChanged>>", self.tab_changed)
+        self.new_tab()
+
+        input_frame = ttk.Frame(left_frame)
+        input_frame.pack(padx=5, pady=5, fill=tk.X)
+        self.command_var = tk.StringVar()
+        self.command_entry = ttk.Entry(input_frame, width=20, textvariable=self.command_var)
+        self.command_entry.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=5)
+        self.command_entry.bind("<Return>", self.send_command)
+        self.hex_send_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(input_frame, text="Hex", variable=self.hex_send_var).pack(side=tk.LEFT)
+        ttk.Button(input_frame, text="Send", command=self.send_command).pack(side=tk.LEFT, padx=5)
+        ttk.Button(input_frame, text="Clear Output", command=self.clear_output).pack(side=tk.LEFT, padx=5)
+        ttk.Button(input_frame, text="Save Log", command=self.save_log).pack(side=tk.LEFT, padx=5)
+        ttk.Button(input_frame, text="Open Log", command=self.open_log_viewer).pack(side=tk.LEFT, padx=5)
+        self.send_file_button = ttk.Button(input_frame, text="Send File", command=self.send_commands_from_file)
+        self.send_file_button.pack(side=tk.LEFT, padx=5)
+        self.capture_button = ttk.Button(input_frame, text="Start Capture", command=self.toggle_capture)
+        self.capture_button.pack(side=tk.LEFT, padx=5)
+        ttk.Button(input_frame, text="Capture to Text", command=self.export_capture_text).pack(side=tk.LEFT, padx=5)
+        self.replay_button = ttk.Button(input_frame, text="Replay", command=self.toggle_replay)
+        self.replay_button.pack(side=tk.LEFT, padx=5)
+        self.replay_speed_var = tk.StringVar(value=DEFAULT_REPLAY_SPEED)
+        ttk.Combobox(
+            input_frame, textvariable=self.replay_speed_var, state="readonly",
+            values=list(REPLAY_SPEEDS), width=5
+        ).pack(side=tk.LEFT, padx=5)
+        ttk.Button(input_frame, text="Latency", command=self.show_latency_stats).pack(side=tk.LEFT, padx=5)
+        ttk.Button(input_frame, text="Remote", command=self.show_remote_server).pack(side=tk.LEFT, padx=5)
+        ttk.Button(input_frame, text="Search", command=self.show_search).pack(side=tk.LEFT, padx=5)
+        ttk.Button(input_frame, text="Stats", command=self.show_stats).pack(side=tk.LEFT, padx=5)
+        ttk.Button(input_frame, text="Triggers", command=self.show_triggers).pack(side=tk.LEFT, padx=5)
+        ttk.Button(input_frame, text="Telemetry", command=self.show_telemetry).pack(side=tk.LEFT, padx=5)
+        self.text_log_var = tk.BooleanVar(value=True)
+        ttk.Checkbutton(input_frame, text="Text Log", variable=self.text_log_var).pack(side=tk.LEFT, padx=5)
+
+        # Right frame: saved commands buttons and entries
+        self.saved_cmd_frame = ttk.Frame(main_frame)
+        self.saved_cmd_frame.pack(side=tk.RIGHT, fill=tk.Y, padx=5, pady=5)
+
+        self.saved_commands = []  # command library, any number of entries
+        self.library_var = tk.StringVar()
+
+        smaller_font_entry = (default_font.actual("family"), max(9, int(default_font.actual("size") * 0.85)))
+
+        ttk.Label(self.saved_cmd_frame, text="Saved Commands:").grid(row=0, column=0, pady=(0,5))
+
+        library_frame = ttk.Frame(self.saved_cmd_frame)
+        library_frame.grid(row=1, column=0, columnspan=2, rowspan=8, sticky="nsew", padx=5)
+        self.library_list = tk.Listbox(library_frame, height=12, width=32, font=smaller_font_entry, exportselection=False)
+        library_scroll = ttk.Scrollbar(library_frame, orient=tk.VERTICAL, command=self.library_list.yview)
+        self.library_list.configure(yscrollcommand=library_scroll.set)
+        self.library_list.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        library_scroll.pack(side=tk.RIGHT, fill=tk.Y)
+        self.library_list.bind("<<ListboxSelect>>", self.library_selected)
+        self.library_list.bind("<Double-Button-1>", lambda e: self.send_saved_command(self.library_index()))
+
+        entry = ttk.Entry(self.saved_cmd_frame, textvariable=self.library_var, width=25, font=smaller_font_entry)
+        entry.grid(row=9, column=0, padx=5, pady=2)
+        entry.bind("<Return>", lambda e: self.add_saved_command())
+        ttk.Button(self.saved_cmd_frame, text="Send", width=8,
+                   command=lambda: self.send_saved_command(self.library_index())).grid(row=9, column=1, padx=5, pady=2)
+        library_buttons = ttk.Frame(self.saved_cmd_frame)
+        library_buttons.grid(row=10, column=0, columnspan=2, sticky=tk.W, padx=5)
+        ttk.Button(library_buttons, text="Add", width=7, command=self.add_saved_command).pack(side=tk.LEFT)
+        ttk.Button(library_buttons, text="Update", width=7, command=self.update_saved_command).pack(side=tk.LEFT, padx=2)
+        ttk.Button(library_buttons, text="Delete", width=7, command=self.delete_saved_command).pack(side=tk.LEFT, padx=2)
+        ttk.Button(library_buttons, text="Schedule", width=9, command=self.show_scheduler).pack(side=tk.LEFT, padx=2)
+        
+        # Port routing (in-process fan-out)
+        ttk.Label(self.saved_cmd_frame, text="Routing:").grid(row=12, column=0, columnspan=1, pady=(1, 2))
+
+        self.com_source = tk.StringVar()
+        self.com_dest1 = tk.StringVar()
+        self.com_dest2 = tk.StringVar()
+        self.route_tcp_var = tk.StringVar(value="")
+        self.route_host_var = tk.StringVar(value=SERVER_HOST)
+        self.route_tcp_write_var = tk.BooleanVar(value=False)
+        self.route_policy_var = tk.StringVar(value=DEFAULT_ROUTE_POLICY)
+        self.route_bidir_var = tk.BooleanVar(value=True)
+        self.route_file_var = tk.BooleanVar(value=False)
+
+        ttk.Label(self.saved_cmd_frame, text="Source:").grid(row=13, column=0, sticky=tk.W)
+        self.source_menu = ttk.Combobox(self.saved_cmd_frame, textvariable=self.com_source, width=10, state="readonly")
+        self.source_menu.grid(row=13, column=1)
+
+        ttk.Label(self.saved_cmd_frame, text="Dest 1:").grid(row=14, column=0, sticky=tk.W)
+        self.dest1_menu = ttk.Combobox(self.saved_cmd_frame, textvariable=self.com_dest1, width=10, state="readonly")
+        self.dest1_menu.grid(row=14, column=1)
+
+        ttk.Label(self.saved_cmd_frame, text="Dest 2:").grid(row=15, column=0, sticky=tk.W)
+        self.dest2_menu = ttk.Combobox(self.saved_cmd_frame, textvariable=self.com_dest2, width=10, state="readonly")
+        self.dest2_menu.grid(row=15, column=1)
+
+        ttk.Label(self.saved_cmd_frame, text="TCP port (Telnet):").grid(row=16, column=0, sticky=tk.W)
+        ttk.Entry(self.saved_cmd_frame, textvariable=self.route_tcp_var, width=12).grid(row=16, column=1)
+
+        ttk.Label(self.saved_cmd_frame, text="Listen on:").grid(row=17, column=0, sticky=tk.W)
+        ttk.Combobox(self.saved_cmd_frame, textvariable=self.route_host_var, values=SERVER_HOSTS, width=10).grid(row=17, column=1)
+
+        ttk.Label(self.saved_cmd_frame, text="When full:").grid(row=18, column=0, sticky=tk.W)
+        ttk.Combobox(self.saved_cmd_frame, textvariable=self.route_policy_var, values=ROUTE_POLICIES,
+                     width=10, state="readonly").grid(row=18, column=1)
+
+        ttk.Checkbutton(self.saved_cmd_frame, text="Bidirectional", variable=self.route_bidir_var).grid(row=19, column=0, sticky=tk.W)
+        ttk.Checkbutton(self.saved_cmd_frame, text="Copy to file", variable=self.route_file_var).grid(row=19, column=1, sticky=tk.W)
+        ttk.Checkbutton(self.saved_cmd_frame, text="TCP clients may write", variable=self.route_tcp_write_var).grid(row=20, column=0, columnspan=2, sticky=tk.W)
+
+        ttk.Button(self.saved_cmd_frame, text="Start Routing", command=self.start_routing).grid(row=21, column=0, pady=(5, 0), sticky="w")
+        ttk.Button(self.saved_cmd_frame, text="Stop Routing", command=self.stop_routing).grid(row=21, column=1, pady=(2, 0), sticky="e")
+        ttk.Button(self.saved_cmd_frame, text="Route Stats", command=self.show_route_stats).grid(row=22, column=0, pady=(2, 0), sticky="w")
+
+        # Send File settings
+        self.batch_mode_var = tk.StringVar(value=DEFAULT_BATCH_MODE)
+        self.batch_window_var = tk.StringVar(value=str(DEFAULT_BATCH_WINDOW))
+        self.batch_interval_var = tk.StringVar(value=str(DEFAULT_BATCH_INTERVAL))
+        self.batch_timeout_var = tk.StringVar(value=str(DEFAULT_STEP_TIMEOUT))
+        self.batch_retries_var = tk.StringVar(value=str(DEFAULT_BATCH_RETRIES))
+        self.batch_error_var = tk.StringVar(value="")
+        self.batch_abort_var = tk.StringVar(value="")
+
+        # Remote monitoring server settings
+        self.server_port_var = tk.StringVar(value=str(DEFAULT_SERVER_PORT))
+        self.server_host_var = tk.StringVar(value=SERVER_HOST)
+        self.server_telnet_var = tk.BooleanVar(value=True)
+        self.server_write_var = tk.BooleanVar(value=False)
+        self.server_replay_var = tk.BooleanVar(value=True)
+        self.server_overflow_var = tk.StringVar(value="Skip ahead")
+
+        # Port settings
+        self.flow_var = tk.StringVar(value="None")
+        self.char_delay_var = tk.StringVar(value="0")
+        self.line_delay_var = tk.StringVar(value="0")
+        self.auto_reconnect_var = tk.BooleanVar(value=False)
+        self.watchdog_var = tk.StringVar(value=f"{DEFAULT_WATCHDOG:g}")
+        self.pipeline_var = tk.BooleanVar(value=False)
+        self.telemetry_capacity_var = tk.StringVar(value="512k")
+
+        self.stats_var = tk.StringVar(value="")
+        ttk.Label(self.root, textvariable=self.stats_var, anchor=tk.W).pack(fill=tk.X, padx=5)
+        self.status_var = tk.StringVar(value="Disconnected")
+        ttk.Label(self.root, textvariable=self.status_var, relief=tk.SUNKEN, anchor=tk.W).pack(fill=tk.X, padx=5, pady=2)
+        # led indicating routing is running
+        self.led_label = tk.Label(self.saved_cmd_frame, text="●", font=("Arial", 18))
+        self.led_label.grid(row=12, column=1, padx=10, sticky="ew")  # adjust position
+        self.update_routing_led("failed")  # Start as red
+
+
+    def save_saved_commands(self):
+        # Library and polling jobs share COMMANDS_FILE
+        try:
+            data = {
+                "commands": self.saved_commands,
+                "jobs": [job.to_dict() for job in self.scheduler.jobs],
+            }
+            with open(COMMANDS_FILE, "w", encoding="utf-8") as f:
+                json.dump(data, f, indent=2)
+        except Exception as e:
+            self.log_output(f"[Error] Failed to save commands: {e}")
+
+    def load_trigger_rules(self):
+        try:
+            self.triggers.set_rules(load_triggers())
+        except Exception as e:
+            self.log_output(f"[Error] Failed to load triggers: {e}")
+
+    def save_trigger_rules(self):
+        try:
+            save_triggers(self.triggers.rules)
+        except Exception as e:
+            self.log_output(f"[Error] Failed to save triggers: {e}")
+
+    def load_saved_commands(self):
+        if COMMANDS_FILE.exists():
+            try:
+                with open(COMMANDS_FILE, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                if isinstance(data, list):
+                    data = {"commands": data}  # ten-slot list from older versions
+                self.saved_commands = [cmd for cmd in data.get("commands", []) if cmd]
+                self.scheduler.set_jobs(PeriodicJob.from_dict(job) for job in data.get("jobs", []))
+            except Exception as e:
+                self.log_output(f"[Error] Failed to load saved commands: {e}")
+        self.refresh_library()
+
+    def refresh_library(self):
+        self.library_list.delete(0, tk.END)
+        for cmd in self.saved_commands:
+            self.library_list.insert(tk.END, cmd)
+
+    def library_index(self):
+        selected = self.library_list.curselection()
+        return selected[0] if selected else None
+
+    def library_selected(self, event=None):
+        index = self.library_index()
+        if index is not None:
+            self.library_var.set(self.saved_commands[index])
+
+    def add_saved_command(self):
+        cmd = self.library_var.get().strip()
+        if not cmd:
+            return
+        self.saved_commands.append(cmd)
+        self.refresh_library()
+        self.library_list.selection_set(tk.END)
+        self.library_list.see(tk.END)
+        self.save_saved_commands()
+
+    def update_saved_command(self):
+        # Jobs follow the entry they poll
+        index = self.library_index()
+        cmd = self.library_var.get().strip()
+        if index is None or not cmd:
+            return
+        old = self.saved_commands[index]
+        jobs = self.scheduler.jobs
+        if any(job.command == old for job in jobs):
+            try:
+                jobs = [PeriodicJob(cmd, job.interval, job.port, job.enabled, job.hex_mode) if job.command == old
+                        else job for job in jobs]
+            except ValueError as e:
+                self.status_var.set(f"Error: A scheduled hex job uses this command - {e}")
+                return
+            self.scheduler.set_jobs(jobs)
+        self.saved_commands[index] = cmd
+        self.refresh_library()
+        self.library_list.selection_set(index)
+        self.save_saved_commands()
+
+    def delete_saved_command(self):
+        index = self.library_index()
+        if index is None:
+            return
+        cmd = self.saved_commands.pop(index)
+        if cmd not in self.saved_commands:
+            self.scheduler.set_jobs(job for job in self.scheduler.jobs if job.command != cmd)
+        self.refresh_library()
+        self.save_saved_commands()
+
+    def update_ports(self):
+        # Fill the port drop-downs from the monitor's inventory, keeping choices
+        ports = list(self.port_monitor.inventory)
+        display_ports = sorted(ports, key=lambda p: [int(t) if t.isdigit() else t for t in re.split(r"(\d+)", p)])
+        dropdowns = [
+            (self.port_menu, self.port_var, False),
+            (self.source_menu, self.com_source, False),
+            (self.dest1_menu, self.com_dest1, True),
+            (self.dest2_menu, self.com_dest2, True),
+        ]
+        for menu, var, optional in dropdowns:
+            values = display_ports if display_ports else ["No ports found"]
+            menu['values'] = [""] + values if optional else values
+            if optional or var.get() in display_ports:
+                continue
+            if var.get() not in ("", "No ports found", DEFAULT_PORT):
+                continue  # an unplugged port stays selected until changed
+            var.set(values[0])
+
+    def handle_port_changes(self):
+        # Apply plug/unplug reports from the port monitor
+        changed = False
+        while True:
+            try:
+                added, removed = self.port_monitor.changes.get_nowait()
+            except Empty:
+                break
+            changed = True
+            for info in removed:
+                self.log_output(f"[{timestamp()}] [Info] Port removed: {info}")
+                self.device_removed(info)
+            for info in added:
+                if self.port_monitor.scans > 1:
+                    self.log_output(f"[{timestamp()}] [Info] Port added: {info}")
+                self.device_returned(info)
+        if changed:
+            self.update_ports()
+            self.status_var.set(f"Ports updated ({len(self.port_monitor.inventory)} found)")
+
+    def device_returned(self, info):
+        # Supervised tabs waiting for this device retry right away
+        for tab in self.tabs:
+            if tab.session and tab.session.supervisor:
+                tab.session.supervisor.device_added(info)
+
+    def device_removed(self, info):
+        for tab in self.tabs:
+            if tab.session and tab.session.supervisor:
+                tab.session.supervisor.device_removed(info)
+
+    def scan_ports(self, event=None):
+        self.port_monitor.rescan()
+        self.status_var.set("Scanning ports...")
+
+    def show_probe(self):
+        win = tk.Toplevel(self.root)
+        win.title("Probe Ports")
+        in_use = {t.session.port for t in self.tabs if t.connected}
+        if self.router:
+            in_use.add(self.router.source.port)
+        ports = sorted(p for p in self.port_monitor.inventory if p not in in_use)
+
+        options = ttk.Frame(win)
+        options.pack(fill=tk.X, padx=5, pady=5)
+        ttk.Label(options, text="Ports:").grid(row=0, column=0, sticky=tk.NW)
+        port_list = tk.Listbox(options, selectmode=tk.MULTIPLE, height=min(6, max(1, len(ports))), exportselection=False)
+        for port in ports:
+            port_list.insert(tk.END, port)
+        port_list.select_set(0, tk.END)
+        port_list.grid(row=0, column=1, rowspan=3, sticky=tk.W, padx=5)
+        send_var = tk.StringVar()
+        expect_var = tk.StringVar()
+        budget_var = tk.StringVar(value=str(int(PROBE_BUDGET)))
+        parity_var = tk.BooleanVar(value=True)
+        ttk.Label(options, text="Send:").grid(row=0, column=2, sticky=tk.W)
+        ttk.Entry(options, textvariable=send_var, width=14).grid(row=0, column=3, sticky=tk.W, padx=5)
+        ttk.Label(options, text="Expect (regex):").grid(row=1, column=2, sticky=tk.W)
+        ttk.Entry(options, textvariable=expect_var, width=14).grid(row=1, column=3, sticky=tk.W, padx=5)
+        ttk.Label(options, text="Time budget (s):").grid(row=2, column=2, sticky=tk.W)
+        ttk.Entry(options, textvariable=budget_var, width=6).grid(row=2, column=3, sticky=tk.W, padx=5)
+        ttk.Checkbutton(options, text="Try parity", variable=parity_var).grid(row=3, column=2, columnspan=2, sticky=tk.W)
+
+        columns = ("baud", "parity", "score", "bytes", "sample")
+        tree = ttk.Treeview(win, columns=columns, height=10, selectmode="browse")
+        tree.heading("#0", text="Port")
+        tree.column("#0", width=120)
+        for col, width in zip(columns, (80, 60, 60, 60, 300)):
+            tree.heading(col, text=col.capitalize())
+            tree.column(col, width=width, anchor=tk.W)
+        tree.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+        progress_var = tk.StringVar(value="Sends the text (\\r, \\n, \\xHH allowed) after each change; "
+                                            "devices that talk on their own need nothing")
+        ttk.Label(win, textvariable=progress_var, anchor=tk.W).pack(fill=tk.X, padx=5)
+        button_frame = ttk.Frame(win)
+        button_frame.pack(fill=tk.X, padx=5, pady=5)
+        start_button = ttk.Button(button_frame, text="Start")
+        start_button.pack(side=tk.LEFT, padx=5)
+        state = {"prober": None}
+
+        def show(results):
+            tree.delete(*tree.get_children())
+            for i, r in enumerate(results):
+                values = (r.baudrate or "", r.parity, r.score, r.received, r.error or r.sample)
+                tree.insert("", tk.END, iid=str(i), text=r.port, values=values)
+
+        def poll(prober, thread):
+            if not win.winfo_exists():
+                prober.stop()
+                return
+            show(prober.ranked())
+            if thread.is_alive():
+                progress_var.set(f"Probing... {prober.tried}/{prober.total} settings, "
+                                 f"{max(0.0, prober.remaining()):.1f} s left")
+                win.after(200, poll, prober, thread)
+                return
+            state["prober"] = None
+            start_button.configure(text="Start")
+            best = next((r for r in prober.ranked() if r.error is None and r.received), None)
+            progress_var.set(f"Best: {best.port} {best.baudrate} {best.parity} (score {best.score})"
+                             if best else "No data received on any port")
+
+        def start():
+            if state["prober"]:
+                state["prober"].stop()
+                return
+            selected = [port_list.get(i) for i in port_list.curselection()]
+            if not selected:
+                progress_var.set("Select at least one port")
+                return
+            try:
+                prober = PortProber(
+                    selected,
+                    parities=PROBE_PARITIES if parity_var.get() else ["None"],
+                    budget=float(budget_var.get() or PROBE_BUDGET),
+                    stimulus=unescape(send_var.get()),
+                    pattern=expect_var.get() or None,
+                )
+            except (re.error, ValueError) as e:
+                progress_var.set(f"Error: {e}")
+                return
+            state["prober"] = prober
+            start_button.configure(text="Stop")
+            thread = threading.Thread(target=prober.run, name="probe", daemon=True)
+            thread.start()
+            poll(prober, thread)
+
+        def use(event=None):
+            selected = tree.selection()
+            item = tree.item(selected[0]) if selected else None
+            if not item or not item["values"][0]:
+                return
+            baud, parity = item["values"][:2]
+            self.port_var.set(item["text"])
+            self.baud_var.set(str(baud))
+            self.parity_var.set(parity)
+            self.status_var.set(f"Using {item['text']} at {baud} baud, parity {parity}")
+
+        start_button.configure(command=start)
+        ttk.Button(button_frame, text="Use", command=use).pack(side=tk.LEFT, padx=5)
+        tree.bind("<Double-Button-1>", use)
+
+    def port_selected(self, event=None):
+        info = self.port_monitor.inventory.get(self.port_var.get())
+        if info:
+            self.status_var.set(str(info))
+
+    @property
+    def tab(self):
+        # Session tab currently shown
+        return self.tabs[self.notebook.index("current")]
+
+    def new_tab(self):
+        tab = SessionTab(self.notebook, self.output_font)
+        self.tabs.append(tab)
+        self.notebook.add(tab.frame, text=tab.title)
+        self.notebook.select(tab.frame)
+        return tab
+
+    def close_tab(self):
+        tab = self.tab
+        if tab.connected:
+            self.disconnect(tab)
+        if len(self.tabs) == 1:
+            return  # always keep one tab
+        if tab.server:
+            tab.server.stop()
+        tab.index.close()
+        self.tabs.remove(tab)
+        self.notebook.forget(tab.frame)
+        tab.frame.destroy()
+
+    def tab_changed(self, event=None):
+        # Show the selected tab's port settings in the config bar
+        tab = self.tab
+        self.port_var.set(tab.settings["port"])
+        self.baud_var.set(tab.settings["baud"])
+        self.parity_var.set(tab.settings["parity"])
+        self.framing_var.set(tab.settings["framing"])
+        self.display_var.set(tab.settings["display"])
+        self.connect_button.configure(text="Disconnect" if tab.connected else "Connect")
+
+    def display_changed(self, event=None):
+        # Applies to the shown tab right away, no reconnect needed
+        tab = self.tab
+        tab.settings["display"] = self.display_var.get()
+        if tab.session:
+            tab.session.display = DISPLAY_MODES[self.display_var.get()]
+
+    def toggle_connect(self):
+        if self.tab.connected:
+            self.disconnect()
+        else:
+            self.connect()
+
+    def connect(self, tab=None, port=None):
+        # Uses the config bar, or the tab's own settings when reopening a port
+        tab = tab or self.tab
+        settings = dict(tab.settings, port=port) if port else {
+            "port": self.port_var.get().split(" - ")[0],
+            "baud": self.baud_var.get(),
+            "parity": self.parity_var.get(),
+            "framing": self.framing_var.get(),
+            "display": self.display_var.get(),
+        }
+        try:
+            port = settings["port"]
+            baudrate = int(settings["baud"])
+            watchdog = float(self.watchdog_var.get() or 0)
+            if any(t is not tab and t.connected and t.session.port == port for t in self.tabs):
+                raise RuntimeError(f"{port} is already open in another tab")
+            if self.router and self.router.owns_source and self.router.source.port == port:
+                raise RuntimeError(f"{port} is in use by routing")
+            session = SerialSession(
+                port,
+                baudrate=baudrate,
+                parity=settings["parity"],
+                framing=settings["framing"],
+                flow=self.flow_var.get(),
+                char_delay=float(self.char_delay_var.get() or 0) / 1000.0,
+                line_delay=float(self.line_delay_var.get() or 0) / 1000.0,
+                response_queue=tab.response_queue,
+                correlator=tab.correlator,
+                on_error=lambda e, tab=tab: self.reader_error(tab, e)
+            )
+            session.capture = self.capture
+            session.display = DISPLAY_MODES[settings["display"]]
+            session.triggers = self.triggers
+            session.on_trigger = lambda rule, line, tab=tab: tab.trigger_events.put((rule, line))
+            session.telemetry = tab.telemetry
+            if self.pipeline_var.get() and pipeline_available:
+                session.pipeline = PipelineFeed(session)
+            try:
+                session.open()
+            except Exception:
+                if session.pipeline:
+                    session.pipeline.close()
+                raise
+            tab.session = session
+            if tab.server:
+                tab.server.attach(session)
+            tab.settings = settings
+            info = self.port_monitor.inventory.get(port)
+            tab.device_id = info.identity if info else None
+            if self.auto_reconnect_var.get():
+                ConnectionSupervisor(
+                    session, self.port_monitor, tab.device_id,
+                    watchdog=watchdog,
+                    on_event=lambda kind, text, tab=tab: tab.port_events.put((kind, text))
+                ).start()
+            if os.sep in port:
+                self.port_monitor.watch(port)  # ptys are not listed by comports()
+            self.notebook.tab(tab.frame, text=tab.title)
+            self.tick_ms = MIN_TICK_MS
+            if tab is self.tab:
+                self.connect_button.configure(text="Disconnect")
+            self.log_output(f"[{timestamp()}] Connected to {port} at {baudrate} baud", tab)
+            self.status_var.set(f"Connected to {port}")
+            self.command_entry.focus()
+        except Exception as e:
+            self.log_output(f"[Error] Failed to connect: {e}", tab)
+            self.status_var.set(f"Error: {e}")
+
+    def disconnect(self, tab=None):
+        tab = tab or self.tab
+        if tab.connected:
+            if tab.server:
+                tab.server.detach()
+            tab.session.close()
+            tab.session = None
+            if tab is self.tab:
+                self.connect_button.configure(text="Connect")
+            if tab.replayer:
+                tab.replayer.stop()
+            if tab.virtual_port_close:
+                tab.virtual_port_close()
+                tab.virtual_port_close = None
+            self.notebook.tab(tab.frame, text=tab.title)
+            self.log_output(f"[{timestamp()}] Port closed", tab)
+            self.status_var.set("Disconnected")
+
+    def show_port_settings(self):
+        win = tk.Toplevel(self.root)
+        win.title("Port Settings")
+        win.transient(self.root)
+        ttk.Label(win, text="Flow control:").grid(row=0, column=0, sticky=tk.W, padx=5, pady=2)
+        ttk.Combobox(win, textvariable=self.flow_var, values=list(FLOW_CONTROLS),
+                     state="readonly", width=12).grid(row=0, column=1, padx=5, pady=2)
+        ttk.Label(win, text="Char delay (ms):").grid(row=1, column=0, sticky=tk.W, padx=5, pady=2)
+        ttk.Entry(win, textvariable=self.char_delay_var, width=14).grid(row=1, column=1, padx=5, pady=2)
+        ttk.Label(win, text="Line delay (ms):").grid(row=2, column=0, sticky=tk.W, padx=5, pady=2)
+        ttk.Entry(win, textvariable=self.line_delay_var, width=14).grid(row=2, column=1, padx=5, pady=2)
+
+        def apply():
+            try:
+                char_delay = float(self.char_delay_var.get() or 0) / 1000.0
+                line_delay = float(self.line_delay_var.get() or 0) / 1000.0
+                watchdog = max(0.0, float(self.watchdog_var.get() or 0))
+            except ValueError as e:
+                self.status_var.set(f"Error: {e}")
+                return
+            session = self.tab.session
+            if session:
+                # Pacing and the watchdog apply immediately, flow control,
+                # reconnecting and the pipeline on the next connect
+                session.set_pacing(char_delay, line_delay)
+                if session.supervisor:
+                    session.supervisor.watchdog = watchdog
+                    session.supervisor.wake.set()
+            self.status_var.set("Port settings saved")
+            win.destroy()
+
+        ttk.Checkbutton(win, text="Reconnect automatically when the port is lost",
+                        variable=self.auto_reconnect_var).grid(row=3, column=0, columnspan=2, sticky=tk.W, padx=5, pady=2)
+        ttk.Label(win, text="Stall watchdog (s):").grid(row=4, column=0, sticky=tk.W, padx=5, pady=2)
+        ttk.Entry(win, textvariable=self.watchdog_var, width=14).grid(row=4, column=1, padx=5, pady=2)
+
+        if pipeline_available:
+            pipeline_text = f"Multi-core receive pipeline ({rx_pipeline.workers} workers)"
+        else:
+            pipeline_text = f"Multi-core receive pipeline (needs {PIPELINE_MIN_CPUS}+ CPU cores)"
+        ttk.Checkbutton(win, text=pipeline_text, variable=self.pipeline_var,
+                        state=tk.NORMAL if pipeline_available else tk.DISABLED
+                        ).grid(row=5, column=0, columnspan=2, sticky=tk.W, padx=5, pady=2)
+
+        ttk.Button(win, text="OK", command=apply).grid(row=6, column=0, columnspan=2, pady=5)
+
+    def reader_error(self, tab, e):
+        # Unsupervised port failed, on the I/O thread: close it on the next tick
+        tab.port_events.put(("error", f"Port error: {tab.title}: {e}"))
+
+    def handle_port_events(self, tab):
+        # Outages are logged with their start and end, so the gap shows in the session log
+        while True:
+            try:
+                kind, text = tab.port_events.get_nowait()
+            except Empty:
+                return
+            self.log_output(f"[{timestamp()}] [{'Error' if kind == 'error' else 'Info'}] {text}", tab)
+            self.status_var.set(text)
+            if kind == "error":
+                self.disconnect(tab)
+            elif tab.session:
+                state = " (reconnecting)" if tab.session.reconnecting else ""
+                self.notebook.tab(tab.frame, text=tab.title + state)
+
+    def transmit(self, data, command=None, block=False, tab=None):
+        # GUI sends never wait on a full TX queue, the file sender does
+        return (tab or self.tab).session.transmit(data, command, block=block)
+
+    def send_command(self, event=None):
+        cmd = self.command_var.get().strip()
+        if not cmd:
+            return
+        if cmd.lower() in ['exit', 'quit']:
+            self.disconnect()
+            self.root.quit()
+            return
+        if not self.tab.connected:
+            self.log_output("[Error] Not connected")
+            self.status_var.set("Error: Not connected")
+            return
+        try:
+            self.transmit(self.encode_command(cmd), cmd)
+            self.log_output(f"[{timestamp()}] >> {cmd}")
+            self.command_var.set("")
+        except Exception as e:
+            self.log_output(f"[Error] Failed to send: {e}")
+            self.status_var.set(f"Error: {e}")
+
+    def encode_command(self, command):
+        return encode_command(command, self.hex_send_var.get())
+
+    def send_saved_command(self, index):
+        command = self.saved_commands[index] if index is not None else None
+        if command:
+            if not self.tab.connected:
+                self.log_output("[Error] Not connected")
+                self.status_var.set("Error: Not connected")
+                return
+            try:
+                self.transmit(self.encode_command(command), command)
+                self.log_output(f"[{timestamp()}] >> {command}")
+            except Exception as e:
+                self.log_output(f"[Error] Failed to send: {e}")
+                self.status_var.set(f"Error: {e}")
+
+    def scheduled_send(self, job):
+        # Runs on the scheduler thread: queue the poll on the job's port, the
+        # echo goes to the tab through its send_events
+        for tab in list(self.tabs):
+            session = tab.session
+            if session and session.running and (not job.port or session.port == job.port):
+                session.transmit(job.payload, job.command, block=False)
+                tab.send_events.put(("log", f"[{timestamp()}] >> {job.command}"))
+                return True
+        return False
+
+    def show_scheduler(self):
+        win = tk.Toplevel(self.root)
+        win.title("Scheduler")
+        columns = ("interval", "port", "hex", "enabled", "sent", "missed", "failed", "p50", "p99", "max")
+        headings = ("Interval (s)", "Port", "Hex", "Enabled", "Sent", "Missed", "Failed",
+                    "Jitter p50 ms", "Jitter p99 ms", "Jitter max ms")
+        tree = ttk.Treeview(win, columns=columns, height=10, selectmode="browse")
+        tree.heading("#0", text="Command")
+        tree.column("#0", width=180)
+        for col, heading in zip(columns, headings):
+            tree.heading(col, text=heading)
+            tree.column(col, width=80, anchor=tk.E)
+        tree.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+
+        form = ttk.Frame(win)
+        form.pack(fill=tk.X, padx=5, pady=5)
+        command_var = tk.StringVar(value=self.library_var.get())
+        interval_var = tk.StringVar(value="1.0")
+        port_var = tk.StringVar(value=self.tab.session.port if self.tab.connected else "")
+        enabled_var = tk.BooleanVar(value=True)
+        hex_var = tk.BooleanVar(value=self.hex_send_var.get())
+        ttk.Label(form, text="Command:").grid(row=0, column=0, sticky=tk.W)
+        ttk.Combobox(form, textvariable=command_var, values=self.saved_commands, state="readonly",
+                     width=25).grid(row=0, column=1, sticky=tk.W, padx=5)
+        ttk.Label(form, text="Interval (s):").grid(row=0, column=2, sticky=tk.W)
+        ttk.Entry(form, textvariable=interval_var, width=8).grid(row=0, column=3, sticky=tk.W, padx=5)
+        ttk.Label(form, text="Port:").grid(row=1, column=0, sticky=tk.W)
+        ports = [""] + sorted({t.session.port for t in self.tabs if t.session})
+        ttk.Combobox(form, textvariable=port_var, values=ports, width=25).grid(row=1, column=1, sticky=tk.W, padx=5)
+        ttk.Checkbutton(form, text="Enabled", variable=enabled_var).grid(row=1, column=2, sticky=tk.W)
+        ttk.Checkbutton(form, text="Hex", variable=hex_var).grid(row=1, column=3, sticky=tk.W)
+        ttk.Label(form, text=f"Blank port sends to the first connected port; intervals from {MIN_JOB_INTERVAL} s",
+                  foreground="gray").grid(row=2, column=0, columnspan=4, sticky=tk.W, pady=(2, 0))
+
+        def refresh():
+            if not win.winfo_exists():
+                return
+            selected = tree.selection()
+            tree.delete(*tree.get_children())
+            for i, job in enumerate(self.scheduler.jobs):
+                jitter = job.lateness.summary()
+                ms = lambda key: "-" if jitter[key] is None else jitter[key]
+                tree.insert("", tk.END, iid=str(i), text=job.command, values=(
+                    job.interval, job.port or "(first)", "yes" if job.hex_mode else "no", "yes" if job.enabled else "no",
+                    job.sent, job.missed, job.failed, ms("p50_ms"), ms("p99_ms"), ms("max_ms")))
+            if selected and tree.exists(selected[0]):
+                tree.selection_set(selected)
+            win.after(1000, refresh)
+
+        def selected_index():
+            selected = tree.selection()
+            return int(selected[0]) if selected else None
+
+        def load_form(event=None):
+            i = selected_index()
+            if i is None:
+                return
+            job = self.scheduler.jobs[i]
+            command_var.set(job.command)
+            interval_var.set(str(job.interval))
+            port_var.set(job.port)
+            enabled_var.set(job.enabled)
+            hex_var.set(job.hex_mode)
+
+        def apply(jobs):
+            # Restarting the schedule also clears the stats of changed jobs
+            self.scheduler.set_jobs(jobs)
+            self.save_saved_commands()
+            refresh()
+
+        def form_job():
+            if not command_var.get():
+                raise ValueError("Choose a command from the library")
+            return PeriodicJob(command_var.get(), float(interval_var.get()), port_var.get().strip(),
+                               enabled_var.get(), hex_var.get())
+
+        def add():
+            try:
+                job = form_job()
+            except ValueError as e:
+                self.status_var.set(f"Error: {e}")
+                return
+            apply(self.scheduler.jobs + [job])
+
+        def update():
+            i = selected_index()
+            if i is None:
+                return
+            try:
+                job = form_job()
+            except ValueError as e:
+                self.status_var.set(f"Error: {e}")
+                return
+            jobs = list(self.scheduler.jobs)
+            jobs[i] = job
+            apply(jobs)
+
+        def delete():
+            i = selected_index()
+            if i is None:
+                return
+            apply([job for n, job in enumerate(self.scheduler.jobs) if n != i])
+
+        def set_all(enabled):
+            for job in self.scheduler.jobs:
+                job.enabled = enabled
+            apply(self.scheduler.jobs)
+
+        tree.bind("<<TreeviewSelect>>", load_form)
+        button_frame = ttk.Frame(win)
+        button_frame.pack(fill=tk.X, padx=5, pady=5)
+        ttk.Button(button_frame, text="Add", command=add).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="Update", command=update).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="Delete", command=delete).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="Start All", command=lambda: set_all(True)).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="Stop All", command=lambda: set_all(False)).pack(side=tk.LEFT, padx=5)
+        refresh()
+
+    def process_queue(self):
+        # Render every tab's new lines; only the shown tab updates the status bar
+        if self.tick_due is not None:
+            self.ui_lag.add(max(0, time.monotonic_ns() - self.tick_due))
+        busy = False
+        drained = 0
+        current = self.tab
+        for tab in self.tabs:
+            lines = []
+            styles = []     # (row, column offset, spans) of ANSI lines
+            partial = None  # latest unfinished ANSI line
+            commands = []  # command each line answers, for export
+            last_response = None
+            try:
+                while len(lines) < MAX_LINES_PER_TICK:
+                    item = tab.response_queue.get_nowait()
+                    # Pipeline mode queues whole blocks at once
+                    for cmd, response in (item[1] if item[0] is LINE_BATCH else (item,)):
+                        if getattr(response, "partial", False):
+                            partial = response
+                            continue
+                        partial = None  # the finished line replaces it
+                        line = f"[{timestamp()}] << {response}"
+                        if getattr(response, "spans", None):
+                            styles.append((len(lines), len(line) - len(response), response.spans))
+                        lines.append(line)
+                        if cmd != UNKNOWN_COMMAND:
+                            last_response = response
+                        commands.append(cmd if cmd != UNKNOWN_COMMAND else "")
+            except Empty:
+                pass
+            if partial is not None:
+                line = f"[{timestamp()}] << {partial}"
+                partial = (line, len(line) - len(partial), partial.spans)
+            if lines or partial:
+                self.append_output(lines, tab, styles, partial, commands)
+                if self.text_log_var.get():
+                    # Each session's lines are tagged with its port in the shared log
+                    for line in lines:
+                        self.write_log(f"{tab.title} {line}")
+            if last_response and tab is current:
+                self.status_var.set(f"Response: {last_response}")
+            self.handle_trigger_events(tab)
+            self.handle_port_events(tab)
+            self.handle_send_events(tab)
+            if tab.telemetry:
+                tab.telemetry.process()
+            tab.correlator.expire()
+            drained += len(lines)
+            busy = busy or len(lines) >= MAX_LINES_PER_TICK or not tab.response_queue.empty()
+        if current.session:
+            self.tx_depth_var.set(f"TX: {current.session.tx_depth()}")
+        self.handle_port_changes()
+        # Adapt the tick to the incoming rate: poll faster while lines keep coming
+        if busy:
+            self.tick_ms = MIN_TICK_MS
+        elif drained:
+            self.tick_ms = max(MIN_TICK_MS, self.tick_ms // 2)
+        else:
+            self.tick_ms = min(MAX_TICK_MS, self.tick_ms * 2)
+        self.tick_due = time.monotonic_ns() + self.tick_ms * 1_000_000
+        self.root.after(self.tick_ms, self.process_queue)
+
+    def handle_send_events(self, tab):
+        # Echoed commands and file send progress from other threads, drained
+        # here because Tk and the tab's line index must only be touched on this thread
+        lines = []
+        status = None
+        while True:
+            try:
+                kind, text = tab.send_events.get_nowait()
+            except Empty:
+                break
+            if kind == "log":
+                lines.append(text)
+            else:
+                status = text  # only the latest progress is worth showing
+        if lines:
+            self.append_output(lines, tab)
+            for line in lines:
+                self.write_log(line)
+        if status is not None:
+            self.status_var.set(status)
+
+    def handle_trigger_events(self, tab):
+        # Non-highlight trigger actions that need the GUI
+        while True:
+            try:
+                rule, line = tab.trigger_events.get_nowait()
+            except Empty:
+                return
+            if rule.action == "alert":
+                self.root.bell()
+                self.status_var.set(f"Trigger [{rule.pattern}] on {tab.title}: {line}")
+                self.write_log(f"{tab.title} [Trigger] {rule.pattern}: {line}")
+            elif rule.action == "send":
+                self.log_output(f"[{timestamp()}] >> {rule.argument} (trigger: {rule.pattern})", tab)
+            elif rule.action == "capture_start" and not self.capture:
+                self.start_capture()
+            elif rule.action == "capture_stop" and self.capture:
+                self.stop_capture()
+
+    def show_telemetry(self):
+        tab = self.tab
+        win = tk.Toplevel(self.root)
+        win.title(f"Telemetry - {tab.title}")
+        extract_var = tk.BooleanVar(value=tab.telemetry is not None)
+        window_var = tk.StringVar(value="1 min")
+        paused_var = tk.BooleanVar(value=False)
+        info_var = tk.StringVar()
+
+        side = ttk.Frame(win)
+        side.pack(side=tk.LEFT, fill=tk.Y, padx=5, pady=5)
+        ttk.Checkbutton(side, text="Extract", variable=extract_var, command=lambda: set_extract()).pack(anchor=tk.W)
+        ttk.Label(side, text="Series:").pack(anchor=tk.W)
+        series_list = tk.Listbox(side, selectmode=tk.MULTIPLE, height=10, width=18, exportselection=False)
+        series_list.pack(fill=tk.Y, expand=True)
+        ttk.Label(side, text="Window:").pack(anchor=tk.W)
+        ttk.Combobox(side, textvariable=window_var, values=list(PLOT_WINDOWS), state="readonly",
+                     width=8).pack(anchor=tk.W)
+        ttk.Checkbutton(side, text="Pause", variable=paused_var).pack(anchor=tk.W)
+        ttk.Label(side, text="Points per series:").pack(anchor=tk.W)
+        capacity_box = ttk.Combobox(side, textvariable=self.telemetry_capacity_var, values=list(TELEMETRY_CAPACITIES),
+                                    state="readonly", width=8)
+        capacity_box.pack(anchor=tk.W)
+        capacity_box.bind("<<ComboboxSelected>>", lambda event: set_capacity())
+        ttk.Button(side, text="Export CSV", command=lambda: export()).pack(anchor=tk.W, pady=(5, 0))
+
+        main = ttk.Frame(win)
+        main.pack(side=tk.LEFT, fill=tk.BOTH, expand=True, padx=5, pady=5)
+        canvas = tk.Canvas(main, width=800, height=300, background="white", highlightthickness=0)
+        canvas.pack(fill=tk.BOTH, expand=True)
+        ttk.Label(main, textvariable=info_var, anchor=tk.W).pack(fill=tk.X)
+        ttk.Label(main, text="Patterns (one regex per line; named groups are series, "
+                             "otherwise two groups: name and value):").pack(anchor=tk.W, pady=(5, 0))
+        patterns_text = tk.Text(main, height=3, width=80, font=self.output_font)
+        patterns_text.pack(fill=tk.X)
+        if tab.telemetry:
+            patterns = [regex.pattern for regex in tab.telemetry.patterns]
+        else:
+            try:
+                patterns = load_telemetry_patterns()
+            except Exception as e:
+                self.log_output(f"[Error] Failed to load telemetry patterns: {e}")
+                patterns = [DEFAULT_TELEMETRY_PATTERN]
+        patterns_text.insert("1.0", "\n".join(patterns))
+        names = []
+
+        def read_patterns():
+            return [p for p in patterns_text.get("1.0", tk.END).splitlines() if p.strip()]
+
+        def apply_patterns():
+            try:
+                if tab.telemetry:
+                    tab.telemetry.set_patterns(read_patterns())
+                else:
+                    Telemetry(read_patterns())
+                save_telemetry_patterns(read_patterns())
+            except (re.error, ValueError) as e:
+                info_var.set(f"Error: {e}")
+                return
+            info_var.set("Patterns saved")
+
+        ttk.Button(main, text="Apply Patterns", command=apply_patterns).pack(anchor=tk.W, pady=(2, 0))
+
+        def set_extract():
+            if extract_var.get() and not tab.telemetry:
+                try:
+                    tab.telemetry = Telemetry(read_patterns(), capacity())
+                except (re.error, ValueError) as e:
+                    info_var.set(f"Error: {e}")
+                    extract_var.set(False)
+                    return
+            elif not extract_var.get():
+                tab.telemetry = None  # the plotted data is dropped too
+                names.clear()
+                series_list.delete(0, tk.END)
+            if tab.session:
+                tab.session.telemetry = tab.telemetry
+
+        def capacity():
+            return TELEMETRY_CAPACITIES[self.telemetry_capacity_var.get()]
+
+        def set_capacity():
+            # Series already plotted keep the history they have
+            if tab.telemetry:
+                tab.telemetry.capacity = capacity()
+
+        def export():
+            telemetry = tab.telemetry
+            if not telemetry or not telemetry.series:
+                return
+            selected = [names[i] for i in series_list.curselection()] or list(names)
+            file_path = filedialog.asksaveasfilename(parent=win, defaultextension=".csv",
+                                                     filetypes=[("CSV files", "*.csv")], title="Export Telemetry")
+            if not file_path:
+                return
+            # Copy on the GUI thread (fast), write on a worker
+            copies = [(name, *telemetry.series[name].snapshot()) for name in selected]
+            done = Queue()
+
+            def write():
+                try:
+                    export_telemetry(copies, file_path)
+                    done.put(None)
+                except Exception as e:
+                    done.put(e)
+
+            def wait():
+                try:
+                    error = done.get_nowait()
+                except Empty:
+                    self.root.after(100, wait)
+                    return
+                self.status_var.set(f"Error: Failed to export telemetry - {error}" if error
+                                    else f"Telemetry saved to {file_path}")
+
+            threading.Thread(target=write, name="telemetry-export", daemon=True).start()
+            wait()
+
+        def draw():
+            if not win.winfo_exists():
+                return
+            win.after(PLOT_REFRESH_MS, draw)
+            telemetry = tab.telemetry
+            if not telemetry:
+                return
+            for name in list(telemetry.series)[len(names):]:
+                names.append(name)
+                series_list.insert(tk.END, name)
+                if len(names) <= 3:
+                    series_list.selection_set(tk.END)
+            if paused_var.get():
+                return
+            shown = [telemetry.series[names[i]] for i in series_list.curselection()]
+            canvas.delete("all")
+            width, height = canvas.winfo_width(), canvas.winfo_height()
+            left, right, top, bottom = 60, 10, 10, 20
+            plot_width = max(1, width - left - right)
+            end = time.monotonic()
+            span = PLOT_WINDOWS[window_var.get()]
+            firsts = [s.times[s.first % s.capacity] for s in shown if len(s)]
+            if not firsts:
+                info_var.set("Waiting for data" if not names else "Select series to plot")
+                return
+            start = end - span if span else min(firsts)
+            # min/max per pixel column: the plot costs the same for 100 or 10M points
+            columns = [(s, s.columns(start, end, plot_width)) for s in shown]
+            lows = [low for _, cols in columns for _, low, _ in cols]
+            highs = [high for _, cols in columns for _, _, high in cols]
+            if not lows:
+                info_var.set("No data in this window")
+                return
+            low, high = min(lows), max(highs)
+            if high == low:
+                low, high = low - 1, high + 1
+            scale = (height - top - bottom) / (high - low)
+            y = lambda v: top + (high - v) * scale
+            canvas.create_rectangle(left, top, width - right, height - bottom, outline="gray")
+            canvas.create_text(left - 4, top, text=f"{high:.4g}", anchor=tk.NE)
+            canvas.create_text(left - 4, height - bottom, text=f"{low:.4g}", anchor=tk.E)
+            canvas.create_text(left, height - bottom + 2, text=f"-{end - start:.0f} s", anchor=tk.NW)
+            canvas.create_text(width - right, height - bottom + 2, text="now", anchor=tk.NE)
+            for i, (series, cols) in enumerate(columns):
+                color = PLOT_COLORS[i % len(PLOT_COLORS)]
+                points = []
+                for c, col_low, col_high in cols:
+                    x = left + c
+                    points.extend((x, y(col_high), x, y(col_low)))
+                if len(points) >= 4:
+                    canvas.create_line(*points, fill=color)
+                latest = series.values[(series.count - 1) % series.capacity]
+                canvas.create_text(width - right - 4, top + 4 + 14 * i, text=f"{series.name} {latest:.4g}",
+                                   fill=color, anchor=tk.NE)
+            info_var.set(f"{sum(len(s) for s in shown):,} points, {sum(len(c) for _, c in columns):,} columns drawn")
+
+        draw()
+
+    def show_triggers(self):
+        win = tk.Toplevel(self.root)
+        win.title("Triggers")
+        engine = self.triggers
+        rules = list(engine.rules)
+
+        columns = ("enabled", "type", "action", "argument", "cooldown", "hits")
+        tree = ttk.Treeview(win, columns=columns, height=12, selectmode="browse")
+        tree.heading("#0", text="Pattern")
+        tree.column("#0", width=220)
+        for col in columns:
+            tree.heading(col, text=col.capitalize())
+            tree.column(col, width=80, anchor=tk.W)
+        tree.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+
+        form = ttk.Frame(win)
+        form.pack(fill=tk.X, padx=5, pady=5)
+        pattern_var = tk.StringVar()
+        regex_var = tk.BooleanVar(value=False)
+        ignore_case_var = tk.BooleanVar(value=False)
+        enabled_var = tk.BooleanVar(value=True)
+        action_var = tk.StringVar(value="Highlight")
+        argument_var = tk.StringVar()
+        cooldown_var = tk.StringVar(value="0")
+        ttk.Label(form, text="Pattern:").grid(row=0, column=0, sticky=tk.W)
+        ttk.Entry(form, textvariable=pattern_var, width=35).grid(row=0, column=1, columnspan=3, sticky=tk.W, padx=5)
+        ttk.Checkbutton(form, text="Regex", variable=regex_var).grid(row=0, column=4, sticky=tk.W)
+        ttk.Checkbutton(form, text="Ignore case", variable=ignore_case_var).grid(row=0, column=5, sticky=tk.W)
+        ttk.Checkbutton(form, text="Enabled", variable=enabled_var).grid(row=0, column=6, sticky=tk.W)
+        ttk.Label(form, text="Action:").grid(row=1, column=0, sticky=tk.W)
+        ttk.Combobox(form, textvariable=action_var, values=list(TRIGGER_ACTIONS), state="readonly",
+                     width=12).grid(row=1, column=1, sticky=tk.W, padx=5)
+        ttk.Label(form, text="Argument:").grid(row=1, column=2, sticky=tk.W)
+        ttk.Entry(form, textvariable=argument_var, width=18).grid(row=1, column=3, sticky=tk.W, padx=5)
+        ttk.Label(form, text="Cooldown (s):").grid(row=1, column=4, sticky=tk.W)
+        ttk.Entry(form, textvariable=cooldown_var, width=6).grid(row=1, column=5, sticky=tk.W)
+        ttk.Label(form, text="Argument: highlight colour (e.g. #ffc0c0) or text to send (\\r, \\n, \\xHH allowed)",
+                  foreground="gray").grid(row=2, column=0, columnspan=7, sticky=tk.W, pady=(2, 0))
+        action_names = {value: name for name, value in TRIGGER_ACTIONS.items()}
+
+        def refresh():
+            if not win.winfo_exists():
+                return
+            selected = tree.selection()
+            tree.delete(*tree.get_children())
+            for i, rule in enumerate(rules):
+                tree.insert("", tk.END, iid=str(i), text=rule.pattern, values=(
+                    "yes" if rule.enabled else "no",
+                    ("regex" if rule.regex else "text") + (" (i)" if rule.ignore_case else ""),
+                    action_names.get(rule.action, rule.action), rule.argument, rule.cooldown, rule.hits))
+            if selected and tree.exists(selected[0]):
+                tree.selection_set(selected)
+            win.after(1000, refresh)
+
+        def selected_index():
+            selected = tree.selection()
+            return int(selected[0]) if selected else None
+
+        def load_form(event=None):
+            i = selected_index()
+            if i is None:
+                return
+            rule = rules[i]
+            pattern_var.set(rule.pattern)
+            regex_var.set(rule.regex)
+            ignore_case_var.set(rule.ignore_case)
+            enabled_var.set(rule.enabled)
+            action_var.set(action_names.get(rule.action, "Highlight"))
+            argument_var.set(rule.argument)
+            cooldown_var.set(str(rule.cooldown))
+
+        def form_rule(hits=0):
+            return TriggerRule(pattern_var.get(), regex_var.get(), ignore_case_var.get(),
+                               TRIGGER_ACTIONS[action_var.get()], argument_var.get(),
+                               float(cooldown_var.get() or 0), enabled_var.get(), hits)
+
+        def apply_rules(new_rules):
+            # The edit is kept (and saved) only if the engine takes the whole set
+            try:
+                engine.set_rules(new_rules)
+            except re.error as e:
+                self.status_var.set(f"Error: Invalid trigger - {e}")
+                return
+            rules[:] = new_rules
+            self.save_trigger_rules()
+            refresh()
+
+        def add():
+            try:
+                rule = form_rule()
+            except (re.error, ValueError) as e:
+                self.status_var.set(f"Error: Invalid trigger - {e}")
+                return
+            apply_rules(rules + [rule])
+
+        def update():
+            i = selected_index()
+            if i is None:
+                return
+            try:
+                rule = form_rule(rules[i].hits)
+            except (re.error, ValueError) as e:
+                self.status_var.set(f"Error: Invalid trigger - {e}")
+                return
+            apply_rules(rules[:i] + [rule] + rules[i + 1:])
+
+        def delete():
+            i = selected_index()
+            if i is None:
+                return
+            apply_rules(rules[:i] + rules[i + 1:])
+
+        def reset_hits():
+            engine.reset_hits()
+            self.save_trigger_rules()
+
+        tree.bind("<<TreeviewSelect>>", load_form)
+        button_frame = ttk.Frame(win)
+        button_frame.pack(fill=tk.X, padx=5, pady=5)
+        ttk.Button(button_frame, text="Add", command=add).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="Update", command=update).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="Delete", command=delete).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="Reset Hits", command=reset_hits).pack(side=tk.LEFT, padx=5)
+        refresh()
+
+    def sample_metrics(self):
+        sessions = [(tab.title, tab.session) for tab in self.tabs if tab.session]
+        if self.router and self.router.owns_source:
+            sessions.append((f"{self.router.source.port} (routing)", self.router.source))
+        lag, self.ui_lag = self.ui_lag, LatencyHistogram()
+        seconds = lambda ns: None if ns is None else round(ns / 1e9, 6)
+        sample = self.metrics.sample(sessions, {
+            "ui_lag_p50_seconds": seconds(lag.percentile_ns(50)),
+            "ui_lag_p99_seconds": seconds(lag.percentile_ns(99)),
+            "ui_lag_max_seconds": seconds(lag.max_ns),
+            "ui_ticks": lag.count,
+            "tick_ms": self.tick_ms,
+            "log_queue": log_queue.qsize(),
+        })
+        # Compact line for the shown tab
+        values = sample["ports"].get(self.tab.title) if self.tab.session else None
+        lag_text = f"UI lag p99 {lag.percentile_ns(99) / 1e6:.0f} ms" if lag.count else "UI lag -"
+        if values:
+            self.stats_var.set(
+                f"RX {values['rx_bytes_per_s']:.0f} B/s {values['rx_lines_per_s']:.0f} lines/s | "
+                f"TX {values['tx_bytes_per_s']:.0f} B/s | queue {values['response_queue']} | "
+                f"undecodable {values['undecodable_bytes']} B | {lag_text}")
+        else:
+            self.stats_var.set(lag_text)
+        self.root.after(METRICS_INTERVAL_MS, self.sample_metrics)
+
+    def start_metrics_server(self, port):
+        try:
+            self.metrics_server = MetricsServer(self.metrics, port)
+            self.log_output(f"[Info] Metrics on http://{METRICS_HOST}:{self.metrics_server.port}/metrics")
+        except OSError as e:
+            self.log_output(f"[Error] Failed to start metrics endpoint: {e}")
+
+    def stop_metrics_server(self):
+        server, self.metrics_server = self.metrics_server, None
+        if server:
+            server.stop()
+
+    def show_stats(self):
+        win = tk.Toplevel(self.root)
+        win.title("Stats")
+        columns = ("rx_bytes_per_s", "rx_lines_per_s", "tx_bytes_per_s", "tx_writes_per_s", "response_queue",
+                   "tx_queue", "undecodable_bytes", "oversized_frames", "rx_reads", "reconnects",
+                   "last_recovery_seconds")
+        headings = ("RX B/s", "RX lines/s", "TX B/s", "TX writes/s", "Resp queue",
+                    "TX queue", "Undecodable", "Oversized", "Reads", "Reconnects", "Recovery s")
+        tree = ttk.Treeview(win, columns=columns, height=6)
+        tree.heading("#0", text="Port")
+        tree.column("#0", width=140)
+        for col, heading in zip(columns, headings):
+            tree.heading(col, text=heading)
+            tree.column(col, width=85, anchor=tk.E)
+        tree.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+        app_var = tk.StringVar()
+        ttk.Label(win, textvariable=app_var, anchor=tk.W).pack(fill=tk.X, padx=5)
+
+        endpoint_frame = ttk.Frame(win)
+        endpoint_frame.pack(fill=tk.X, padx=5, pady=5)
+        ttk.Label(endpoint_frame, text="HTTP port:").pack(side=tk.LEFT)
+        port_var = tk.StringVar(value=str(self.metrics_server.port if self.metrics_server else DEFAULT_METRICS_PORT))
+        ttk.Entry(endpoint_frame, textvariable=port_var, width=7).pack(side=tk.LEFT, padx=5)
+        endpoint_button = ttk.Button(endpoint_frame)
+        endpoint_button.pack(side=tk.LEFT, padx=5)
+        endpoint_var = tk.StringVar()
+        ttk.Label(endpoint_frame, textvariable=endpoint_var).pack(side=tk.LEFT, padx=5)
+
+        def toggle_endpoint():
+            if self.metrics_server:
+                self.stop_metrics_server()
+            else:
+                try:
+                    self.start_metrics_server(int(port_var.get()))
+                except ValueError:
+                    self.status_var.set("Error: Invalid port")
+
+        endpoint_button.configure(command=toggle_endpoint)
+
+        def refresh():
+            if not win.winfo_exists():
+                return
+            tree.delete(*tree.get_children())
+            sample = self.metrics.latest
+            for port, values in sample["ports"].items():
+                tree.insert("", tk.END, text=port, values=[values.get(c, "-") for c in columns])
+            app = sample["app"]
+            ms = lambda s: "-" if s is None else f"{s * 1000:.1f}"
+            app_var.set(f"UI lag p50 {ms(app.get('ui_lag_p50_seconds'))} ms, p99 {ms(app.get('ui_lag_p99_seconds'))} ms, "
+                        f"max {ms(app.get('ui_lag_max_seconds'))} ms | tick {app.get('tick_ms')} ms | "
+                        f"log queue {app.get('log_queue')}")
+            if self.metrics_server:
+                endpoint_button.configure(text="Stop")
+                endpoint_var.set(f"http://{METRICS_HOST}:{self.metrics_server.port}/metrics (and /metrics.json)")
+            else:
+                endpoint_button.configure(text="Start")
+                endpoint_var.set("Endpoint off")
+            win.after(METRICS_INTERVAL_MS, refresh)
+
+        refresh()
+
+    def save_log(self):
+        # Export the whole session from the tab's line index, not the widget
+        tab = self.tab
+        win = tk.Toplevel(self.root)
+        win.title(f"Export - {tab.title}")
+        format_var = tk.StringVar(value="Text")
+        gzip_var = tk.BooleanVar(value=False)
+        pattern_var = tk.StringVar()
+        ignore_case_var = tk.BooleanVar(value=True)
+        kind_var = tk.StringVar(value="All")
+        port_var = tk.StringVar(value="All")
+        from_var = tk.StringVar()
+        to_var = tk.StringVar()
+        progress_var = tk.StringVar(value=f"{len(tab.index):,} lines in this session")
+
+        form = ttk.Frame(win)
+        form.pack(fill=tk.X, padx=5, pady=5)
+        ttk.Label(form, text="Format:").grid(row=0, column=0, sticky=tk.W)
+        ttk.Combobox(form, textvariable=format_var, values=list(EXPORT_FORMATS), state="readonly",
+                     width=10).grid(row=0, column=1, sticky=tk.W, padx=5)
+        ttk.Checkbutton(form, text="gzip", variable=gzip_var).grid(row=0, column=2, sticky=tk.W)
+        ttk.Label(form, text="Regex:").grid(row=1, column=0, sticky=tk.W)
+        ttk.Entry(form, textvariable=pattern_var, width=24).grid(row=1, column=1, sticky=tk.W, padx=5)
+        ttk.Checkbutton(form, text="Ignore case", variable=ignore_case_var).grid(row=1, column=2, sticky=tk.W)
+        ttk.Label(form, text="Direction:").grid(row=2, column=0, sticky=tk.W)
+        ttk.Combobox(form, textvariable=kind_var, values=list(LINE_KINDS), state="readonly",
+                     width=10).grid(row=2, column=1, sticky=tk.W, padx=5)
+        ttk.Label(form, text="Port:").grid(row=2, column=2, sticky=tk.W)
+        ttk.Combobox(form, textvariable=port_var, values=["All"] + tab.index.ports, state="readonly",
+                     width=12).grid(row=2, column=3, sticky=tk.W, padx=5)
+        ttk.Label(form, text="From:").grid(row=3, column=0, sticky=tk.W)
+        ttk.Entry(form, textvariable=from_var, width=20).grid(row=3, column=1, sticky=tk.W, padx=5)
+        ttk.Label(form, text="To:").grid(row=3, column=2, sticky=tk.W)
+        ttk.Entry(form, textvariable=to_var, width=20).grid(row=3, column=3, sticky=tk.W, padx=5)
+        ttk.Label(form, text="Times as HH:MM:SS (today) or YYYY-MM-DD HH:MM:SS, blank for all",
+                  foreground="gray").grid(row=4, column=0, columnspan=4, sticky=tk.W, pady=(2, 0))
+
+        progress = ttk.Progressbar(win, maximum=1000)
+        progress.pack(fill=tk.X, padx=5, pady=(5, 0))
+        ttk.Label(win, textvariable=progress_var, anchor=tk.W).pack(fill=tk.X, padx=5)
+        button_frame = ttk.Frame(win)
+        button_frame.pack(fill=tk.X, padx=5, pady=5)
+        export_button = ttk.Button(button_frame, text="Export")
+        export_button.pack(side=tk.LEFT, padx=5)
+        state = {"exporter": None}
+        updates = Queue()
+
+        def parse_time(text):
+            text = text.strip()
+            if not text:
+                return None
+            if len(text) <= 8:
+                text = f"{datetime.now():%Y-%m-%d} {text}"
+            return datetime.strptime(text, "%Y-%m-%d %H:%M:%S").timestamp()
+
+        def poll(exporter, thread):
+            latest = None
+            while True:
+                try:
+                    latest = updates.get_nowait()
+                except Empty:
+                    break
+            shown = win.winfo_exists()
+            if latest and shown:
+                scanned, total, written = latest
+                progress["value"] = 1000 * scanned // max(total, 1)
+                progress_var.set(f"{scanned:,} of {total:,} lines scanned, {written:,} exported")
+            if thread.is_alive():
+                self.root.after(100, poll, exporter, thread)
+                return
+            state["exporter"] = None
+            if shown:
+                export_button.configure(text="Export")
+            if exporter.error:
+                self.status_var.set(f"Error: Failed to export - {exporter.error}")
+            elif exporter.cancelled.is_set():
+                self.status_var.set("Export cancelled")
+            else:
+                self.log_output(f"[{timestamp()}] Exported {exporter.written:,} lines to {exporter.path}", tab)
+                self.status_var.set(f"Exported to {exporter.path}")
+
+        def export():
+            if state["exporter"]:
+                state["exporter"].cancel()
+                return
+            try:
+                query = LineQuery(pattern_var.get(), ignore_case_var.get(), False,
+                                  LINE_KINDS[kind_var.get()], None if port_var.get() == "All" else port_var.get())
+                start_time, end_time = parse_time(from_var.get()), parse_time(to_var.get())
+            except (re.error, ValueError) as e:
+                progress_var.set(f"Error: {e}")
+                return
+            suffix = EXPORT_FORMATS[format_var.get()] + (".gz" if gzip_var.get() else "")
+            file_path = filedialog.asksaveasfilename(
+                parent=win,
+                defaultextension=suffix,
+                filetypes=[(format_var.get(), "*" + suffix), ("All files", "*.*")],
+                title="Export Session As"
+            )
+            if not file_path:
+                return
+            exporter = SessionExporter(tab.index, file_path, format_var.get(), gzip_var.get(), query,
+                                       start_time, end_time, on_progress=lambda *p: updates.put(p))
+            state["exporter"] = exporter
+            export_button.configure(text="Cancel")
+            thread = threading.Thread(target=exporter.run, name="export", daemon=True)
+            thread.start()
+            poll(exporter, thread)
+
+        def close():
+            if state["exporter"]:
+                state["exporter"].cancel()
+            win.destroy()
+
+        export_button.configure(command=export)
+        win.protocol("WM_DELETE_WINDOW", close)
+
+    def open_log_viewer(self):
+        path = filedialog.askopenfilename(
+            initialdir=app_folder,
+            filetypes=[("Log files", "*.log *.log.*.gz *.txt"), ("Capture files", "*" + CAPTURE_SUFFIX), ("All files", "*.*")],
+            title="Open Log"
+        )
+        if not path:
+            return
+        # Rotated segments of a log are shown with it as one file
+        paths = [path] if path.endswith(CAPTURE_SUFFIX) else log_segments(path)
+        log_view = LogView(paths)
+        win = tk.Toplevel(self.root)
+        win.title(f"Log - {Path(path).name}" + (f" (+{len(paths) - 1} rotated)" if len(paths) > 1 else ""))
+
+        time_var = tk.StringVar()
+        line_var = tk.StringVar()
+        progress_var = tk.StringVar(value="Indexing...")
+
+        nav_frame = ttk.Frame(win)
+        nav_frame.pack(fill=tk.X, padx=5, pady=5)
+        ttk.Label(nav_frame, text="Go to time:").pack(side=tk.LEFT)
+        time_entry = ttk.Entry(nav_frame, textvariable=time_var, width=20)
+        time_entry.pack(side=tk.LEFT, padx=5)
+        ttk.Label(nav_frame, text="Line:").pack(side=tk.LEFT)
+        line_entry = ttk.Entry(nav_frame, textvariable=line_var, width=10)
+        line_entry.pack(side=tk.LEFT, padx=5)
+        ttk.Button(nav_frame, text="Top", command=lambda: view.go_to(0)).pack(side=tk.LEFT, padx=5)
+        ttk.Button(nav_frame, text="End", command=lambda: view.go_to(len(log_view))).pack(side=tk.LEFT, padx=5)
+
+        view = PagedView(win, self.output_font,
+                         lambda top, count: [(f"{n + 1:>9}  ", line) for n, line in
+                                             enumerate(log_view.lines(top, count), start=top)])
+        view.frame.pack(fill=tk.BOTH, expand=True, padx=5)
+        ttk.Label(win, textvariable=progress_var, anchor=tk.W).pack(fill=tk.X, padx=5, pady=5)
+
+        def go_to_time(event=None):
+            # "YYYY-MM-DD HH:MM[:SS]", or just the time on the date shown at the top
+            when = time_var.get().strip()
+            if re.fullmatch(r"\d{1,2}:\d\d(:\d\d)?", when):
+                stamp = log_view.stamp(view.top) if len(log_view) else None
+                if not stamp:
+                    self.status_var.set("Error: No date found at the top of the view")
+                    return
+                hour, rest = when.split(":", 1)
+                when = f"{stamp[:10].decode()} {int(hour):02d}:{rest}"
+            if not re.fullmatch(r"\d{4}-\d\d-\d\d \d\d:\d\d(:\d\d)?", when):
+                self.status_var.set("Error: Enter a time as YYYY-MM-DD HH:MM:SS or HH:MM:SS")
+                return
+            if len(when) == 16:
+                when += ":00"
+            view.go_to(log_view.find_time(when))
+
+        def go_to_line(event=None):
+            try:
+                view.go_to(int(line_var.get()) - 1)
+            except ValueError:
+                self.status_var.set("Error: Enter a line number")
+
+        time_entry.bind("<Return>", go_to_time)
+        line_entry.bind("<Return>", go_to_line)
+
+        def poll():
+            if not win.winfo_exists():
+                return
+            view.render(len(log_view))
+            if log_view.error:
+                progress_var.set(f"Error: {log_view.error}")
+            elif log_view.complete:
+                progress_var.set(f"{len(log_view)} lines")
+                return
+            else:
+                progress_var.set(f"Indexing {log_view.progress():.0%}... {len(log_view)} lines")
+            win.after(200, poll)
+
+        def close():
+            log_view.close()
+            win.destroy()
+
+        win.protocol("WM_DELETE_WINDOW", close)
+        poll()
+
+    def toggle_capture(self):
+        if self.capture:
+            self.stop_capture()
+        else:
+            self.start_capture()
+
+    def start_capture(self):
+        try:
+            self.capture = CaptureWriter(new_capture_path())
+            for tab in self.tabs:
+                if tab.session:
+                    tab.session.capture = self.capture
+            self.capture_button.configure(text="Stop Capture")
+            self.log_output(f"[{timestamp()}] Capturing to {self.capture.path}")
+        except Exception as e:
+            self.capture = None
+            self.log_output(f"[Error] Failed to start capture: {e}")
+            self.status_var.set(f"Error: {e}")
+
+    def stop_capture(self):
+        capture, self.capture = self.capture, None
+        for tab in self.tabs:
+            if tab.session:
+                tab.session.capture = None
+        if capture:
+            capture.close()
+            self.capture_button.configure(text="Start Capture")
+            self.log_output(f"[{timestamp()}] Capture saved to {capture.path} ({capture.records} records)")
+
+    def export_capture_text(self):
+        capture_path = filedialog.askopenfilename(
+            initialdir=CAPTURE_FOLDER,
+            filetypes=[("Capture files", "*.stcap"), ("All files", "*.*")],
+            title="Select Capture"
+        )
+        if not capture_path:
+            return
+        text_path = filedialog.asksaveasfilename(
+            defaultextension=".txt",
+            filetypes=[("Text files", "*.txt"), ("All files", "*.*")],
+            title="Save Text Log As"
+        )
+        if not text_path:
+            return
+        framing = self.framing_var.get()
+
+        def worker():
+            try:
+                capture_to_text(capture_path, text_path, framing)
+                message = f"Capture exported to {text_path}"
+            except Exception as e:
+                message = f"Error: Failed to export capture - {e}"
+            self.root.after(0, self.status_var.set, message)
+
+        threading.Thread(target=worker, daemon=True).start()
+
+    def toggle_replay(self):
+        tab = self.tab
+        if tab.replayer and tab.replayer.is_alive():
+            tab.replayer.stop()
+            return
+        capture_path = filedialog.askopenfilename(
+            initialdir=CAPTURE_FOLDER,
+            filetypes=[("Capture files", "*.stcap"), ("All files", "*.*")],
+            title="Select Capture to Replay"
+        )
+        if not capture_path:
+            return
+        if tab.connected:
+            if not tab.session.port.startswith("loop://"):
+                self.log_output("[Error] Disconnect first or connect to loop:// to replay")
+                return
+            write = tab.session.ser.write
+        else:
+            # Not connected: open a virtual port and connect the terminal to it
+            write = close = None
+            if os.name == "posix":
+                try:
+                    port, write, close = open_pty_pair()
+                except Exception as e:
+                    self.log_output(f"[Error] Failed to open virtual port: {e}")
+                    return
+            else:
+                port = "loop://"
+            self.port_var.set(port)
+            self.connect(tab)
+            if not tab.connected:
+                if close:
+                    close()
+                return
+            if write is None:
+                # loop:// hands back whatever is written to it
+                write = tab.session.ser.write
+            tab.virtual_port_close = close
+        speed = REPLAY_SPEEDS.get(self.replay_speed_var.get(), 1.0)
+        tab.replayer = CaptureReplayer(
+            capture_path, write, speed=speed,
+            backlog=tab.response_queue.qsize,
+            on_done=lambda r: self.root.after(0, self.replay_finished, tab, r)
+        )
+        tab.replayer.start()
+        self.replay_button.configure(text="Stop Replay")
+        self.log_output(f"[{timestamp()}] Replaying {capture_path} at {self.replay_speed_var.get()}", tab)
+
+    def replay_finished(self, tab, replayer):
+        self.replay_button.configure(text="Replay")
+        self.log_output(f"[{timestamp()}] [Replay] {replayer.summary()}", tab)
+
+    def show_remote_server(self):
+        tab = self.tab
+        win = tk.Toplevel(self.root)
+        win.title(f"Remote Monitoring - {tab.title}")
+
+        settings_frame = ttk.Frame(win)
+        settings_frame.pack(fill=tk.X, padx=5, pady=5)
+        ttk.Label(settings_frame, text="TCP port:").grid(row=0, column=0, sticky=tk.W, padx=5, pady=2)
+        ttk.Entry(settings_frame, textvariable=self.server_port_var, width=8).grid(row=0, column=1, sticky=tk.W, padx=5, pady=2)
+        ttk.Checkbutton(settings_frame, text="Telnet (off: raw TCP)", variable=self.server_telnet_var).grid(row=0, column=2, sticky=tk.W, padx=5)
+        ttk.Label(settings_frame, text="Listen on:").grid(row=1, column=0, sticky=tk.W, padx=5, pady=2)
+        ttk.Combobox(settings_frame, textvariable=self.server_host_var, values=SERVER_HOSTS,
+                     width=14).grid(row=1, column=1, columnspan=2, sticky=tk.W, padx=5, pady=2)
+        ttk.Checkbutton(settings_frame, text="Allow writing (client picked below)", variable=self.server_write_var).grid(row=2, column=0, columnspan=2, sticky=tk.W, padx=5)
+        ttk.Checkbutton(settings_frame, text="Replay scrollback to new clients", variable=self.server_replay_var).grid(row=2, column=2, sticky=tk.W, padx=5)
+        ttk.Label(settings_frame, text="Slow client:").grid(row=3, column=0, sticky=tk.W, padx=5, pady=2)
+        ttk.Combobox(settings_frame, textvariable=self.server_overflow_var, values=list(SERVER_OVERFLOW),
+                     state="readonly", width=12).grid(row=3, column=1, columnspan=2, sticky=tk.W, padx=5, pady=2)
+
+        toggle_button = ttk.Button(settings_frame, text="Stop" if tab.server else "Start")
+        toggle_button.grid(row=4, column=0, columnspan=3, pady=5)
+
+        def toggle():
+            if tab.server:
+                tab.server.stop()
+                tab.server = None
+                self.log_output(f"[{timestamp()}] Remote monitoring stopped", tab)
+                toggle_button.configure(text="Start")
+                return
+            try:
+                server = StreamServer(
+                    int(self.server_port_var.get()),
+                    host=self.server_host_var.get().strip() or SERVER_HOST,
+                    telnet=self.server_telnet_var.get(),
+                    allow_write=self.server_write_var.get(),
+                    replay=self.server_replay_var.get(),
+                    overflow=SERVER_OVERFLOW[self.server_overflow_var.get()],
+                )
+                server.start(tab.session if tab.connected else None)
+            except Exception as e:
+                self.status_var.set(f"Error: Remote monitoring failed - {e}")
+                return
+            tab.server = server
+            self.log_output(f"[{timestamp()}] Remote monitoring on {server.name}", tab)
+            toggle_button.configure(text="Stop")
+
+        toggle_button.configure(command=toggle)
+
+        columns = ("state", "bytes", "buffered", "drops", "dropped_bytes")
+        tree = ttk.Treeview(win, columns=columns, height=10)
+        tree.heading("#0", text="Client")
+        tree.column("#0", width=200)
+        for col in columns:
+            tree.heading(col, text=col.replace("drops", "skips").replace("_", " "))
+            tree.column(col, width=80, anchor=tk.E)
+        tree.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+        self.add_write_lock_buttons(win, tree, lambda: [tab.server] if tab.server else [])
+
+        def refresh():
+            if not win.winfo_exists():
+                return
+            selected = {tree.item(item, "text") for item in tree.selection()}
+            tree.delete(*tree.get_children())
+            if tab.server:
+                for row in tab.server.stats():
+                    item = tree.insert("", tk.END, text=row["name"], values=[row[c] for c in columns])
+                    if row["name"] in selected:
+                        tree.selection_add(item)
+            win.after(1000, refresh)
+
+        refresh()
+
+    def add_write_lock_buttons(self, win, tree, servers):
+        # Give or take the write lock of the client selected in `tree`, whose
+        # rows are named as in StreamServer.stats(); servers() lists the servers
+        def grant(give):
+            selected = {tree.item(item, "text") for item in tree.selection()}
+            for server in servers():
+                for row in server.stats():
+                    if row["name"] in selected and "client" in row:
+                        if give and not server.allow_write:
+                            self.status_var.set(f"Error: Writing is off for {server.name}")
+                            return
+                        server.grant_write(row["client"] if give else None)
+                        return
+
+        buttons = ttk.Frame(win)
+        buttons.pack(fill=tk.X, padx=5, pady=(0, 5))
+        ttk.Button(buttons, text="Give write lock", command=lambda: grant(True)).pack(side=tk.LEFT)
+        ttk.Button(buttons, text="Take write lock", command=lambda: grant(False)).pack(side=tk.LEFT, padx=5)
+
+    def show_latency_stats(self):
+        tab = self.tab
+        correlator = tab.correlator
+        win = tk.Toplevel(self.root)
+        win.title(f"Command Latency - {tab.title}")
+
+        rules_frame = ttk.Frame(win)
+        rules_frame.pack(fill=tk.X, padx=5, pady=5)
+        ttk.Label(rules_frame, text="Response end pattern:").pack(side=tk.LEFT)
+        pattern_var = tk.StringVar(value=correlator.pattern.pattern if correlator.pattern else "")
+        ttk.Entry(rules_frame, textvariable=pattern_var, width=25).pack(side=tk.LEFT, padx=5)
+        ttk.Label(rules_frame, text="Timeout (s):").pack(side=tk.LEFT)
+        timeout_var = tk.StringVar(value=str(correlator.timeout_ns / 1e9))
+        ttk.Entry(rules_frame, textvariable=timeout_var, width=6).pack(side=tk.LEFT, padx=5)
+
+        def apply_rules():
+            try:
+                correlator.set_rules(pattern_var.get(), timeout_var.get())
+                self.status_var.set("Response rules updated")
+            except (re.error, ValueError) as e:
+                self.status_var.set(f"Error: Invalid response rule - {e}")
+
+        ttk.Button(rules_frame, text="Apply", command=apply_rules).pack(side=tk.LEFT, padx=5)
+
+        columns = ("count", "timeouts", "min_ms", "p50_ms", "p95_ms", "p99_ms", "max_ms")
+        tree = ttk.Treeview(win, columns=columns, height=12)
+        tree.heading("#0", text="Command")
+        tree.column("#0", width=180)
+        for col in columns:
+            tree.heading(col, text=col.replace("_ms", " (ms)"))
+            tree.column(col, width=75, anchor=tk.E)
+        tree.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+
+        button_frame = ttk.Frame(win)
+        button_frame.pack(fill=tk.X, padx=5, pady=5)
+        ttk.Button(button_frame, text="Export CSV",
+                   command=lambda: self.export_latency_stats(correlator)).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="Reset", command=correlator.reset_stats).pack(side=tk.LEFT, padx=5)
+
+        def refresh():
+            if not win.winfo_exists():
+                return
+            tree.delete(*tree.get_children())
+            for command, summary in sorted(correlator.summaries().items()):
+                tree.insert("", tk.END, text=command, values=[summary[c] for c in columns])
+            win.after(1000, refresh)
+
+        refresh()
+
+    def export_latency_stats(self, correlator):
+        file_path = filedialog.asksaveasfilename(
+            defaultextension=".csv",
+            filetypes=[("CSV files", "*.csv"), ("All files", "*.*")],
+            title="Export Latency Stats"
+        )
+        if file_path:
+            try:
+                correlator.export_csv(file_path)
+                self.status_var.set(f"Latency stats saved to {file_path}")
+            except Exception as e:
+                self.status_var.set(f"Error: Failed to export stats - {e}")
+
+    def log_output(self, text, tab=None):
+        # If text already has timestamp pattern at start, don't add again
+        if re.match(r"^\[\d{2}:\d{2}:\d{2}\]", text):
+            line = text
+        else:
+            timestamp = datetime.now().strftime("%H:%M:%S")
+            line = f"[{timestamp}] {text}"
+        
+        if self.tabs:
+            self.append_output([line], tab)
+        self.write_log(line)
+
+    def write_log(self, line):
+        try:
+            logger.info(line)
+        except Exception as e:
+            print(f"[Error writing log] {e}")
+
+    def append_output(self, lines, tab=None, styles=(), partial=None, commands=None):
+        # One insert per batch, keep the widget bounded and only follow the
+        # end when the user hasn't scrolled up. `partial` (line, offset, spans)
+        # is shown after the lines and replaced by the next call.
+        tab = tab or self.tab
+        text = tab.output_text
+        at_bottom = text.yview()[1] >= 0.999
+        text.configure(state='normal')
+        if tab.partial_shown:
+            text.delete("partial", "end-1c")
+            tab.partial_shown = False
+        if lines:
+            tab.index.append(lines, tab.title, commands)
+            first_new = int(text.index("end-1c").split(".")[0])
+            text.insert(tk.END, "\n".join(lines) + "\n")
+            if styles:
+                self.apply_styles(tab, first_new, styles)
+            if tab.highlight:
+                self.highlight_lines(tab, first_new, lines)
+        if partial:
+            line, offset, spans = partial
+            row = int(text.index("end-1c").split(".")[0])
+            text.mark_set("partial", "end-1c")
+            text.mark_gravity("partial", tk.LEFT)
+            text.insert(tk.END, line)
+            self.apply_styles(tab, row, [(0, offset, spans)])
+            tab.partial_shown = True
+        line_count = int(text.index("end-1c").split(".")[0])
+        if line_count > MAX_OUTPUT_LINES + TRIM_CHUNK_LINES:
+            trim_to = line_count - MAX_OUTPUT_LINES
+            text.delete("1.0", f"{trim_to}.0")
+            tab.widget_first += trim_to - 1
+        text.configure(state='disabled')
+        if at_bottom:
+            text.see(tk.END)
+
+    def clear_output(self):
+        # Only the view is cleared; the line index keeps the session searchable
+        output_text = self.tab.output_text
+        output_text.configure(state='normal')
+        output_text.delete(1.0, tk.END)
+        output_text.configure(state='disabled')
+        self.tab.widget_first = len(self.tab.index)
+        self.tab.partial_shown = False
+
+    def apply_styles(self, tab, first_line, styles):
+        # Collect every range per tag and add each tag once for the batch
+        ranges = {}
+        for row, offset, spans in styles:
+            line = first_line + row
+            for start, end, tag in spans:
+                ranges.setdefault(tag, []).extend((f"{line}.{offset + start}", f"{line}.{offset + end}"))
+        text = tab.output_text
+        for tag, indexes in ranges.items():
+            if tag not in tab.ansi_tags:
+                if tag == "bold":
+                    text.tag_configure(tag, font=tab.font + ("bold",))
+                elif tag == "underline":
+                    text.tag_configure(tag, underline=True)
+                elif tag.startswith("fg"):
+                    text.tag_configure(tag, foreground=tag[2:])
+                else:
+                    text.tag_configure(tag, background=tag[2:])
+                text.tag_lower(tag)  # search highlights stay on top
+                tab.ansi_tags.add(tag)
+            text.tag_add(tag, *indexes)
+
+    def highlight_lines(self, tab, first_line, lines):
+        text = tab.output_text
+        regex = tab.highlight
+        tagged = 0
+        for i, line in enumerate(lines):
+            for m in regex.finditer(line):
+                if m.end() > m.start():
+                    text.tag_add("match", f"{first_line + i}.{m.start()}", f"{first_line + i}.{m.end()}")
+                    tagged += 1
+            if tagged >= MAX_HIGHLIGHTS:
+                break
+
+    def set_highlight(self, tab, regex):
+        text = tab.output_text
+        text.tag_remove("match", "1.0", tk.END)
+        text.tag_remove("found", "1.0", tk.END)
+        tab.highlight = regex
+        if regex:
+            # Highlight the tail of the view now, new lines as they arrive
+            line_count = int(text.index("end-1c").split(".")[0])
+            first = max(1, line_count - MAX_HIGHLIGHTS)
+            self.highlight_lines(tab, first, text.get(f"{first}.0", "end-1c").split("\n"))
+
+    def show_search(self):
+        tab = self.tab
+        win = tk.Toplevel(self.root)
+        win.title(f"Search - {tab.title}")
+
+        pattern_var = tk.StringVar()
+        ignore_case_var = tk.BooleanVar(value=True)
+        invert_var = tk.BooleanVar(value=False)
+        kind_var = tk.StringVar(value="All")
+        port_var = tk.StringVar(value="All")
+        follow_var = tk.BooleanVar(value=True)
+        count_var = tk.StringVar(value="")
+
+        query_frame = ttk.Frame(win)
+        query_frame.pack(fill=tk.X, padx=5, pady=5)
+        ttk.Label(query_frame, text="Regex:").pack(side=tk.LEFT)
+        pattern_entry = ttk.Entry(query_frame, textvariable=pattern_var, width=30)
+        pattern_entry.pack(side=tk.LEFT, padx=5)
+        ttk.Checkbutton(query_frame, text="Ignore case", variable=ignore_case_var).pack(side=tk.LEFT)
+        ttk.Checkbutton(query_frame, text="Invert", variable=invert_var).pack(side=tk.LEFT)
+        ttk.Label(query_frame, text="Direction:").pack(side=tk.LEFT, padx=(5, 0))
+        ttk.Combobox(query_frame, textvariable=kind_var, values=list(LINE_KINDS),
+                     state="readonly", width=5).pack(side=tk.LEFT, padx=5)
+        ttk.Label(query_frame, text="Port:").pack(side=tk.LEFT)
+        port_menu = ttk.Combobox(query_frame, textvariable=port_var, state="readonly", width=12)
+        port_menu.pack(side=tk.LEFT, padx=5)
+        ttk.Button(query_frame, text="Search", command=lambda: apply()).pack(side=tk.LEFT, padx=5)
+        ttk.Checkbutton(query_frame, text="Follow", variable=follow_var).pack(side=tk.LEFT)
+
+        # Only the visible page of matches is read back from the index
+        results = array("I")
+        state = {"query": None, "done": 0, "busy": False, "generation": 0}
+        done_queue = Queue()
+
+        def fetch(top, count):
+            numbers = results[top:top + count]
+            return [(f"{n + 1:>9}  ", line) for n, line in zip(numbers, tab.index.read_lines(numbers))]
+
+        view = PagedView(win, self.output_font, fetch)
+        view.frame.pack(fill=tk.BOTH, expand=True, padx=5)
+        view.on_scroll = lambda: follow_var.set(False)
+        ttk.Label(win, textvariable=count_var, anchor=tk.W).pack(fill=tk.X, padx=5, pady=5)
+
+        def jump(event):
+            # Show the clicked line in the tab's output if it is still there
+            n = view.row_at(event)
+            if n is None:
+                return
+            widget_line = results[n] - tab.widget_first + 1
+            text = tab.output_text
+            if widget_line < 1 or tab not in self.tabs:
+                self.status_var.set("Line is no longer in the output view")
+                return
+            self.notebook.select(tab.frame)
+            text.tag_remove("found", "1.0", tk.END)
+            text.tag_add("found", f"{widget_line}.0", f"{widget_line}.end")
+            text.see(f"{widget_line}.0")
+
+        view.text.bind("<Double-Button-1>", jump)
+
+        def run_search(query, start, stop, generation):
+            try:
+                found = tab.index.search(query, start, stop)
+            except Exception as e:
+                found = e
+            done_queue.put((generation, stop, found))
+
+        def kick():
+            # Search whatever arrived since the last pass, one pass at a time
+            stop = len(tab.index)
+            if state["busy"] or state["query"] is None or stop <= state["done"]:
+                return
+            state["busy"] = True
+            threading.Thread(target=run_search, args=(state["query"], state["done"], stop, state["generation"]),
+                             name="search", daemon=True).start()
+
+        def apply():
+            try:
+                query = LineQuery(pattern_var.get(), ignore_case_var.get(), invert_var.get(),
+                                  LINE_KINDS[kind_var.get()], None if port_var.get() == "All" else port_var.get())
+            except re.error as e:
+                self.status_var.set(f"Error: Invalid search pattern - {e}")
+                return
+            state.update(query=query, done=0, generation=state["generation"] + 1)
+            del results[:]
+            view.regex = query.text_regex if not query.invert else None
+            view.top = 0
+            if tab in self.tabs:
+                self.set_highlight(tab, view.regex)
+            view.render(0)
+            kick()
+
+        def poll():
+            if not win.winfo_exists():
+                return
+            if tab not in self.tabs:
+                win.destroy()
+                return
+            try:
+                while True:
+                    generation, stop, found = done_queue.get_nowait()
+                    state["busy"] = False
+                    if generation != state["generation"]:
+                        continue
+                    if isinstance(found, Exception):
+                        self.status_var.set(f"Error: Search failed - {found}")
+                        state["query"] = None
+                        continue
+                    results.extend(found)
+                    state["done"] = stop
+                    if follow_var.get():
+                        view.top = len(results)
+                    view.render(len(results))
+            except Empty:
+                pass
+            kick()
+            port_menu["values"] = ["All"] + tab.index.ports
+            count_var.set(f"{len(results)} matching lines, {state['done']} of {len(tab.index)} lines searched")
+            win.after(500, poll)
+
+        def close():
+            if tab in self.tabs:
+                self.set_highlight(tab, None)
+            win.destroy()
+
+        win.protocol("WM_DELETE_WINDOW", close)
+        pattern_entry.bind("<Return>", lambda event: apply())
+        pattern_entry.focus()
+        poll()
+
+    def start_routing(self):
+        if self.router:
+            self.log_output("[Info] Routing is already running.")
+            return
+        source_port = self.com_source.get().strip()
+        if not source_port or source_port == "No ports found":
+            self.log_output("[Error] Source port not selected.")
+            return
+        baudrate = int(self.baud_var.get())
+        policy = self.route_policy_var.get()
+        bidirectional = self.route_bidir_var.get()
+        source = router = None
+        owns_source = False
+        try:
+            # Share the source with a tab that already has it open
+            tab = next((t for t in self.tabs if t.connected and t.session.port == source_port), None)
+            if tab:
+                source, owns_source = tab.session, False
+            else:
+                source = SerialSession(source_port, baudrate=baudrate, parity=self.parity_var.get(),
+                                       flow=self.flow_var.get(),
+                                       on_error=lambda e: self.root.after(0, self.log_output, f"[Routing Error] {e}"))
+                source.consume = False
+                source.open()
+                owns_source = True
+            router = Router(source, owns_source, bidirectional)
+            for var in (self.com_dest1, self.com_dest2):
+                port = var.get().strip()
+                if port and port != source_port:
+                    router.add_sink(SerialRouteSink(port, baudrate, bidirectional, policy=policy))
+            tcp_port = self.route_tcp_var.get().strip()
+            if tcp_port:
+                # Remote clients are never allowed to hold up the source
+                router.add_listener(StreamServer(int(tcp_port), host=self.route_host_var.get().strip() or SERVER_HOST,
+                                                 allow_write=self.route_tcp_write_var.get(),
+                                                 overflow="drop" if policy == "disconnect" else "skip"))
+            if self.route_file_var.get():
+                name = f"route_{Path(source_port).name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.bin"
+                router.add_sink(FileRouteSink(ROUTE_FOLDER / name, policy=policy))
+        except Exception as e:
+            if router:
+                router.stop()
+            elif owns_source:
+                source.close()
+            self.log_output(f"[Error] Failed to start routing: {e}")
+            self.status_var.set(f"Error: {e}")
+            return
+        if not router.sinks and not router.listeners:
+            for sink in router.closed_sinks:
+                self.log_output(f"[Error] {sink.name}: {sink.error}")
+            router.stop()
+            self.log_output("[Error] At least one destination is required.")
+            return
+        for sink in router.closed_sinks:
+            self.log_output(f"[Error] {sink.name}: {sink.error}")
+        router.start()
+        self.router = router
+        self.log_output(f"[Info] Routing {source_port} at {baudrate} baud to "
+                        f"{', '.join(s.name for s in router.sinks + router.listeners)}")
+        self.status_var.set("Routing started")
+        self.refresh_routing()
+
+    def stop_routing(self):
+        router, self.router = self.router, None
+        if router:
+            router.stop()
+            self.log_output("[Info] Routing stopped.")
+            self.status_var.set("Routing stopped")
+        self.update_routing_led("failed")
+
+    def refresh_routing(self):
+        # LED reflects route health, not just whether routing was started
+        if not self.router:
+            return
+        self.update_routing_led(self.router.health())
+        self.root.after(1000, self.refresh_routing)
+
+    def show_route_stats(self):
+        win = tk.Toplevel(self.root)
+        win.title("Route Stats")
+        columns = ("state", "rate", "bytes", "buffered", "drops", "dropped_bytes")
+        tree = ttk.Treeview(win, columns=columns, height=10)
+        tree.heading("#0", text="Destination")
+        tree.column("#0", width=180)
+        for col in columns:
+            tree.heading(col, text=col.replace("_", " ").replace("rate", "bytes/s"))
+            tree.column(col, width=90, anchor=tk.E)
+        tree.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+        self.add_write_lock_buttons(win, tree, lambda: self.router.listeners if self.router else [])
+        summary_var = tk.StringVar()
+        ttk.Label(win, textvariable=summary_var, anchor=tk.W).pack(fill=tk.X, padx=5, pady=5)
+        last = {}
+
+        def refresh():
+            if not win.winfo_exists():
+                return
+            selected = {tree.item(item, "text") for item in tree.selection()}
+            tree.delete(*tree.get_children())
+            router = self.router
+            if router:
+                now = time.monotonic()
+                for row in router.stats():
+                    prev = last.get(row["name"])
+                    rate = (row["bytes"] - prev[1]) / (now - prev[0]) if prev else 0
+                    last[row["name"]] = (now, row["bytes"])
+                    row["rate"] = f"{rate:.0f}"
+                    item = tree.insert("", tk.END, text=row["name"], values=[row[c] for c in columns])
+                    if row["name"] in selected:
+                        tree.selection_add(item)
+                summary_var.set(f"{router.source.port}: {router.bytes_in} bytes in, "
+                                f"{router.bytes_up} bytes upstream, {router.upstream_drops} upstream drops "
+                                f"- {router.health()}")
+            else:
+                summary_var.set("Routing stopped")
+            win.after(1000, refresh)
+
+        refresh()
+
+    def update_routing_led(self, health):
+        self.led_label.config(fg={"ok": "green", "degraded": "orange"}.get(health, "red"))
+
+    def send_commands_from_file(self):
+        if self.tab.batch:
+            self.tab.batch.abort()
+            return
+        file_path = filedialog.askopenfilename(
+            filetypes=[("Text Files", "*.txt")],
+            title="Select Command File"
+        )
+        if file_path:
+            self.show_batch_settings(file_path)
+
+    def show_batch_settings(self, file_path):
+        win = tk.Toplevel(self.root)
+        win.title("Send File")
+        win.transient(self.root)
+        fields = [
+            ("Mode:", self.batch_mode_var, list(BATCH_MODES)),
+            ("Window (commands):", self.batch_window_var, None),
+            ("Interval (s):", self.batch_interval_var, None),
+            ("Step timeout (s):", self.batch_timeout_var, None),
+            ("Retries:", self.batch_retries_var, None),
+            ("Error pattern:", self.batch_error_var, None),
+            ("Abort pattern:", self.batch_abort_var, None),
+        ]
+        for row, (label, var, values) in enumerate(fields):
+            ttk.Label(win, text=label).grid(row=row, column=0, sticky=tk.W, padx=5, pady=2)
+            if values:
+                widget = ttk.Combobox(win, textvariable=var, values=values, state="readonly", width=20)
+            else:
+                widget = ttk.Entry(win, textvariable=var, width=23)
+            widget.grid(row=row, column=1, padx=5, pady=2)
+
+        def start():
+            # Settings are read here, on the Tk thread, and handed over as plain values
+            win.destroy()
+            tab = self.tab
+            if not tab.connected:
+                self.log_output("[Error] Not connected", tab)
+                self.status_var.set("Error: Not connected")
+                return
+            settings = {
+                "mode": BATCH_MODES[self.batch_mode_var.get()],
+                "window": self.batch_window_var.get(),
+                "interval": self.batch_interval_var.get(),
+                "step_timeout": self.batch_timeout_var.get(),
+                "retries": self.batch_retries_var.get(),
+                "error_pattern": self.batch_error_var.get(),
+                "abort_pattern": self.batch_abort_var.get(),
+            }
+            threading.Thread(
+                target=self._send_file_commands_thread,
+                args=(file_path, tab, settings),
+                daemon=True
+            ).start()
+
+        ttk.Button(win, text="Start", command=start).grid(row=len(fields), column=0, columnspan=2, pady=5)
+
+    def _send_file_commands_thread(self, file_path, tab, settings):
+        # Runs off the Tk thread: `settings` holds the BatchExecutor options read
+        # by show_batch_settings, output and status go through tab.send_events
+        def log(text):
+            tab.send_events.put(("log", f"[{timestamp()}] {text}"))
+
+        def status(text):
+            tab.send_events.put(("status", text))
+
+        try:
+            with open(file_path, "r", encoding="utf-8") as f:
+                lines = f.readlines()
+            commands = []
+            for line in lines:
+                cmd = line.strip()
+                if not cmd or cmd.startswith("#"):  # Allow comments
+                    continue
+                commands.append(cmd)
+
+            def send(cmd):
+                entry = self.transmit((cmd + '\r\n').encode(), cmd, block=True, tab=tab)
+                log(f">> {cmd}")
+                return entry
+
+            def progress(done, total, rate, eta):
+                eta_text = f"{eta:.0f}s" if eta is not None else "?"
+                status(f"File: {done}/{total} commands, {rate:.1f} cmd/s, ETA {eta_text}")
+
+            batch = tab.batch = BatchExecutor(commands, send, tab.correlator, on_progress=progress, **settings)
+            self.root.after(0, self.send_file_button.configure, {"text": "Stop File"})
+            batch.run()
+
+            REPORT_FOLDER.mkdir(parents=True, exist_ok=True)
+            report_path = REPORT_FOLDER / f"batch_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
+            batch.write_report(report_path)
+            counts = ", ".join(f"{n} {state}" for state, n in sorted(batch.counts().items()))
+            if batch.abort_reason:
+                log(f"[Info] File send aborted: {batch.abort_reason}")
+            log(f"[Info] File send finished: {counts}. Report: {report_path}")
+            status("Finished sending file commands.")
+        except Exception as e:
+            log(f"[Error] Failed to send file: {e}")
+            status(f"Error: {e}")
+        finally:
+            tab.batch = None
+            self.root.after(0, self.send_file_button.configure, {"text": "Send File"})
+
+    def run(self):
+        self.root.mainloop()
+
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description="Serial Terminal")
+    parser.add_argument("--multi-instance", action="store_true",
+                        help="allow more than one copy to run at the same time")
+    parser.add_argument("--profile-startup", action="store_true",
+                        help="print the time spent in each startup phase")
+    args = parser.parse_args(argv)
+    profile = StartupProfile(args.profile_startup)
+    init_logging()
+
+    instance = SingleInstance()
+    if not args.multi_instance and not instance.acquire():
+        print("Another instance is already running.")
+        sys.exit(0)
+    atexit.register(instance.release)
+    profile.mark("instance lock")
+
+    root = tk.Tk()
+    icon_path = app_folder / "app_icon.ico"
+    try:
+        root.iconbitmap(icon_path)  # Replace with icon path
+    except Exception as e:
+        print(f"Failed to set icon: {e}")
+    profile.mark("create root")
+    app = SerialTerminal(root, profile)
+    app.run()
+
+
+if __name__ == "__main__":
+    main()
+
@@ -0,0 +1,24 @@
+from serialterminal import AnsiTerminal
+
+
+def test_lone_escape_before_control_byte_is_dropped():
+    terminal = AnsiTerminal()
+    lines, partial = terminal.feed(b"first\x1b\nnext line\r\nmore\r\n\x1b[31mred\x1b[0m\r\n")
+    assert lines == ["first", "next line", "more", "red"]
+    assert lines[3].spans and partial is None
+    assert terminal.pending == ""
+
+
+def test_sequences_cut_at_the_end_of_a_read_wait_for_the_rest():
+    terminal = AnsiTerminal()
+    for head, tail in ((b"a\x1b", b"[1mb\n"), (b"a\x1b[3", b"1mb\n"), (b"a\x1b]0;title", b"\x07b\n"),
+                       (b"a\x1b]0;title\x1b", b"\\b\n")):
+        assert terminal.feed(head)[0] == []
+        assert terminal.pending.startswith("\x1b")
+        assert terminal.feed(tail)[0] == ["ab"]
+
+
+def test_broken_csi_does_not_hold_later_lines():
+    terminal = AnsiTerminal()
+    lines, _ = terminal.feed(b"x\x1b[12\nlater\n")
+    assert lines == ["x[12", "later"]
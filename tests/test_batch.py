@@ -0,0 +1,103 @@
+import csv
+import threading
+import time
+
+import pytest
+
+from serialterminal import BatchExecutor, CommandCorrelator
+
+
+class Device:
+    # Answers each command through the correlator after `delay`, like a port's reader
+    def __init__(self, correlator, replies=None, delay=0.001):
+        self.correlator = correlator
+        self.replies = replies or {}
+        self.delay = delay
+        self.sent = []
+        self.max_outstanding = 0
+
+    def send(self, command):
+        entry = self.correlator.sent(command)
+        self.sent.append(command)
+        self.max_outstanding = max(self.max_outstanding, self.correlator.outstanding())
+        reply = self.replies.get(command, "OK")
+        if isinstance(reply, list):
+            reply = reply.pop(0) if len(reply) > 1 else reply[0]
+        if reply is not None:
+            threading.Timer(self.delay, self.correlator.on_line, (reply,)).start()
+        return entry
+
+
+def run(commands, replies=None, delay=0.001, **options):
+    correlator = CommandCorrelator(timeout=10)
+    device = Device(correlator, replies, delay)
+    batch = BatchExecutor(commands, device.send, correlator, **options)
+    batch.run()
+    return batch, device
+
+
+def test_response_mode_sends_one_at_a_time_in_order():
+    batch, device = run([f"C{n}" for n in range(20)])
+    assert device.sent == [f"C{n}" for n in range(20)]
+    assert device.max_outstanding == 1
+    assert batch.counts() == {"ok": 20}
+    assert all(r.response == "OK" and r.latency_ns > 0 for r in batch.results)
+
+
+def test_window_mode_keeps_several_outstanding():
+    batch, device = run([f"C{n}" for n in range(40)], delay=0.02, mode="window", window=4)
+    assert batch.counts() == {"ok": 40}
+    assert 2 <= device.max_outstanding <= 4
+
+
+def test_rate_mode_spaces_commands_on_fixed_deadlines():
+    start = time.monotonic()
+    batch, device = run(["A", "B", "C", "D"], mode="rate", interval=0.05)
+    elapsed = time.monotonic() - start
+    assert batch.counts() == {"ok": 4}
+    assert 0.15 <= elapsed < 0.5
+
+
+def test_error_responses_are_retried_then_reported():
+    batch, device = run(["A", "B"], {"A": ["ERROR", "OK"], "B": ["ERROR"]},
+                        retries=1, error_pattern="^ERROR")
+    assert device.sent == ["A", "A", "B", "B"]
+    assert [(r.status, r.attempts) for r in batch.results] == [("ok", 2), ("error", 2)]
+
+
+def test_step_timeout():
+    batch, device = run(["A", "B"], {"A": None}, step_timeout=0.05)
+    assert [r.status for r in batch.results] == ["timeout", "ok"]
+    assert batch.correlator.outstanding() == 0
+
+
+def test_abort_pattern_stops_the_batch():
+    batch, device = run(["A", "B", "C"], {"B": "FATAL"}, abort_pattern="FATAL")
+    assert device.sent == ["A", "B"]
+    assert [r.status for r in batch.results] == ["ok", "error", "aborted"]
+    assert "Abort pattern" in batch.abort_reason
+
+
+def test_abort_from_another_thread():
+    correlator = CommandCorrelator()
+    device = Device(correlator, {"A": None})
+    batch = BatchExecutor(["A", "B"], device.send, correlator, step_timeout=30)
+    threading.Timer(0.05, batch.abort).start()
+    batch.run()
+    assert [r.status for r in batch.results] == ["aborted", "aborted"]
+    assert correlator.outstanding() == 0
+
+
+def test_progress_and_report(tmp_path):
+    progress = []
+    batch, device = run(["A", "B"], on_progress=lambda *args: progress.append(args[:2]))
+    assert progress[-1] == (2, 2)
+    path = tmp_path / "report.csv"
+    batch.write_report(path)
+    rows = list(csv.DictReader(open(path, newline="")))
+    assert [(r["index"], r["command"], r["status"]) for r in rows] == [("1", "A", "ok"), ("2", "B", "ok")]
+
+
+def test_unknown_mode_is_rejected():
+    with pytest.raises(ValueError):
+        BatchExecutor([], None, CommandCorrelator(), mode="burst")
@@ -0,0 +1,67 @@
+from serialterminal import (CAPTURE_INDEX_BYTES, CAPTURE_RX, CAPTURE_TX, CAPTURE_NOTE, CaptureReader,
+                            CaptureWriter, capture_to_text)
+
+
+def write_capture(path, records):
+    writer = CaptureWriter(path)
+    for record in records:
+        writer.write(*record)
+    writer.close()
+    return writer
+
+
+def test_records_round_trip_with_ports_and_timestamps(tmp_path):
+    path = tmp_path / "session.stcap"
+    records = [(CAPTURE_RX, "COM1", b"hello\r\n", 1000),
+               (CAPTURE_TX, "COM2", b"AT\r\n", 2000),
+               (CAPTURE_RX, "COM1", b"", 3000),
+               (CAPTURE_NOTE, "COM2", b"port lost", 4000)]
+    write_capture(path, records)
+    reader = CaptureReader(path)
+    assert list(reader.records()) == [(ts, d, port, data) for d, port, data, ts in records]
+    assert sorted(reader.ports.values()) == ["COM1", "COM2"]
+    reader.close()
+
+
+def test_time_bounds_seek_through_the_index(tmp_path):
+    path = tmp_path / "session.stcap"
+    chunk = b"x" * (CAPTURE_INDEX_BYTES // 4)
+    write_capture(path, [(CAPTURE_RX, "COM1", chunk, n * 1000) for n in range(40)])
+    reader = CaptureReader(path)
+    assert len(reader.index_offsets) > 5
+    assert reader.offset_for(25_000) > reader.offset_for(5_000)
+    assert [r[0] for r in reader.records(20_000, 22_000)] == [20_000, 21_000, 22_000]
+    reader.close()
+
+
+def test_truncated_tail_is_ignored(tmp_path):
+    path = tmp_path / "session.stcap"
+    write_capture(path, [(CAPTURE_RX, "COM1", b"one", 1), (CAPTURE_RX, "COM1", b"two", 2)])
+    data = path.read_bytes()
+    path.write_bytes(data[:-2])
+    reader = CaptureReader(path)
+    assert [r[3] for r in reader.records()] == [b"one"]
+    reader.close()
+
+
+def test_reader_rejects_other_files(tmp_path):
+    path = tmp_path / "not.stcap"
+    path.write_bytes(b"x" * 64)
+    try:
+        CaptureReader(path)
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("expected ValueError")
+
+
+def test_capture_to_text_frames_rx_per_port(tmp_path):
+    path = tmp_path / "session.stcap"
+    write_capture(path, [(CAPTURE_RX, "COM1", b"temp=2", 1),
+                         (CAPTURE_RX, "COM2", b"ok\r\n", 2),
+                         (CAPTURE_RX, "COM1", b"1\r\n", 3),
+                         (CAPTURE_TX, "COM1", b"read\r\n", 4)])
+    text_path = tmp_path / "session.txt"
+    capture_to_text(path, text_path)
+    lines = [line.split("] ", 1)[1] for line in text_path.read_text().splitlines()]
+    assert lines == ["COM2 << ok", "COM1 << temp=21", "COM1 >> read"]
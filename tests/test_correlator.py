@@ -0,0 +1,86 @@
+import csv
+
+from serialterminal import UNKNOWN_COMMAND, CommandCorrelator, LatencyHistogram
+
+MS = 1_000_000
+
+
+def test_first_line_completes_a_command_without_a_pattern():
+    correlator = CommandCorrelator()
+    entry = correlator.sent("AT", 0)
+    assert correlator.on_line("OK", 3 * MS) == "AT"
+    assert (entry.status, entry.latency_ns(), entry.responses) == ("ok", 3 * MS, ["OK"])
+    # later unsolicited lines stay with the last answered command
+    assert correlator.on_line("RING", 4 * MS) == "AT"
+    assert correlator.summaries()["AT"]["count"] == 1
+
+
+def test_pattern_ends_a_multi_line_response_in_order():
+    correlator = CommandCorrelator(pattern="^(OK|ERROR)$")
+    first = correlator.sent("ATI", 0)
+    second = correlator.sent("AT+GMR", 0)
+    owners = correlator.on_lines(["Model X", "Rev 2", "OK", "1.0.3", "ERROR"], 5 * MS)
+    assert owners == ["ATI"] * 3 + ["AT+GMR"] * 2
+    assert first.response_text() == "Model X | Rev 2 | OK"
+    assert (first.lines, second.lines) == (3, 2)
+    assert correlator.outstanding() == 0
+
+
+def test_lines_without_commands_are_unknown():
+    correlator = CommandCorrelator()
+    assert correlator.on_lines(["boot", "ready"]) == [UNKNOWN_COMMAND] * 2
+
+
+def test_unanswered_command_times_out_and_notifies():
+    correlator = CommandCorrelator(timeout=0.5)
+    finished = []
+    correlator.add_listener(finished.append)
+    entry = correlator.sent("PING", 0)
+    correlator.expire(400 * MS)
+    assert entry.status == "pending"
+    correlator.expire(600 * MS)
+    assert finished == [entry] and entry.status == "timeout"
+    assert correlator.summaries()["PING"]["timeouts"] == 1
+
+
+def test_pause_holds_timeouts_and_resume_shifts_them():
+    correlator = CommandCorrelator(timeout=1.0)
+    entry = correlator.sent("READ", 0)
+    correlator.pause(100 * MS)
+    correlator.expire(5000 * MS)
+    assert entry.status == "pending"
+    correlator.resume(5100 * MS)
+    correlator.on_line("42", 5300 * MS)
+    assert entry.latency_ns() == 300 * MS
+
+
+def test_cancelled_command_stops_claiming_lines():
+    correlator = CommandCorrelator()
+    entry = correlator.sent("SLOW", 0)
+    assert correlator.cancel(entry)
+    assert not correlator.cancel(entry)
+    assert correlator.on_line("late") == UNKNOWN_COMMAND
+    assert correlator.summaries()["SLOW"]["timeouts"] == 1
+
+
+def test_histogram_percentiles_stay_within_a_bucket():
+    hist = LatencyHistogram()
+    for n in range(1, 101):
+        hist.add(n * MS)
+    summary = hist.summary()
+    assert (summary["count"], summary["min_ms"], summary["max_ms"]) == (100, 1.0, 100.0)
+    assert 50 <= summary["p50_ms"] <= 50 * 1.26
+    assert 99 <= summary["p99_ms"] <= 100
+    assert summary["mean_ms"] == 50.5
+
+
+def test_export_csv(tmp_path):
+    correlator = CommandCorrelator()
+    correlator.sent("B", 0)
+    correlator.on_line("x", 2 * MS)
+    correlator.sent("A", 0)
+    correlator.on_line("y", 1 * MS)
+    path = tmp_path / "stats.csv"
+    correlator.export_csv(path)
+    rows = list(csv.DictReader(open(path, newline="")))
+    assert [(r["command"], r["count"], r["max_ms"]) for r in rows] == [("A", "1", "1.0"), ("B", "1", "2.0")]
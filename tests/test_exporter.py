@@ -0,0 +1,98 @@
+from array import array
+import csv
+import gzip
+import json
+
+import pytest
+
+import serialterminal
+from serialterminal import LINE_TX, LineIndex, LineQuery, SessionExporter
+
+
+@pytest.fixture
+def index():
+    index = LineIndex()
+    index.append(["[12:00:00] >> AT", "[12:00:00] << OK", "[12:00:00] Connected"], "COM1",
+                 ["", "AT", ""])
+    index.append(['[12:00:01] << say "hi", twice'], "COM2")
+    yield index
+    index.close()
+
+
+def export(index, path, **options):
+    exporter = SessionExporter(index, path, **options)
+    exporter.run()
+    assert exporter.error is None
+    return exporter
+
+
+def test_text_export_writes_lines_as_shown(index, tmp_path):
+    exporter = export(index, tmp_path / "out.txt")
+    assert exporter.written == 4
+    assert (tmp_path / "out.txt").read_text().splitlines() == [
+        "[12:00:00] >> AT", "[12:00:00] << OK", "[12:00:00] Connected", '[12:00:01] << say "hi", twice']
+
+
+def test_csv_export_has_direction_port_and_command(index, tmp_path):
+    export(index, tmp_path / "out.csv", fmt="CSV")
+    with open(tmp_path / "out.csv", newline="", encoding="utf-8") as f:
+        rows = list(csv.reader(f))
+    assert rows[0] == ["time", "direction", "port", "command", "data"]
+    assert [row[1:] for row in rows[1:]] == [
+        ["TX", "COM1", "AT", "AT"],
+        ["RX", "COM1", "AT", "OK"],
+        ["Info", "COM1", "", "Connected"],
+        ["RX", "COM2", "", 'say "hi", twice'],
+    ]
+    assert len(rows[1][0]) == len("2026-01-01 12:00:00.000")
+
+
+def test_jsonl_export_is_valid_json(index, tmp_path):
+    export(index, tmp_path / "out.jsonl", fmt="JSON Lines")
+    records = [json.loads(line) for line in (tmp_path / "out.jsonl").read_text().splitlines()]
+    assert [r["data"] for r in records] == ["AT", "OK", "Connected", 'say "hi", twice']
+    assert records[1] == {**records[1], "direction": "RX", "port": "COM1", "command": "AT"}
+
+
+def test_gzip_and_query_filter(index, tmp_path):
+    path = tmp_path / "out.txt.gz"
+    exporter = export(index, path, compress=True, query=LineQuery(kind=LINE_TX))
+    assert exporter.written == 1
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        assert f.read() == "[12:00:00] >> AT\n"
+
+
+def test_time_range_selects_lines(index, tmp_path):
+    index.times[:] = array("d", [100.0, 100.0, 200.0, 300.0])
+    exporter = export(index, tmp_path / "out.txt", start_time=150, end_time=300)
+    assert exporter.written == 1
+    assert (tmp_path / "out.txt").read_text() == "[12:00:00] Connected\n"
+
+
+def test_large_export_streams_in_chunks(tmp_path, monkeypatch):
+    monkeypatch.setattr(serialterminal, "EXPORT_CHUNK_LINES", 1000)
+    index = LineIndex()
+    for block in range(10):
+        index.append([f"[12:00:00] << line {block * 500 + n}" for n in range(500)], "COM1")
+    progress = []
+    exporter = export(index, tmp_path / "out.txt", query=LineQuery("line [0-9]*7$"),
+                      on_progress=lambda *args: progress.append(args))
+    index.close()
+    assert exporter.written == 500
+    assert progress == [(n * 1000, 5000, n * 100) for n in range(1, 6)]
+    lines = (tmp_path / "out.txt").read_text().splitlines()
+    assert lines[0] == "[12:00:00] << line 7" and lines[-1] == "[12:00:00] << line 4997"
+
+
+def test_cancel_removes_partial_file(index, tmp_path):
+    path = tmp_path / "out.txt"
+    exporter = SessionExporter(index, path, on_progress=lambda *args: exporter.cancel())
+    exporter.run()
+    assert exporter.cancelled.is_set()
+    assert not path.exists()
+
+
+def test_write_error_is_reported(index, tmp_path):
+    exporter = SessionExporter(index, tmp_path / "missing" / "out.txt")
+    assert exporter.run() == 0
+    assert isinstance(exporter.error, OSError)
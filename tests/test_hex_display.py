@@ -0,0 +1,51 @@
+from queue import Queue
+
+from serialterminal import HEX_ROW_IDLE, SerialSession, hexdump_rows
+
+
+def hex_session(mode="hex"):
+    session = SerialSession("loop://", response_queue=Queue())
+    session.display = mode
+    return session
+
+
+def drain(session):
+    # (finished rows, latest partial row)
+    rows, partial = [], None
+    while not session.response_queue.empty():
+        _, row = session.response_queue.get()
+        if getattr(row, "partial", False):
+            partial = row
+        else:
+            rows.append(row)
+            partial = None
+    return rows, partial
+
+
+def test_rows_fill_across_reads():
+    session = hex_session()
+    frame = bytes([0x01, 0x03, 0x00, 0x00, 0x00, 0x0A, 0xC5, 0xCD])
+    for n, byte in enumerate(frame * 2):
+        session.handle_rx(bytes([byte]), n * 2_000_000)  # 2 ms apart
+    rows, partial = drain(session)
+    assert rows == hexdump_rows(frame * 2)
+    assert partial is None
+
+
+def test_short_row_shown_as_partial_then_finished_when_idle():
+    session = hex_session("mixed")
+    for n, byte in enumerate(b"ABCDE"):
+        session.handle_rx(bytes([byte]), n * 1_000_000)
+    rows, partial = drain(session)
+    assert rows == [] and partial == hexdump_rows(b"ABCDE", "mixed")[0]
+    assert session.hex_due() == 4_000_000 / 1e9 + HEX_ROW_IDLE
+    session.hex_flush()
+    assert drain(session) == ([hexdump_rows(b"ABCDE", "mixed")[0]], None)
+
+
+def test_gap_starts_a_new_row():
+    session = hex_session()
+    session.handle_rx(b"\x01\x02\x03", 0)
+    session.handle_rx(b"\x04\x05", int(HEX_ROW_IDLE * 2e9))
+    rows, partial = drain(session)
+    assert rows == ["01 02 03"] and partial == "04 05"
@@ -0,0 +1,82 @@
+import os
+import sys
+import time
+from queue import Empty
+
+import pytest
+
+from serialterminal import IOCore, SerialSession
+
+if sys.platform == "win32":
+    pytest.skip("the I/O core needs pollable ports", allow_module_level=True)
+
+import pty  # noqa: E402
+import tty  # noqa: E402
+
+
+class Port:
+    # A pty pair: the session opens `name`, the test plays the device on the master
+    def __init__(self):
+        self.master, self.slave = pty.openpty()
+        tty.setraw(self.slave)
+        self.name = os.ttyname(self.slave)
+
+    def write(self, data):
+        view = memoryview(data)
+        while view:
+            view = view[os.write(self.master, view):]
+
+    def read(self, count, timeout=5):
+        data = b""
+        deadline = time.monotonic() + timeout
+        while len(data) < count and time.monotonic() < deadline:
+            data += os.read(self.master, count - len(data))
+        return data
+
+
+def collect(session, count, timeout=5):
+    lines = []
+    deadline = time.monotonic() + timeout
+    while len(lines) < count and time.monotonic() < deadline:
+        try:
+            lines.append(session.response_queue.get(timeout=0.1)[1])
+        except Empty:
+            pass
+    return lines
+
+
+@pytest.fixture
+def ports():
+    core = IOCore()
+    opened = []
+
+    def open_port():
+        port = Port()
+        session = SerialSession(port.name, core=core)
+        session.open()
+        opened.append((port, session))
+        return port, session
+
+    yield open_port
+    for port, session in opened:
+        session.close()
+        os.close(port.master)
+        os.close(port.slave)
+
+
+def test_several_ports_share_one_thread(ports):
+    (a, session_a), (b, session_b) = ports(), ports()
+    assert session_a.io_thread is session_b.io_thread is not None
+    a.write(b"".join(f"a{n}\r\n".encode() for n in range(500)))
+    b.write(b"".join(f"b{n}\r\n".encode() for n in range(500)))
+    assert collect(session_a, 500) == [f"a{n}" for n in range(500)]
+    assert collect(session_b, 500) == [f"b{n}" for n in range(500)]
+
+
+def test_queued_writes_reach_the_device(ports):
+    port, session = ports()
+    for n in range(100):
+        session.transmit(f"cmd {n}\r\n".encode())
+    expected = b"".join(f"cmd {n}\r\n".encode() for n in range(100))
+    assert port.read(len(expected)) == expected
+    assert session.tx_bytes == len(expected)
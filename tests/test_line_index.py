@@ -0,0 +1,74 @@
+import threading
+
+from serialterminal import LINE_RX, LINE_TX, LineIndex, LineQuery
+
+
+def lines(prefix, count, marker="<<"):
+    return [f"[12:00:00] {marker} {prefix} {n}" for n in range(count)]
+
+
+def test_append_and_read_back():
+    index = LineIndex()
+    index.append(lines("a", 3) + lines("b", 2, ">>"), "COM1", ["x", "", "y", "", ""])
+    assert len(index) == 5
+    assert index.read_lines([0, 4]) == ["[12:00:00] << a 0", "[12:00:00] >> b 1"]
+    records = list(index.records(range(5)))
+    assert [r[2] for r in records] == [LINE_RX] * 3 + [LINE_TX] * 2
+    assert [r[4] for r in records[:3]] == ["x", "", "y"]
+    index.close()
+
+
+def test_concurrent_appends_keep_offsets_consistent():
+    index = LineIndex()
+
+    def writer(name):
+        for n in range(200):
+            index.append(lines(name, 100), name)
+
+    threads = [threading.Thread(target=writer, args=(name,)) for name in ("A", "B")]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(index) == 40000
+    assert all(b > a for a, b in zip(index.offsets, index.offsets[1:]))
+    text = index.read_lines(range(len(index)))
+    assert sorted(text) == sorted(lines("A", 100) * 200 + lines("B", 100) * 200)
+    index.close()
+
+
+def test_oldest_lines_dropped_past_the_cap():
+    index = LineIndex(max_lines=1000)
+    for n in range(30):
+        index.append([f"[12:00:00] << line {n * 100 + i}" for i in range(100)], "COM1")
+    assert len(index) == 3000
+    assert 0 < index.first and len(index.kinds) <= 1000
+    assert index.read_lines([0, 2999]) == ["", "[12:00:00] << line 2999"]
+    found = index.search(LineQuery("line 1[0-9]{3}$"))
+    assert list(found) == [n for n in range(1000, 2000) if n >= index.first]
+    assert [r[0] for r in index.records([0, index.first])] == [index.first]
+    index.close()
+
+
+def test_byte_cap():
+    index = LineIndex(max_bytes=10000)
+    for n in range(50):
+        index.append(lines("x" * 80, 10), "COM1")
+    assert index.offsets[-1] - index.base <= 10000 + 10 * 100
+    assert index.read_lines([len(index) - 1]) == ["[12:00:00] << " + "x" * 80 + " 9"]
+    index.close()
+
+
+def test_reads_release_the_index_for_trimming():
+    index = LineIndex(max_lines=1000)
+    index.append(lines("a", 900), "COM1")
+    # a caller that looks at only part of the result must not hold off trimming
+    for record in index.records(range(900)):
+        break
+    index.read_lines([0])
+    index.search(LineQuery("a"))
+    assert index.readers == 0
+    index.append(lines("b", 200), "COM1")
+    assert index.first > 0
+    assert index.records([len(index)]) == []
+    index.close()
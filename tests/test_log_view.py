@@ -0,0 +1,63 @@
+import gzip
+
+import serialterminal
+from serialterminal import CAPTURE_RX, CaptureWriter, LogView, log_segments
+
+
+def write_log(path, first, count, day="2026-01-01"):
+    text = "".join(f"{day} 10:{n // 60:02d}:{n % 60:02d},000 - INFO - line {n}\n" for n in range(first, first + count))
+    path.write_bytes(text.encode())
+    return text
+
+
+def open_view(paths):
+    view = LogView(paths)
+    view.thread.join(10)
+    assert view.error is None and view.complete
+    return view
+
+
+def test_lines_across_chunks(tmp_path, monkeypatch):
+    monkeypatch.setattr(serialterminal, "LOG_INDEX_CHUNK", 1000)
+    path = tmp_path / "serial_terminal.log"
+    write_log(path, 0, 500)
+    view = open_view([path])
+    assert len(view) == 500
+    assert view.lines(0, 2)[1].endswith("line 1")
+    assert view.lines(498, 10)[-1].endswith("line 499")
+    view.close()
+
+
+def test_last_line_without_newline(tmp_path):
+    path = tmp_path / "partial.log"
+    path.write_bytes(b"one\r\ntwo")
+    view = open_view([path])
+    assert view.lines(0, 5) == ["one", "two"]
+    view.close()
+
+
+def test_rotated_segments_read_as_one_file(tmp_path):
+    path = tmp_path / "serial_terminal.log"
+    for number, first in ((2, 0), (1, 100)):
+        (tmp_path / f"serial_terminal.log.{number}.gz").write_bytes(
+            gzip.compress(write_log(tmp_path / "tmp", first, 100).encode()))
+    (tmp_path / "tmp").unlink()
+    write_log(path, 200, 100)
+    segments = log_segments(path)
+    assert [p.name for p in segments] == ["serial_terminal.log.2.gz", "serial_terminal.log.1.gz", "serial_terminal.log"]
+    view = open_view(segments)
+    assert len(view) == 300
+    assert [line.rsplit(" ", 1)[1] for line in view.lines(98, 4)] == ["98", "99", "100", "101"]
+    assert view.find_time("2026-01-01 10:02:30") == 150
+    view.close()
+    assert all(segment.temp is None or not segment.temp.exists() for segment in view.segments)
+
+
+def test_capture_opens_as_text(tmp_path):
+    path = tmp_path / "session.stcap"
+    writer = CaptureWriter(path)
+    writer.write(CAPTURE_RX, "COM1", b"hello\r\nworld\r\n", 1)
+    writer.close()
+    view = open_view([path])
+    assert [line.split("] ", 1)[1] for line in view.lines(0, 5)] == ["COM1 << hello", "COM1 << world"]
+    view.close()
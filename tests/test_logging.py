@@ -0,0 +1,57 @@
+import gzip
+import logging
+import threading
+import time
+from queue import Queue
+
+import serialterminal
+from serialterminal import CompressingRotatingFileHandler, LogWriter
+
+
+def record(message):
+    return logging.LogRecord("serialterminal", logging.INFO, __file__, 0, message, None, None)
+
+
+def test_import_has_no_logging_side_effects():
+    assert serialterminal.log_writer is None
+    assert not any(t.name == "LogWriter" for t in threading.enumerate())
+    assert not any(isinstance(h, logging.handlers.QueueHandler) for h in logging.getLogger().handlers)
+
+
+def test_writer_flushes_queued_records_on_stop(tmp_path):
+    path = tmp_path / "terminal.log"
+    handler = CompressingRotatingFileHandler(path)
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    log_queue = Queue()
+    writer = LogWriter(log_queue, handler)
+    writer.start()
+    for n in range(100):
+        log_queue.put(record(f"line {n}"))
+    writer.stop()
+    handler.close()
+    assert path.read_text().splitlines() == [f"line {n}" for n in range(100)]
+
+
+def test_file_is_not_opened_before_the_first_record(tmp_path):
+    path = tmp_path / "terminal.log"
+    handler = CompressingRotatingFileHandler(path)
+    assert handler.stream is None and not path.exists()
+    handler.close()
+
+
+def test_rotated_segments_are_gzipped(tmp_path):
+    path = tmp_path / "terminal.log"
+    handler = CompressingRotatingFileHandler(path, maxBytes=1000, backupCount=3)
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    for n in range(60):
+        handler.handle(record(f"{n:04d} " + "x" * 40))
+    handler.flush_if_due(force=True)
+    deadline = time.monotonic() + 5
+    while list(tmp_path.glob("*.rotating")) and time.monotonic() < deadline:
+        time.sleep(0.01)
+    handler.close()
+    segments = sorted(tmp_path.glob("terminal.log.*.gz"))
+    assert 1 <= len(segments) <= 3
+    text = gzip.decompress(segments[0].read_bytes()).decode()
+    assert text.splitlines()[0].endswith("x" * 40)
+    assert path.stat().st_size <= 1000
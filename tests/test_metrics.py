@@ -0,0 +1,55 @@
+import json
+import urllib.error
+import urllib.request
+
+import pytest
+
+from serialterminal import MetricsSampler, MetricsServer, SerialSession
+
+
+@pytest.fixture
+def session():
+    session = SerialSession("loop://", core=False)
+    session.open()
+    yield session
+    session.close()
+
+
+def test_sample_has_counters_rates_and_queue_depths(session):
+    sampler = MetricsSampler()
+    sampler.sample([("COM1", session)], {"ui_lag_ms": 3})
+    session.rx_bytes += 1000
+    sample = sampler.sample([("COM1", session)], {"ui_lag_ms": 4})
+    values = sample["ports"]["COM1"]
+    assert values["rx_bytes"] == 1000 and values["rx_bytes_per_s"] > 0
+    assert values["tx_queue"] == 0 and "response_queue" in values
+    assert sample["app"] == {"ui_lag_ms": 4}
+
+
+def test_prometheus_text(session):
+    sampler = MetricsSampler()
+    sampler.sample([('a"b', session)], {"ui_lag_ms": 2, "missing": None})
+    text = sampler.prometheus()
+    assert "# TYPE serial_terminal_rx_bytes_total counter" in text
+    assert 'serial_terminal_rx_bytes_total{port="a\\"b"} 0' in text
+    assert "# TYPE serial_terminal_rx_bytes_per_second gauge" in text
+    assert "serial_terminal_ui_lag_ms 2" in text
+    assert "missing" not in text
+
+
+def test_endpoint_serves_both_formats_on_localhost(session):
+    sampler = MetricsSampler()
+    sampler.sample([("COM1", session)], {})
+    server = MetricsServer(sampler, port=0)
+    try:
+        base = f"http://127.0.0.1:{server.port}"
+        opener = urllib.request.build_opener(urllib.request.ProxyHandler({}))
+        text = opener.open(base + "/metrics", timeout=5).read().decode()
+        assert 'serial_terminal_rx_bytes_total{port="COM1"}' in text
+        data = json.loads(opener.open(base + "/metrics.json", timeout=5).read())
+        assert data["ports"]["COM1"]["rx_bytes"] == 0
+        with pytest.raises(urllib.error.HTTPError):
+            opener.open(base + "/other", timeout=5)
+        assert server.httpd.server_address[0] == "127.0.0.1"
+    finally:
+        server.stop()
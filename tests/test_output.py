@@ -0,0 +1,54 @@
+import tkinter as tk
+from tkinter import ttk
+
+import pytest
+
+from serialterminal import MAX_OUTPUT_LINES, TRIM_CHUNK_LINES, SerialTerminal, SessionTab
+
+
+# The rendering methods only use the tab they are given
+app = SerialTerminal.__new__(SerialTerminal)
+
+
+@pytest.fixture
+def tab():
+    try:
+        root = tk.Tk()
+    except tk.TclError:
+        pytest.skip("no display")
+    root.withdraw()
+    tab = SessionTab(ttk.Notebook(root), ("Courier", 10))
+    yield tab
+    tab.index.close()
+    root.destroy()
+
+
+def widget_lines(tab):
+    return tab.output_text.get("1.0", "end-1c").splitlines()
+
+
+def test_batches_are_appended_in_order(tab):
+    app.append_output(["a", "b"], tab)
+    app.append_output(["c"], tab)
+    assert widget_lines(tab) == ["a", "b", "c"]
+    assert len(tab.index) == 3
+
+
+def test_widget_is_trimmed_in_blocks_but_the_index_keeps_everything(tab):
+    total = MAX_OUTPUT_LINES + 3 * TRIM_CHUNK_LINES
+    for start in range(0, total, 1000):
+        app.append_output([f"line {n}" for n in range(start, start + 1000)], tab)
+    shown = widget_lines(tab)
+    assert MAX_OUTPUT_LINES <= len(shown) <= MAX_OUTPUT_LINES + TRIM_CHUNK_LINES
+    assert shown[-1] == f"line {total - 1}"
+    assert len(tab.index) == total
+    # widget_first maps the widget's first line back to the index
+    assert tab.index.read_lines([tab.widget_first]) == [shown[0]]
+
+
+def test_partial_line_is_replaced_by_the_next_batch(tab):
+    app.append_output(["done"], tab, partial=("half", 0, [(0, 4, "bold")]))
+    assert widget_lines(tab) == ["done", "half"]
+    assert tab.output_text.tag_ranges("bold")
+    app.append_output(["half line"], tab)
+    assert widget_lines(tab) == ["done", "half line"]
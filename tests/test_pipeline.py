@@ -0,0 +1,112 @@
+from queue import Queue
+
+import pytest
+
+import benchmark
+from serialterminal import (LINE_BATCH, LineFramer, PipelineFeed, ReceivePipeline, SerialSession,
+                            TriggerEngine, TriggerRule, clean_block, pipeline_block)
+
+
+def job(data, mode="line", delimiter=b"\n", spec=(), patterns=()):
+    return ("", 0, len(data), data, mode, delimiter, spec, patterns)
+
+
+def drain(queue):
+    lines = []
+    while not queue.empty():
+        item = queue.get_nowait()
+        lines.extend(line for _, line in (item[1] if item[0] is LINE_BATCH else (item,)))
+    return lines
+
+
+def test_block_without_terminator_is_left_to_the_framer():
+    assert pipeline_block(job(b"no line end here")) is None
+    assert pipeline_block(job(b"a;b", mode="delimiter", delimiter=b";;")) is None
+
+
+def test_block_edges_are_returned_for_the_framer():
+    data = b"end of previous\r\n\x1b[32mone\x1b[0m\r\ntwo\r\nstart of next"
+    head_end, tail_start, lines, hits, pairs, undecodable = pipeline_block(job(data))
+    assert data[:head_end] == b"end of previous\r\n"
+    assert data[tail_start:] == b"start of next"
+    assert lines == ["one", "two"]
+    assert (hits, pairs, undecodable) == ([], [], 0)
+
+
+def test_delimiter_mode():
+    head_end, tail_start, lines, *_ = pipeline_block(job(b"x;;a;;b;;y", mode="delimiter", delimiter=b";;"))
+    assert (head_end, tail_start, lines) == (3, 9, ["a", "b"])
+
+
+def test_triggers_and_telemetry_run_in_the_worker():
+    spec = TriggerEngine([TriggerRule("ERROR"), TriggerRule(r"T=9\d", regex=True)]).spec[0]
+    data = b"\nT=23.4 ok\nT=95.0 ERROR\nplain\n"
+    _, _, lines, hits, pairs, _ = pipeline_block(job(data, spec=spec, patterns=(r"(\w+)=(-?\d+(?:\.\d+)?)",)))
+    assert lines == ["T=23.4 ok", "T=95.0 ERROR", "plain"]
+    assert hits == [(1, [0, 1])]
+    assert pairs == [("T", 23.4), ("T", 95.0)]
+
+
+def test_invalid_utf8_is_counted_like_the_framer():
+    lines, undecodable = clean_block(b"ok\n\xff\xfebad\nfine", "line", b"\n")
+    assert lines == ["ok", "bad", "fine"]
+    assert undecodable == 2
+
+
+def feed_session():
+    session = SerialSession("loop://", core=False)
+    session.framer = LineFramer.from_name(session.framing)
+    return session
+
+
+class FailingPool:
+    def submit(self, job):
+        raise RuntimeError("pool is down")
+
+
+def test_results_are_applied_in_read_order():
+    session = feed_session()
+    feed = PipelineFeed(session, FailingPool())
+    try:
+        feed.next_seq = 2
+        feed._ready(1, ("raw", b"second\n", 0))
+        assert session.response_queue.empty()  # waits for the read before it
+        feed._ready(0, ("raw", b"first\n", 0))
+        assert drain(session.response_queue) == ["first", "second"]
+    finally:
+        feed.close()
+
+
+def test_block_is_framed_locally_when_the_pool_fails():
+    session = feed_session()
+    feed = PipelineFeed(session, FailingPool())
+    try:
+        feed.add(b"one\ntwo\nthr", 0)
+        feed.flush()
+        feed.add(b"ee\n", 0)
+        feed.flush()
+        assert drain(session.response_queue) == ["one", "two", "three"]
+        assert feed.errors == 2 and feed.in_flight == 0
+    finally:
+        feed.close()
+
+
+def test_pipeline_output_matches_the_sequential_path():
+    data = benchmark.make_traffic(1, 200)
+    _, sequential = benchmark.run_sequential(data)
+    _, pooled = benchmark.run_pipeline(data, 1)
+    for session in (sequential, pooled):
+        assert session.response_queue.lines == data.count(b"\n")
+    assert pooled.response_queue.crc == sequential.response_queue.crc
+    assert [rule.hits for rule in pooled.triggers.rules] == [rule.hits for rule in sequential.triggers.rules]
+    assert ({name: series.count for name, series in pooled.telemetry.series.items()}
+            == {name: series.count for name, series in sequential.telemetry.series.items()})
+
+
+def test_crossover_is_where_the_pool_outpaces_the_sequential_path():
+    profile = {"pool_s": 3.0, "reader_s": 0.5}
+    size = 10_000_000
+    assert benchmark.projected_mb_per_s(size, profile, 2) == pytest.approx(size / 1.5 / 1e6)
+    assert benchmark.projected_mb_per_s(size, profile, 8) == pytest.approx(size / 0.5 / 1e6)
+    assert benchmark.find_crossover(size, 1.0, profile) == 4
+    assert benchmark.find_crossover(size, 0.4, profile) is None  # the reader's share alone is slower
@@ -0,0 +1,57 @@
+import os
+import subprocess
+import sys
+
+import serialterminal
+from serialterminal import PortInfo, PortMonitor, SingleInstance, open_pty_pair
+
+
+def test_lazy_modules_work_once_used():
+    loop = serialterminal.asyncio.new_event_loop()
+    loop.close()
+    assert serialterminal.futures.ThreadPoolExecutor
+    assert serialterminal.http_server.HTTPServer
+
+
+def test_import_stays_headless_and_leaves_lazy_modules_unloaded():
+    code = "import sys, serialterminal; print(type(sys.modules['asyncio']).__name__)"
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True,
+                            env=dict(os.environ, DISPLAY=""), cwd=os.path.dirname(serialterminal.__file__))
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip() == "_LazyModule"
+
+
+def test_single_instance_lock(tmp_path):
+    path = tmp_path / "app.lock"
+    first, second = SingleInstance(path), SingleInstance(path)
+    assert first.acquire()
+    assert not second.acquire()
+    first.release()
+    assert second.acquire()
+    second.release()
+
+
+def test_port_identity_survives_a_rename():
+    a = PortInfo("/dev/ttyUSB0", "CP2102", 0x10C4, 0xEA60, "0001")
+    b = PortInfo("/dev/ttyUSB1", "CP2102", 0x10C4, 0xEA60, "0001")
+    assert a.identity == b.identity
+    assert PortInfo("COM3").identity is None
+    assert str(a) == "/dev/ttyUSB0 - CP2102 [10C4:EA60 SN 0001]"
+
+
+def test_monitor_reports_watched_ptys_coming_and_going():
+    if os.name != "posix":
+        return
+    monitor = PortMonitor()
+    monitor.scan()
+    monitor.changes.get_nowait()
+    name, write, close = open_pty_pair()
+    monitor.watched = frozenset([name])
+    monitor.scan()
+    added, removed = monitor.changes.get_nowait()
+    assert [info.device for info in added] == [name] and not removed
+    close()
+    monitor.scan()
+    if not os.path.exists(name):
+        added, removed = monitor.changes.get_nowait()
+        assert [info.device for info in removed] == [name]
@@ -0,0 +1,49 @@
+import re
+import time
+
+from serialterminal import PROBE_GOOD_SCORE, PortProber, score_probe
+
+
+def test_clean_text_with_line_endings_scores_highest():
+    text, _ = score_probe(b"temperature=21.5 humidity=40\r\n" * 4)
+    noise, _ = score_probe(bytes(range(128, 256)))
+    short, _ = score_probe(b"ok\r\n")
+    assert text >= PROBE_GOOD_SCORE > short > noise
+    assert score_probe(b"") == (0.0, False)
+
+
+def test_expected_pattern_adds_a_bonus():
+    score, matched = score_probe(b"\x80\x81OK\x82", re.compile("OK"))
+    assert matched and score > 1
+
+
+def test_loop_port_matches_on_the_first_rate_with_a_stimulus():
+    prober = PortProber(["loop://"], bauds=[115200, 9600], budget=5, stimulus=b"AT\r\n" * 10, pattern="AT")
+    start = time.monotonic()
+    results = prober.run()
+    assert time.monotonic() - start < 2
+    best = results[0]
+    assert (best.port, best.baudrate, best.parity, best.matched) == ("loop://", 115200, "None", True)
+    assert best.sample.startswith("AT..AT")
+    assert len(results) == 1  # a good score stops trying rates
+
+
+def test_silent_port_tries_every_rate_and_parity_within_budget():
+    prober = PortProber(["loop://"], bauds=[9600, 19200], parities=["None", "Even"], budget=5)
+    results = prober.run()
+    assert sorted(r.baudrate for r in results) == [9600, 19200]  # nothing received: no parity retries
+    assert all(r.received == 0 and r.error is None for r in results)
+
+
+def test_unopenable_port_is_reported_and_ranked_last():
+    prober = PortProber(["loop://", "/dev/does-not-exist"], bauds=[9600], budget=2, stimulus=b"hello\r\n" * 8)
+    results = prober.run()
+    assert results[-1].port == "/dev/does-not-exist" and results[-1].error
+    assert results[0].port == "loop://" and results[0].received
+
+
+def test_budget_limits_the_scan():
+    prober = PortProber(["loop://"], bauds=[300] * 50, budget=0.5)
+    start = time.monotonic()
+    prober.run()
+    assert time.monotonic() - start < 1.5
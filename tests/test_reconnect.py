@@ -0,0 +1,125 @@
+import threading
+import time
+from queue import Empty
+from types import SimpleNamespace
+
+import pytest
+import serial
+
+from serialterminal import ConnectionSupervisor, SerialSession
+
+
+def wait_for(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def collect(session, count, timeout=5):
+    lines = []
+    deadline = time.monotonic() + timeout
+    while len(lines) < count and time.monotonic() < deadline:
+        try:
+            lines.append(session.response_queue.get(timeout=0.1)[1])
+        except Empty:
+            pass
+    return lines
+
+
+@pytest.fixture
+def supervised(monkeypatch):
+    # A loop:// session whose reopen fails while `down` is set
+    session = SerialSession("loop://", core=False)
+    session.open()
+    down = threading.Event()
+    real_open = session.open
+
+    def open_port():
+        if down.is_set():
+            raise serial.SerialException("no such device")
+        real_open()
+
+    monkeypatch.setattr(session, "open", open_port)
+    events = []
+    supervisor = ConnectionSupervisor(session, on_event=lambda kind, text: events.append((kind, text)))
+    supervisor.start()
+    yield session, supervisor, down, events
+    session.close()
+
+
+def kinds(events):
+    return [kind for kind, _ in events]
+
+
+def test_writes_during_an_outage_are_sent_after_reconnect(supervised):
+    session, supervisor, down, events = supervised
+    down.set()
+    session.fail(OSError("device unplugged"))
+    assert session.reconnecting and session.correlator.paused
+    for n in range(5):
+        session.transmit(f"held {n}\r\n".encode())
+    assert wait_for(lambda: "retry" in kinds(events))
+    down.clear()
+    supervisor.device_added(SimpleNamespace(device="loop://", identity=None))  # skips the backoff
+    assert wait_for(lambda: "reconnected" in kinds(events), timeout=2)
+    assert collect(session, 5) == [f"held {n}" for n in range(5)]
+    assert kinds(events)[0] == "lost" and "device unplugged" in events[0][1]
+    assert supervisor.reconnects == 1 and supervisor.last_recovery_s > 0
+    assert not session.reconnecting and not session.correlator.paused
+    # and the reopened port works as before
+    session.transmit(b"after\r\n")
+    assert collect(session, 1) == ["after"]
+
+
+def test_pending_command_survives_the_outage(supervised):
+    session, supervisor, down, events = supervised
+    session.correlator.set_rules("^OK", 0.1)
+    down.set()
+    session.fail(OSError("device unplugged"))
+    entry = session.transmit(b"OK\r\n", "AT")  # the loopback answers with the command itself
+    time.sleep(0.3)                            # longer than the response timeout
+    down.clear()
+    supervisor.device_added(SimpleNamespace(device="loop://", identity=None))
+    assert wait_for(lambda: entry.status == "ok", timeout=2)
+
+
+def test_watchdog_reopens_a_silent_port():
+    session = SerialSession("loop://", core=False)
+    session.open()
+    events = []
+    supervisor = ConnectionSupervisor(session, watchdog=0.2, on_event=lambda kind, text: events.append((kind, text)))
+    supervisor.start()
+    try:
+        assert wait_for(lambda: "reconnected" in kinds(events), timeout=3)
+        assert "no data for 0.2 s" in events[0][1]
+        assert session.running
+    finally:
+        session.close()
+
+
+def test_renamed_adapter_is_found_by_identity():
+    session = SerialSession("/dev/ttyUSB0", core=False)
+    identity = (0x0403, 0x6001, "A10K")
+    renamed = SimpleNamespace(device="/dev/ttyUSB1", identity=identity)
+    monitor = SimpleNamespace(inventory={}, find=lambda wanted: renamed if wanted == identity else None)
+    supervisor = ConnectionSupervisor(session, monitor, identity)
+    assert supervisor.target() == "/dev/ttyUSB1"
+    assert supervisor.matches(renamed)
+    monitor.inventory["/dev/ttyUSB0"] = SimpleNamespace(device="/dev/ttyUSB0", identity=identity)
+    assert supervisor.target() == "/dev/ttyUSB0"
+    assert not supervisor.matches(SimpleNamespace(device="/dev/ttyUSB2", identity=(1, 2, "X")))
+
+
+def test_stop_ends_retries(supervised):
+    session, supervisor, down, events = supervised
+    down.set()
+    session.fail(OSError("device unplugged"))
+    assert wait_for(lambda: "retry" in kinds(events))
+    supervisor.stop()
+    assert not supervisor.is_alive()
+    retries = kinds(events).count("retry")
+    time.sleep(0.6)
+    assert kinds(events).count("retry") == retries
@@ -0,0 +1,92 @@
+import os
+import sys
+import threading
+from queue import Empty
+
+import pytest
+
+from serialterminal import CAPTURE_RX, CAPTURE_TX, CaptureReplayer, CaptureWriter, SerialSession, open_pty_pair
+
+
+def make_capture(path, records):
+    writer = CaptureWriter(path)
+    for record in records:
+        writer.write(*record)
+    writer.close()
+    return path
+
+
+def test_max_speed_replays_rx_of_the_chosen_port(tmp_path):
+    path = make_capture(tmp_path / "c.stcap", [(CAPTURE_RX, "COM1", b"a\n", 0),
+                                               (CAPTURE_TX, "COM1", b"cmd\n", 1),
+                                               (CAPTURE_RX, "COM2", b"other\n", 2),
+                                               (CAPTURE_RX, "COM1", b"b\nc\n", 10_000_000_000)])
+    written = []
+    done = threading.Event()
+    replayer = CaptureReplayer(path, written.append, speed=0, port="COM1", on_done=lambda r: done.set())
+    replayer.start()
+    assert done.wait(5)
+    assert written == [b"a\n", b"b\nc\n"]
+    assert (replayer.bytes_sent, replayer.lines_sent, replayer.error) == (6, 3, None)
+    assert replayer.elapsed < 1
+
+
+def test_speed_scales_the_recorded_gaps(tmp_path):
+    path = make_capture(tmp_path / "c.stcap", [(CAPTURE_RX, "COM1", b"a", 0),
+                                               (CAPTURE_RX, "COM1", b"b", 1_000_000_000)])
+    replayer = CaptureReplayer(path, lambda data: None, speed=10.0)
+    replayer.start()
+    replayer.join(5)
+    assert 0.09 <= replayer.elapsed < 0.5
+
+
+def test_stop_interrupts_a_long_wait(tmp_path):
+    path = make_capture(tmp_path / "c.stcap", [(CAPTURE_RX, "COM1", b"a", 0),
+                                               (CAPTURE_RX, "COM1", b"b", 60_000_000_000)])
+    written = []
+    replayer = CaptureReplayer(path, written.append)
+    replayer.start()
+    replayer.stop()
+    replayer.join(2)
+    assert not replayer.is_alive()
+    assert written in ([], [b"a"])
+
+
+def test_missing_capture_is_reported_as_error(tmp_path):
+    replayer = CaptureReplayer(tmp_path / "missing.stcap", lambda data: None)
+    replayer.run()
+    assert isinstance(replayer.error, OSError)
+    assert "stopped by error" in replayer.summary()
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="pty pairs are POSIX only")
+def test_pty_pair_carries_the_replayed_bytes(tmp_path):
+    name, write, close = open_pty_pair()
+    try:
+        fd = os.open(name, os.O_RDONLY | os.O_NOCTTY)
+        write(b"x" * 1000)
+        received = b""
+        while len(received) < 1000:
+            received += os.read(fd, 4096)
+        os.close(fd)
+    finally:
+        close()
+    assert received == b"x" * 1000
+
+
+def test_replay_into_a_loop_port_session(tmp_path):
+    path = make_capture(tmp_path / "c.stcap", [(CAPTURE_RX, "COM1", f"line {n}\r\n".encode(), n) for n in range(50)])
+    session = SerialSession("loop://", core=False)
+    session.open()
+    try:
+        replayer = CaptureReplayer(path, session.ser.write, speed=0)
+        replayer.run()
+        lines = []
+        while len(lines) < 50:
+            try:
+                lines.append(session.response_queue.get(timeout=2)[1])
+            except Empty:
+                break
+    finally:
+        session.close()
+    assert lines == [f"line {n}" for n in range(50)]
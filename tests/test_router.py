@@ -0,0 +1,115 @@
+import threading
+import time
+
+import pytest
+
+from serialterminal import FileRouteSink, RouteSink, Router, SerialSession
+
+
+class ListSink(RouteSink):
+    def __init__(self, name, delay=0.0, **kwargs):
+        super().__init__(name, **kwargs)
+        self.delay = delay
+        self.received = bytearray()
+
+    def send(self, data):
+        time.sleep(self.delay)
+        self.received += data
+
+
+class ClosingSink(ListSink):
+    # Closes while fan_out is iterating, as a sink thread hitting an error would
+    def offer(self, chunk):
+        self.router.sink_closed(self)
+
+
+def wait_for(predicate, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not predicate() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return predicate()
+
+
+@pytest.fixture
+def source():
+    session = SerialSession("loop://", core=False)
+    session.consume = False
+    session.open()
+    yield session
+    session.close()
+
+
+def test_every_sink_gets_every_chunk_in_order(source, tmp_path):
+    router = Router(source)
+    sinks = [ListSink("a"), ListSink("b", delay=0.001)]
+    for sink in sinks:
+        router.add_sink(sink)
+    router.add_sink(FileRouteSink(tmp_path / "route.bin"))
+    router.start()
+    data = b"".join(f"{n:05d}\n".encode() for n in range(5000))
+    for start in range(0, len(data), 1000):
+        source.ser.write(data[start:start + 1000])
+    assert wait_for(lambda: all(len(s.received) == len(data) for s in sinks))
+    assert all(s.received == data for s in sinks)
+    assert router.health() == "ok"
+    router.stop()
+    assert (tmp_path / "route.bin").read_bytes() == data
+    assert router.bytes_in == len(data)
+
+
+def test_a_sink_closing_during_fan_out_does_not_skip_the_next_one(source):
+    router = Router(source)
+    closing, healthy = ClosingSink("closing"), ListSink("healthy")
+    router.add_sink(closing)
+    router.add_sink(healthy)
+    router.fan_out(b"chunk")
+    assert wait_for(lambda: healthy.received == b"chunk")
+    assert router.sinks == [healthy]
+    router.stop()
+
+
+def test_drop_oldest_only_affects_the_slow_sink(source):
+    router = Router(source)
+    slow = ListSink("slow", delay=0.2, max_bytes=1000)
+    fast = ListSink("fast")
+    router.add_sink(slow)
+    router.add_sink(fast)
+    router.start()
+    for n in range(50):
+        router.fan_out(bytes([n]) * 100)
+    assert wait_for(lambda: len(fast.received) == 5000)
+    assert slow.drops > 0 and slow.dropped_bytes > 0
+    assert router.health() == "degraded"
+    router.stop()
+
+
+def test_disconnect_policy_closes_only_that_sink(source):
+    router = Router(source)
+    slow = ListSink("slow", delay=0.2, policy="disconnect", max_bytes=1000)
+    fast = ListSink("fast")
+    router.add_sink(slow)
+    router.add_sink(fast)
+    for n in range(50):
+        router.fan_out(b"x" * 100)
+    assert wait_for(lambda: slow not in router.sinks)
+    assert slow.state == "disconnected"
+    assert wait_for(lambda: len(fast.received) == 5000)
+    router.stop()
+
+
+def test_block_policy_holds_up_a_threaded_source_without_loss(source):
+    router = Router(source)
+    slow = ListSink("slow", delay=0.01, policy="block", max_bytes=500)
+    router.add_sink(slow)
+    chunks = [bytes([n]) * 100 for n in range(50)]
+    feeder = threading.Thread(target=lambda: [router.fan_out(c) for c in chunks])
+    feeder.start()
+    feeder.join(10)
+    assert wait_for(lambda: len(slow.received) == 5000)
+    assert slow.received == b"".join(chunks) and slow.drops == 0
+    router.stop()
+
+
+def test_route_sink_requires_send():
+    with pytest.raises(TypeError):
+        RouteSink("incomplete")
@@ -0,0 +1,118 @@
+import threading
+import time
+
+import pytest
+
+from serialterminal import MIN_JOB_INTERVAL, PeriodicJob, PeriodicScheduler
+
+
+def wait_for(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.005)
+    return True
+
+
+@pytest.fixture
+def scheduler():
+    sends = []
+    lock = threading.Lock()
+
+    def send(job):
+        with lock:
+            sends.append((job.command, time.monotonic_ns()))
+        return True
+
+    scheduler = PeriodicScheduler(send)
+    scheduler.sends = sends
+    scheduler.start()
+    yield scheduler
+    scheduler.stop()
+
+
+def test_payload_matches_manual_send_encoding():
+    assert PeriodicJob("AT").payload == b"AT\r\n"
+    assert PeriodicJob("AA 55 01 FF", hex_mode=True).payload == b"\xaa\x55\x01\xff"
+    with pytest.raises(ValueError):
+        PeriodicJob("not hex", hex_mode=True)
+
+
+def test_job_round_trips_through_dict():
+    job = PeriodicJob("01 03", 0.5, "COM3", enabled=False, hex_mode=True)
+    copy = PeriodicJob.from_dict(job.to_dict())
+    assert copy.to_dict() == job.to_dict()
+    assert copy.payload == b"\x01\x03"
+    # jobs saved before hex_mode existed load as text jobs
+    old = PeriodicJob.from_dict({"command": "AT", "interval": 2, "port": "", "enabled": True})
+    assert not old.hex_mode and old.payload == b"AT\r\n"
+
+
+def test_interval_has_a_floor():
+    assert PeriodicJob("AT", 0).interval == MIN_JOB_INTERVAL
+
+
+def test_deadlines_do_not_drift(scheduler):
+    job = PeriodicJob("AT", 0.02)
+    scheduler.set_jobs([job])
+    assert wait_for(lambda: job.sent >= 25)
+    scheduler.set_jobs([])
+    times = [t for _, t in scheduler.sends]
+    # each send is near its absolute deadline, so lateness does not accumulate
+    elapsed = (times[-1] - times[0]) / 1e9
+    periods = len(times) - 1 + job.missed
+    assert abs(elapsed - periods * 0.02) < 0.02
+    assert job.lateness.count == job.sent + job.failed
+
+
+def test_late_job_skips_missed_periods():
+    release = threading.Event()
+    calls = []
+
+    def send(job):
+        calls.append(job.command)
+        if len(calls) == 1:
+            release.wait(5)  # first send takes ten periods
+        return True
+
+    scheduler = PeriodicScheduler(send)
+    scheduler.start()
+    job = PeriodicJob("AT", 0.01)
+    scheduler.set_jobs([job])
+    assert wait_for(lambda: calls)
+    time.sleep(0.1)
+    release.set()
+    assert wait_for(lambda: job.sent >= 3)
+    scheduler.stop()
+    # no burst to catch up: the skipped periods are counted instead
+    assert job.missed >= 5
+    assert job.sent < 10
+
+
+def test_failed_and_raising_sends_are_counted():
+    def send(job):
+        if job.command == "boom":
+            raise OSError("port gone")
+        return False
+
+    scheduler = PeriodicScheduler(send)
+    scheduler.start()
+    closed, boom = PeriodicJob("AT", 0.01), PeriodicJob("boom", 0.01)
+    scheduler.set_jobs([closed, boom])
+    assert wait_for(lambda: closed.failed >= 3 and boom.failed >= 3)
+    scheduler.stop()
+    assert closed.sent == boom.sent == 0
+
+
+def test_set_jobs_replaces_and_skips_disabled(scheduler):
+    first = PeriodicJob("first", 0.01)
+    scheduler.set_jobs([first])
+    assert wait_for(lambda: first.sent >= 2)
+    second, off = PeriodicJob("second", 0.01), PeriodicJob("off", 0.01, enabled=False)
+    scheduler.set_jobs([second, off])
+    sent_before = first.sent
+    assert wait_for(lambda: second.sent >= 3)
+    assert first.sent <= sent_before + 1  # at most one send already in flight
+    assert off.sent == 0 and off.due_ns is None
+    assert scheduler.jobs == [second, off]
@@ -0,0 +1,66 @@
+import threading
+import time
+from queue import Empty
+
+import pytest
+
+from serialterminal import SerialSession
+
+
+def collect(session, count, timeout=5):
+    lines = []
+    deadline = time.monotonic() + timeout
+    while len(lines) < count and time.monotonic() < deadline:
+        try:
+            lines.append(session.response_queue.get(timeout=0.1)[1])
+        except Empty:
+            pass
+    return lines
+
+
+@pytest.fixture
+def loopback():
+    session = SerialSession("loop://", core=False)
+    session.open()
+    yield session
+    session.close()
+
+
+def test_writes_from_several_threads_never_interleave(loopback):
+    def sender(name):
+        for n in range(200):
+            loopback.transmit(f"{name} {n}\r\n".encode())
+
+    threads = [threading.Thread(target=sender, args=(f"T{t}",)) for t in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    lines = collect(loopback, 800)
+    assert len(lines) == 800
+    for t in range(4):
+        assert [line for line in lines if line.startswith(f"T{t} ")] == [f"T{t} {n}" for n in range(200)]
+    assert loopback.tx_bytes == sum(len(f"T{t} {n}\r\n") for t in range(4) for n in range(200))
+    assert loopback.tx_writes <= 800
+
+
+def test_command_latency_counts_from_the_write(loopback):
+    entry = loopback.transmit(b"ping\r\n", "ping")
+    assert collect(loopback, 1) == ["ping"]
+    assert entry.status == "ok" and entry.latency_ns() >= 0
+
+
+def test_line_delay_paces_queued_writes(loopback):
+    loopback.set_pacing(line_delay=0.03)
+    start = time.monotonic()
+    for n in range(5):
+        loopback.transmit(f"{n}\r\n".encode())
+    assert collect(loopback, 5) == [str(n) for n in range(5)]
+    assert time.monotonic() - start >= 0.12
+    assert loopback.tx_writes == 5
+
+
+def test_transmit_on_a_closed_port_raises():
+    session = SerialSession("loop://", core=False)
+    with pytest.raises(RuntimeError):
+        session.transmit(b"x")
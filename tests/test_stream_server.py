@@ -0,0 +1,123 @@
+import socket
+import time
+
+import pytest
+
+from serialterminal import IAC, SERVER_HOST, SerialSession, StreamServer, TelnetParser
+
+
+def wait_for(predicate, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not predicate() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return predicate()
+
+
+class Client:
+    def __init__(self, server):
+        host, port = server.server.sockets[0].getsockname()[:2]
+        self.sock = socket.create_connection((host, port), timeout=5)
+        self.data = b""
+
+    def read_until(self, marker):
+        while marker not in self.data:
+            chunk = self.sock.recv(65536)
+            if not chunk:
+                break
+            self.data += chunk
+        return marker in self.data
+
+    def close(self):
+        self.sock.close()
+
+
+@pytest.fixture
+def session():
+    session = SerialSession("loop://", core=False)
+    session.consume = False
+    session.open()
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def start_server(session):
+    servers = []
+
+    def start(**options):
+        server = StreamServer(0, **options)
+        server.start(session)
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.stop()
+
+
+def test_defaults_are_local_and_read_only():
+    server = StreamServer()
+    assert (server.host, server.allow_write) == (SERVER_HOST, False) == ("127.0.0.1", False)
+
+
+def test_clients_get_live_data_and_the_scrollback(session, start_server):
+    server = start_server(telnet=False)
+    first = Client(server)
+    assert wait_for(lambda: len(server.clients) == 1)
+    session.ser.write(b"hello\r\n")
+    assert first.read_until(b"hello\r\n")
+    late = Client(server)
+    assert late.read_until(b"hello\r\n")
+    first.close()
+    late.close()
+
+
+def test_input_is_ignored_unless_writing_is_on_and_granted(session, start_server):
+    server = start_server(telnet=False)
+    client = Client(server)
+    assert wait_for(lambda: len(server.clients) == 1)
+    client.sock.sendall(b"reboot\r\n")
+    assert client.read_until(b"[read-only]")
+    server.grant_write(server.clients[0].name)
+    client.sock.sendall(b"reboot\r\n")
+    assert client.read_until(b"[read-only]\r\n\r\n[read-only]")
+    assert session.tx_bytes == 0
+    client.close()
+
+
+def test_only_the_granted_client_writes(session, start_server):
+    server = start_server(telnet=False, allow_write=True)
+    writer, viewer = Client(server), Client(server)
+    assert wait_for(lambda: len(server.clients) == 2)
+    viewer.sock.sendall(b"x")
+    assert viewer.read_until(b"[read-only]")
+    name = writer.sock.getsockname()
+    server.grant_write(f"{name[0]}:{name[1]}")
+    assert writer.read_until(b"[write lock granted]")
+    writer.sock.sendall(b"status\r\n")
+    assert wait_for(lambda: session.tx_bytes == 8)
+    # loop:// echoes the command back to every viewer
+    assert viewer.read_until(b"status\r\n")
+    server.grant_write(None)
+    writer.sock.sendall(b"more")
+    assert writer.read_until(b"[read-only]")
+    assert session.tx_bytes == 8
+    writer.close()
+    viewer.close()
+
+
+def test_telnet_negotiates_and_escapes_iac(session, start_server):
+    server = start_server()
+    client = Client(server)
+    assert client.read_until(TelnetParser.greeting())
+    assert wait_for(lambda: len(server.clients) == 1)
+    session.ser.write(b"\xff\r\n")
+    assert client.read_until(bytes([IAC, IAC]) + b"\r\n")
+    client.close()
+
+
+def test_telnet_parser_strips_options_and_refuses_unknown_ones():
+    parser = TelnetParser()
+    data, replies = parser.feed(bytes([IAC, 253, 24]) + b"ab" + bytes([IAC, IAC]) + b"\r\0")
+    assert data == b"ab\xff\r"
+    assert replies == bytes([IAC, 252, 24])
@@ -0,0 +1,25 @@
+import re
+import time
+
+from serialterminal import DEFAULT_TELEMETRY_PATTERN, Telemetry, parse_telemetry
+
+
+def test_default_pattern_pairs():
+    pattern = [re.compile(DEFAULT_TELEMETRY_PATTERN)]
+    assert parse_telemetry(pattern, "T=23.4 V=12.01 I:-0.5 rpm = 3e3") == [
+        ("T", 23.4), ("V", 12.01), ("I", -0.5), ("rpm", 3000.0)]
+
+
+def test_default_pattern_is_linear_on_long_words():
+    pattern = [re.compile(DEFAULT_TELEMETRY_PATTERN)]
+    start = time.perf_counter()
+    assert parse_telemetry(pattern, "x" * 64 * 1024) == []
+    assert time.perf_counter() - start < 0.5
+
+
+def test_capacity_bounds_each_series():
+    telemetry = Telemetry(capacity=1024)
+    telemetry.feed([f"v={n}" for n in range(5000)], 0)
+    telemetry.process()
+    series = telemetry.series["v"]
+    assert series.count == 5000 and len(series) == 1024 and len(series.values) == 1024
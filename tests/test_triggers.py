@@ -0,0 +1,68 @@
+import json
+import re
+
+import pytest
+
+from serialterminal import TriggerEngine, TriggerRule, load_triggers, unescape
+
+
+def fired(engine, line):
+    return [rule.pattern for rule in engine.match(line)]
+
+
+def test_literals_exact_and_ignoring_case():
+    engine = TriggerEngine([TriggerRule("ERR"), TriggerRule("ERROR"), TriggerRule("warn", ignore_case=True)])
+    assert fired(engine, "ERROR: disk") == ["ERR", "ERROR"]
+    assert fired(engine, "a WARNING") == ["warn"]
+    assert fired(engine, "error") == []
+
+
+@pytest.mark.parametrize("patterns, line, expected", [
+    (["(?i)error", "temp=\\d+"], "ERROR temp=5", ["(?i)error", "temp=\\d+"]),
+    (["(?P<x>ab)c", "(?P<x>de)f"], "xxdef", ["(?P<x>de)f"]),
+    (["(a)\\1", "(b)\\1"], "zbb", ["(b)\\1"]),
+    (["(?P<n>q)(?P=n)", "x+"], "qq", ["(?P<n>q)(?P=n)"]),
+])
+def test_regexes_that_cannot_be_combined_still_fire(patterns, line, expected):
+    engine = TriggerEngine([TriggerRule(p, regex=True) for p in patterns])
+    assert fired(engine, line) == expected
+
+
+def test_bad_rule_leaves_the_engine_unchanged():
+    engine = TriggerEngine([TriggerRule("ok")])
+    rule = TriggerRule("ok")
+    rule.regex, rule.pattern = True, "("
+    with pytest.raises(re.error):
+        engine.set_rules(engine.rules + [rule])
+    assert [r.pattern for r in engine.rules] == ["ok"]
+    assert fired(engine, "ok") == ["ok"]
+
+
+def test_cooldown_and_rule_order():
+    engine = TriggerEngine([TriggerRule("b", cooldown=60), TriggerRule("a")])
+    assert fired(engine, "ab") == ["b", "a"]
+    assert fired(engine, "ab") == ["a"]
+
+
+def test_send_payload_is_raw_bytes():
+    assert unescape("\\xAA\\x55\\r") == b"\xaa\x55\r"
+    assert unescape("café\\n\\\\") == "café\n\\".encode("utf-8")
+    assert TriggerRule("x", action="send", argument="\\x00\\xff").payload == b"\x00\xff"
+
+
+def test_load_skips_broken_rules(tmp_path):
+    path = tmp_path / "triggers.json"
+    path.write_text(json.dumps([{"pattern": "(", "regex": True}, {"pattern": "fine"}]))
+    assert [rule.pattern for rule in load_triggers(path)] == ["fine"]
+
+
+def test_many_literals_match_like_substring_search():
+    import random
+    r = random.Random(7)
+    words = sorted({"".join(r.choice("abc.*") for _ in range(r.randint(1, 5))) for _ in range(200)})
+    exact = TriggerEngine([TriggerRule(w) for w in words])
+    folded = TriggerEngine([TriggerRule(w.upper(), ignore_case=True) for w in words])
+    for _ in range(300):
+        line = "".join(r.choice("abcAB.*x") for _ in range(r.randint(0, 30)))
+        assert fired(exact, line) == [w for w in words if w in line]
+        assert fired(folded, line) == [w.upper() for w in words if w in line.lower()]